@@ -286,6 +286,60 @@ FILE_FORM_UPLOAD_BACKEND = 'core.utils.response.G3WFileFormUploadBackend'
 
 G3WADMIN_VECTOR_LAYER_DOWNLOAD_FORMATS = ['shp', 'xls', 'csv', 'gpkg']
 
+# Seconds to cache the filtered features counts of the vector API, 0 to disable.
+# Counts are invalidated by editing commits, data edited outside g3w-admin are seen after the timeout.
+G3WADMIN_VECTOR_COUNT_CACHE_TIMEOUT = 0
+
+# Seconds to cache the unique values of search widgets selectbox fields, None for no expiration, 0 to disable.
+# Values edited are refreshed at the end of the request, values are deleted on project re-upload, data edited
+# outside g3w-admin are seen after the timeout.
+G3WADMIN_WIDGET_UNIQUE_VALUES_CACHE_TIMEOUT = 3600
+
+# Seconds to cache the user independent part of the client project configuration, None for no expiration,
+# 0 to disable. The cache is invalidated by project, layers and widgets changes and by editing commits.
+G3WADMIN_CLIENT_CONFIG_CACHE_TIMEOUT = 0
+
+# QGIS projects pool of every worker process: max number of loaded projects and memory budget in MB
+# of loaded projects (estimated), least recently used projects are evicted. 0 for no limit.
+G3WADMIN_PROJECT_POOL_SIZE = 0
+G3WADMIN_PROJECT_POOL_MEMORY_BUDGET = 0
+
+# Projects (ids) to load at worker start and number of most requested projects to load at worker start.
+G3WADMIN_PROJECT_POOL_WARMUP = []
+G3WADMIN_PROJECT_POOL_WARMUP_TOP = 0
+
+# Seconds between the saving of worker project pool hits and metrics into the cache.
+G3WADMIN_PROJECT_POOL_STATS_INTERVAL = 60
+
+# Cache-Control header of caching layer tiles ('TILES') and OWS responses by service and request,
+# i.e.: {'TILES': 'private, max-age=3600', 'WMS': 'no-cache', 'WMS:GETCAPABILITIES': 'private, max-age=600'}
+G3WADMIN_CACHE_CONTROL = {}
+
+# Django cache, seconds (0 to disable, None for no expiration) and max response size in bytes to cache
+# the OWS responses of requests not depending on layers data (GetCapabilities, DescribeFeatureType, etc.).
+G3WADMIN_OWS_RESPONSE_CACHE = 'default'
+G3WADMIN_OWS_RESPONSE_CACHE_TIMEOUT = 0
+G3WADMIN_OWS_RESPONSE_CACHE_MAX_SIZE = 5 * 1024 * 1024
+
+# OWS responses bigger than this size in bytes are streamed by the chunks flushed by QGIS server
+G3WADMIN_OWS_STREAMING_MIN_SIZE = 1024 * 1024
+
+# Django cache of the layers data versions, used to invalidate the layers data caches (features counts,
+# widgets unique values, editing constraints geometries) on editing: it has to be shared by all the worker processes
+# (i.e. memcached or redis), the default local memory cache is per process. Versions never expire and change
+# only on editing commits: data edited outside g3w-admin are seen after the timeout of every data cache.
+G3WADMIN_LAYER_DATA_VERSION_CACHE = 'default'
+
+# Seconds to reuse the editing constraints geometries of every worker thread: they are also rebuilt
+# when the layer data version changes.
+G3WADMIN_CONSTRAINT_GEOMETRY_CACHE_TIMEOUT = 60
+
+# Max number of coordinate transforms (by source and destination CRS) reused by every worker process
+G3WADMIN_COORDINATE_TRANSFORM_CACHE_SIZE = 64
+
+# Request headers forwarded to QGIS server
+#G3WADMIN_QGS_SERVER_REQUEST_HEADERS = ['Host', 'Forwarded', 'X-Forwarded-Host', 'X-Forwarded-Proto', ...]
+
 # Setting to activate/deactivate user password reset by email.
 RESET_USER_PASSWORD = False
 
@@ -44,6 +44,9 @@ TILESTACHE_CACHE_NAME = 'default'
 TILESTACHE_CACHE_TYPE = 'Disk'  # or 'Memcache'
 TILESTACHE_CACHE_DISK_PATH = '/tmp/tilestache_cache/'
 TILESTACHE_CACHE_TOKEN = '1234567'
+TILESTACHE_CACHE_PROVIDER = 'qgis'  # render tiles in process, or 'url template' for HTTP requests to OWS
+TILESTACHE_SEED_PYTHON = '/usr/bin/python3'  # python of the admin seeding command, default python3 in PATH
+TILESTACHE_SEED_LOG_DIR = '/tmp/'  # admin seeding command logs directory, default temp dir
 
 ALLOWED_HOSTS = "*"
 
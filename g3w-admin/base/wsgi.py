@@ -19,3 +19,16 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "base.settings")
 
 application = get_wsgi_application()
+
+# Warm up the QGIS project pool in every uwsgi worker after the fork:
+# QGIS projects and database connections cannot be shared between processes.
+try:
+    from uwsgidecorators import postfork
+
+    @postfork
+    def warm_up_project_pool():
+        from qdjango.apps import warm_up_project_pool
+        warm_up_project_pool()
+
+except ImportError:
+    pass
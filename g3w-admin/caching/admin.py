@@ -10,12 +10,54 @@ __author__ = 'lorenzetti@gis3w.it'
 __date__ = '2020-10-30'
 __copyright__ = 'Copyright 2015 - 2020, Gis3w'
 
+from django.conf import settings
 from django.contrib.admin import ModelAdmin, site
+from django.utils.translation import ugettext_lazy as _
 from .models import G3WCachingLayer
+from .utils import get_config
+import subprocess
+import tempfile
+import shutil
+import os
 
 
 class G3WCachingLayerAdmin(ModelAdmin):
     model = G3WCachingLayer
+    actions = ['seed_cache']
+    readonly_fields = ('tiles_cache_summary', )
+
+    def tiles_cache_summary(self, obj):
+        """ Number and size of cached tiles, if supported by cache backend """
+
+        summary = get_config().cache.summary(str(obj)) if obj.pk else None
+        if not summary:
+            return '-'
+        return _('{} tiles, {:.1f} MB').format(summary['tiles'], summary['bytes'] / 1024 / 1024)
+
+    tiles_cache_summary.short_description = _('Tiles cache')
+
+    def seed_cache(self, request, queryset):
+        """
+        Start tiles seeding of selected caching layers in background, by seed_cache command.
+        The python interpreter is settings.TILESTACHE_SEED_PYTHON (sys.executable is the uwsgi binary
+        under uwsgi), the command output is written to settings.TILESTACHE_SEED_LOG_DIR
+        """
+
+        python = getattr(settings, 'TILESTACHE_SEED_PYTHON', None) or shutil.which('python3')
+        log_dir = getattr(settings, 'TILESTACHE_SEED_LOG_DIR', None) or tempfile.gettempdir()
+        manage = os.path.join(os.path.dirname(settings.BASE_DIR), 'manage.py')
+        for caching_layer in queryset:
+            log_path = os.path.join(log_dir, 'tilestache_seed_{}.log'.format(caching_layer))
+            with open(log_path, 'a') as log:
+                subprocess.Popen([python, manage, 'seed_cache', str(caching_layer),
+                                  '--max-zoom', str(getattr(settings, 'TILESTACHE_SEED_MAX_ZOOM', 12))],
+                                 stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                                 start_new_session=True)
+
+        self.message_user(request, _('Tiles seeding started for {} caching layers, logs into {}').format(
+            queryset.count(), log_dir))
+
+    seed_cache.short_description = _('Seed tiles cache')
 
 
 site.register(G3WCachingLayer, G3WCachingLayerAdmin)
@@ -9,12 +9,8 @@ class CachingConfig(AppConfig):
     def ready(self):
 
         # import signal handlers
+        # tilestache config obj is built on first request by every process
         import caching.receivers
 
-        # init tilestache config.obj
-        from .utils import TilestacheConfig
-        cfg = TilestacheConfig()
-        TilestacheConfig.set_cache_config_dict(cfg.config_dict)
-
 
 
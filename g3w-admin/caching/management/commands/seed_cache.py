@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from caching.models import G3WCachingLayer
+from caching.utils.seed import TilesSeeder, SeedingLocked
+
+
+class Command(BaseCommand):
+    """
+    This command renders and stores the tiles of a caching layer for a zoom range and a bbox.
+    Tiles already in cache are skipped, an interrupted seeding is resumed when launched again with same params.
+    """
+
+    help = 'Seed caching layer tiles, i.e.: seed_cache qdjango12 --min-zoom 0 --max-zoom 14'
+
+    def add_arguments(self, parser):
+        parser.add_argument('layer_key_name', help='Caching layer key name, i.e. qdjango12')
+        parser.add_argument('--min-zoom', dest='min_zoom', default=0, type=int)
+        parser.add_argument('--max-zoom', dest='max_zoom', default=12, type=int)
+        parser.add_argument('--bbox', dest='bbox', nargs=4, type=float, default=None,
+                            metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'),
+                            help='Bbox in caching layer srs, default layer extent or project max extent')
+        parser.add_argument('--processes', dest='processes', default=None, type=int)
+        parser.add_argument('--delay', dest='delay', default=0, type=float,
+                            help='Seconds to wait after every rendered tile by every process')
+        parser.add_argument('--extension', dest='extension', default='png')
+
+    def progress(self, stats):
+        self.stdout.write('Zoom {zoom}: {done}/{total} tiles ({percent:.1f}%), rendered {rendered}, '
+                          'skipped {skipped}, errors {errors}'.format(
+                              percent=100.0 * stats['done'] / stats['total'] if stats['total'] else 100.0, **stats))
+
+    def handle(self, *args, **options):
+
+        caching_layer = None
+        for cl in G3WCachingLayer.objects.all():
+            if str(cl) == options['layer_key_name']:
+                caching_layer = cl
+                break
+
+        if not caching_layer:
+            raise CommandError('Caching layer {} not found'.format(options['layer_key_name']))
+
+        try:
+            seeder = TilesSeeder(caching_layer, options['min_zoom'], options['max_zoom'], bbox=options['bbox'],
+                                 processes=options['processes'], delay=options['delay'],
+                                 extension=options['extension'], progress=self.progress)
+            stats = seeder.seed()
+        except ValueError as e:
+            raise CommandError(e)
+        except SeedingLocked as e:
+            self.stdout.write(self.style.WARNING(str(e)))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            'Seeding of {} done in {:.1f}s: rendered {}, skipped {}, errors {}'.format(
+                options['layer_key_name'], stats['time'], stats['rendered'], stats['skipped'], stats['errors'])))
@@ -2,12 +2,16 @@ from django.apps import apps
 from django.template import loader
 from django.dispatch import receiver
 from django.conf import settings
-from django.db.models.signals import pre_delete, post_save
-from core.signals import load_layer_actions, after_serialized_project_layer
+from django.db.models.signals import pre_delete, post_save, post_delete
+from core.signals import load_layer_actions, after_serialized_project_layer, post_commit_maplayer
 from qdjango.signals import reading_layer_model
 from qdjango.models import Layer
 from caching.models import G3WCachingLayer
-from caching.utils import get_config
+from caching.utils import get_config, bump_config_version
+from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsProject
+import logging
+
+logger = logging.getLogger('g3wadmin.debug')
 
 @receiver(load_layer_actions)
 def caching_layer_action(sender, **kwargs):
@@ -44,12 +48,18 @@ def caching_layer_action(sender, **kwargs):
         return template.render(kwargs)
 
 
-def _get_caching_ulr(layer):
-    """Check if layer is a caching layer and return caching url"""
+def _get_caching_ulr(layer, caching_layers=None):
+    """Check if layer is a caching layer and return caching url
+
+    :param layer: project layer model instance
+    :param caching_layers: caching layers key names, loaded from db if not given
+    """
 
-    caching_layers = {str(cl): cl for cl in G3WCachingLayer.objects.all()}
+    if caching_layers is None:
+        caching_layers = {str(cl) for cl in G3WCachingLayer.objects.filter(
+            app_name=layer._meta.app_label, layer_id=layer.pk)}
     layer_key_name = "{}{}".format(layer._meta.app_label, layer.pk)
-    if layer_key_name in caching_layers.keys():
+    if layer_key_name in caching_layers:
         return '/{}caching/api/{}'.format(settings.SITE_PREFIX_URL if settings.SITE_PREFIX_URL else '', layer_key_name)
 
 
@@ -64,8 +74,15 @@ def add_caching_urls(sender, **kwargs):
         'values': {},
     }
 
+    # caching layers of the project loaded once for all layers
+    caching_layers = None
+    if kwargs.get('context'):
+        caching_layers = kwargs['context'].get('caching_layers', lambda c: {
+            str(cl) for cl in G3WCachingLayer.objects.filter(app_name=layer._meta.app_label, layer_id__in=c.layer_pks)
+        })
+
     # get config if exists:
-    caching_url = _get_caching_ulr(layer)
+    caching_url = _get_caching_ulr(layer, caching_layers)
     if caching_url:
         data['values'] = {'cache_url': caching_url}
     return data
@@ -104,9 +121,59 @@ def post_save_layer(sender, **kwargs):
                 layer_key_name = '{}{}'.format(sender._meta.app_label, kwargs['instance'].pk)
                 if layer_key_name in tilestache_cfg.config.layers:
                     tilestache_cfg.erase_cache_layer(layer_key_name)
+
+                    # rebuild tilestache layer by every process
+                    bump_config_version(layer_key_name)
             except:
                 pass
 
+
+@receiver(post_commit_maplayer)
+def erase_cache_layer_by_editing(sender, **kwargs):
+    """
+    Delete the cached tiles of the area changed by an editing commit,
+    for every caching layer with the same datasource of edited layer.
+    """
+
+    extent = kwargs.get('extent')
+    layer = kwargs['layer']
+    if extent is None or layer is None:
+        return
+
+    app_name = layer._meta.app_label
+    try:
+        cache_module = __import__('{}.cache'.format(app_name))
+        layers = getattr(cache_module.cache, 'get_layer_to_erase_for_project')(layer.pk)
+    except Exception:
+        layers = [layer]
+
+    tilestache_cfg = get_config()
+    for l in layers:
+        layer_key_name = '{}{}'.format(app_name, l.pk)
+        if layer_key_name not in tilestache_cfg.config.layers:
+            continue
+
+        try:
+            srs = tilestache_cfg.config.layers[layer_key_name].projection.srs
+            ct = QgsCoordinateTransform(kwargs['qgis_layer'].crs(), QgsCoordinateReferenceSystem(srs),
+                                        QgsProject.instance())
+            bbox = ct.transformBoundingBox(extent)
+            tilestache_cfg.erase_cache_layer_bbox(
+                layer_key_name, [bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum()])
+        except Exception as e:
+            logger.error('Error erasing tiles of {}, erase all layer tiles: {}'.format(layer_key_name, e))
+            tilestache_cfg.erase_cache_layer(layer_key_name)
+
+
+@receiver(post_save, sender=G3WCachingLayer)
+@receiver(post_delete, sender=G3WCachingLayer)
+def update_tilestache_config(sender, **kwargs):
+    """
+    Update tilestache config of every process when a caching layer is activated or deactivated.
+    """
+
+    bump_config_version(str(kwargs['instance']))
+
 @receiver(reading_layer_model)
 def get_tms_services(sender, **kwargs):
     """
@@ -84,8 +84,9 @@ class CachingAPITests(LiveServerTestCase):
         # active caching for layer
         cachinglayer = G3WCachingLayer.objects.create(app_name='qdjango', layer_id=layer.pk)
 
-        # init tilestache
-        TilestacheConfig.set_cache_config_dict(TilestacheConfig().config_dict)
+        # tilestache config of the process is updated by the caching layer activation
+        self.assertIn(f'qdjango{layer.pk}', get_config().config.layers)
+        self.assertIs(get_config(), get_config())
 
         url = reverse('caching-api-tile', args=[f'qdjango{layer.pk}', 0, 0, 0, 'png'])
         #url = f'{self.live_server_url}{url}'
@@ -94,6 +95,23 @@ class CachingAPITests(LiveServerTestCase):
 
         res = client.get(url)
         self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'image/png')
+
+        # tiles are rendered in process, without HTTP requests to OWS view
+        layer_dict = TilestacheConfig().config_dict['layers'][f'qdjango{layer.pk}']
+        self.assertEqual(layer_dict['provider']['class'], 'qdjango.cache:QgisServerTileProvider')
+        self.assertEqual(layer_dict['provider']['kwargs']['layer_id'], layer.pk)
+        self.assertNotIn('BBOX', layer_dict['provider']['kwargs']['params'])
+        self.assertEqual(layer_dict['metatile'], {'rows': 4, 'columns': 4})
+
+        with override_settings(TILESTACHE_CACHE_PROVIDER='url template'):
+            layer_dict = TilestacheConfig().config_dict['layers'][f'qdjango{layer.pk}']
+            self.assertEqual(layer_dict['provider']['name'], 'url template')
+
+        # caching layer deactivation
+        cachinglayer.delete()
+        self.assertNotIn(f'qdjango{layer.pk}', get_config().config.layers)
+        self.assertEqual(client.get(url).status_code, 404)
 
         client.logout()
 
@@ -0,0 +1,221 @@
+# coding=utf-8
+""""Caching tiles seeding, invalidation and cache locking tests.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+    it under the terms of the Mozilla Public License 2.0.
+
+"""
+
+from django.test import SimpleTestCase, override_settings
+from unittest import mock
+from ModestMaps.Core import Point
+from caching.utils.projections import CustomXYZGridProjection
+from caching.utils import TilestacheConfig
+from caching.utils.cache import FcntlDiskCache, MBTilesCache, TilestacheCacheMbtiles
+from ModestMaps.Core import Coordinate
+from caching.utils.seed import get_tiles, get_seed_bbox, TilesSeeder, SeedingLocked, SEED_CHUNK_SIZE
+import tempfile
+import threading
+import fcntl
+import os
+
+
+class TilesSeedingTests(SimpleTestCase):
+
+    def test_get_tiles(self):
+        """Test tile coordinates of a bbox on custom grid"""
+
+        projection = CustomXYZGridProjection('EPSG:3003')
+
+        # pointCoordinate is the inverse of coordinateProj
+        coord = projection.pointCoordinate(Point(1024 * 256 * 2, 1024 * 256 * 3), 5)
+        point = projection.coordinateProj(coord)
+        self.assertAlmostEqual(point.x, 1024 * 256 * 2)
+        self.assertAlmostEqual(point.y, 1024 * 256 * 3)
+
+        # zoom 5: tile size 1024 * 256 meters
+        tile_meters = 1024 * 256
+        tiles = get_tiles(projection, [tile_meters * 2.5, tile_meters * 3.5, tile_meters * 4.5, tile_meters * 5.5], 5)
+        self.assertEqual(len(tiles), 9)
+        self.assertEqual(tiles[0], (32 - 6, 2))
+        self.assertEqual(tiles[-1], (32 - 4, 4))
+
+    def test_get_seed_bbox(self):
+        """Test seeding bbox, layer extent reprojected to project group CRS"""
+
+        layer = mock.Mock()
+        layer.extent_rect = {'minx': 9.0, 'miny': 44.0, 'maxx': 10.0, 'maxy': 45.0}
+        layer.srid = 4326
+        layer.project.group.srid.auth_srid = 4326
+
+        with mock.patch('caching.utils.seed.apps') as seed_apps:
+            seed_apps.get_app_config.return_value.get_model.return_value.objects.get.return_value = layer
+
+            self.assertEqual(get_seed_bbox(mock.Mock()), [9.0, 44.0, 10.0, 45.0])
+
+            layer.project.group.srid.auth_srid = 3857
+            bbox = get_seed_bbox(mock.Mock())
+            self.assertAlmostEqual(bbox[0], 1001875.417, 2)
+            self.assertAlmostEqual(bbox[2], 1113194.908, 2)
+
+    def test_resume(self):
+        """Test seeding tasks are resumed from saved state"""
+
+        class CachingLayer(object):
+            def __str__(self):
+                return 'qdjango1'
+
+        tile_meters = 256 * 2**5
+        state_file = os.path.join(tempfile.mkdtemp(), 'state.json')
+        seeder = TilesSeeder(CachingLayer(), 10, 10, bbox=[0, 0, tile_meters * 10, tile_meters * 10],
+                             state_file=state_file)
+        projection = CustomXYZGridProjection('EPSG:3003')
+
+        tasks, total = seeder.get_tasks(projection, seeder.read_state())
+        self.assertEqual(total, 100)
+        self.assertEqual([n for args, n in tasks], [SEED_CHUNK_SIZE, 100 - SEED_CHUNK_SIZE])
+
+        seeder.write_state(70)
+        tasks, total = seeder.get_tasks(projection, seeder.read_state())
+        self.assertEqual([n for args, n in tasks], [30])
+        self.assertEqual(tasks[0][0][2][0], (1024 - 10 + 7, 0))
+
+        # other params: no resume
+        seeder.zooms = [10, 11]
+        self.assertEqual(seeder.read_state(), 0)
+
+    def test_lock(self):
+        """Test a second seeding of the same caching layer exits while the first one is running"""
+
+        class CachingLayer(object):
+            def __str__(self):
+                return 'qdjango1'
+
+        state_file = os.path.join(tempfile.mkdtemp(), 'state.json')
+        seeder = TilesSeeder(CachingLayer(), 10, 10, bbox=[0, 0, 1, 1], state_file=state_file)
+
+        with open(state_file + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with mock.patch.object(seeder, '_seed') as seed_mock:
+                with self.assertRaises(SeedingLocked):
+                    seeder.seed()
+                seed_mock.assert_not_called()
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+        with mock.patch.object(seeder, '_seed', return_value={'done': 0}) as seed_mock:
+            self.assertEqual(seeder.seed(), {'done': 0})
+            seed_mock.assert_called_once()
+
+
+class TilesInvalidationTests(SimpleTestCase):
+
+    def _get_config(self, reset_cache_zoom=True):
+
+        cfg = mock.Mock()
+        cfg.config.layers = {
+            'qdjango1': mock.Mock(projection=CustomXYZGridProjection('EPSG:3003'), metatile=mock.Mock(buffer=0))
+        }
+        cfg.cache.reset_cache_zoom.return_value = reset_cache_zoom
+        return cfg
+
+    def test_erase_cache_layer_bbox(self):
+        """Test only tiles intersecting the changed area are deleted"""
+
+        cfg = self._get_config()
+        tile_meters = 1024 * 256
+        TilestacheConfig.erase_cache_layer_bbox(
+            cfg, 'qdjango1', [tile_meters * 2.5, tile_meters * 3.5, tile_meters * 2.5, tile_meters * 3.5])
+
+        self.assertEqual(cfg.cache.remove_tiles.call_count, 25)
+        cfg.cache.reset_cache_zoom.assert_not_called()
+        cfg.cache.reset_cache_layer.assert_not_called()
+
+        # zoom 5: the point tile, bbox expanded by 32 pixels
+        args = cfg.cache.remove_tiles.call_args_list[5][0]
+        self.assertEqual(args[1:], (5, [(28, 2)], 'PNG'))
+
+    def test_erase_cache_layer_bbox_max_tiles(self):
+        """Test zoom levels with too many tiles to delete"""
+
+        cfg = self._get_config()
+        TilestacheConfig.erase_cache_layer_bbox(cfg, 'qdjango1', [0, 0, 1000, 1000])
+        self.assertEqual(cfg.cache.remove_tiles.call_count, 20)
+        self.assertEqual([c[0][1] for c in cfg.cache.reset_cache_zoom.call_args_list], [20, 21, 22, 23, 24])
+
+        # cache backend without zoom level reset: whole layer reset
+        cfg = self._get_config(reset_cache_zoom=False)
+        TilestacheConfig.erase_cache_layer_bbox(cfg, 'qdjango1', [0, 0, 1000, 1000])
+        cfg.cache.reset_cache_layer.assert_called_once_with('qdjango1')
+
+
+class FcntlDiskCacheTests(SimpleTestCase):
+
+    def test_lock(self):
+        """Test metatile lock by lock file"""
+
+        cache = FcntlDiskCache(tempfile.mkdtemp())
+        layer = mock.Mock()
+        layer.name.return_value = 'qdjango1'
+        coord = Coordinate(10, 20, 5)
+
+        cache.lock(layer, coord, 'PNG')
+        lockpath = cache._lockpath(layer, coord, 'PNG')
+        self.assertTrue(os.path.exists(lockpath))
+
+        # lock is held: other lockers wait
+        with open(lockpath, 'a') as f:
+            with self.assertRaises(BlockingIOError):
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        cache.unlock(layer, coord, 'PNG')
+        with open(lockpath, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class MBTilesCacheTests(SimpleTestCase):
+
+    def test_mbtiles_cache(self):
+        """Test MBTiles cache backend"""
+
+        path = tempfile.mkdtemp()
+        with override_settings(TILESTACHE_CACHE_MBTILES_PATH=path):
+            tilestache_cache = TilestacheCacheMbtiles()
+
+        cache = MBTilesCache(**tilestache_cache.cache_dict['kwargs'])
+        layer = mock.Mock()
+        layer.name.return_value = 'qdjango1'
+        coord = Coordinate(1, 2, 3)
+
+        self.assertIsNone(tilestache_cache.summary('qdjango1'))
+        self.assertIsNone(cache.read(layer, coord, 'PNG'))
+
+        cache.save(b'tile', layer, coord, 'PNG')
+        cache.save(b'other tile', layer, Coordinate(1, 2, 4), 'PNG')
+        self.assertEqual(cache.read(layer, coord, 'PNG'), b'tile')
+
+        # MBTiles TMS row
+        self.assertEqual(cache._connect('qdjango1').execute('SELECT tile_row FROM tiles WHERE zoom_level = 3').
+                         fetchone()[0], 6)
+
+        self.assertEqual(tilestache_cache.summary('qdjango1')['tiles'], 2)
+
+        cache.remove(layer, coord, 'PNG')
+        self.assertIsNone(cache.read(layer, coord, 'PNG'))
+
+        self.assertTrue(tilestache_cache.reset_cache_zoom('qdjango1', 4))
+        self.assertIsNone(cache.read(layer, Coordinate(1, 2, 4), 'PNG'))
+
+        # layer reset: file is deleted and reopened
+        cache.save(b'tile', layer, coord, 'PNG')
+        tilestache_cache.reset_cache_layer('qdjango1')
+        self.assertFalse(os.path.exists(os.path.join(path, 'qdjango1.mbtiles')))
+        self.assertIsNone(cache.read(layer, coord, 'PNG'))
+
+        # cache shared by the threads of a process: every thread has its own connection
+        cache.save(b'tile', layer, coord, 'PNG')
+        results = []
+        thread = threading.Thread(target=lambda: results.append(cache.read(layer, coord, 'PNG')))
+        thread.start()
+        thread.join()
+        self.assertEqual(results, [b'tile'])
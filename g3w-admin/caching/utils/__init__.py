@@ -8,6 +8,7 @@ from caching.models import G3WCachingLayer
 from django.apps import apps
 from django.core.cache import cache, caches
 from .cache import CACHE_CLASSES
+from .projections import get_tile_ranges, get_resolution
 import shutil
 import os
 import fcntl
@@ -18,6 +19,18 @@ logger = logging.getLogger('g3wadmin.debug')
 
 TILESTACHE_CACHE_BUFFER_SIZE = getattr(settings, 'TILESTACHE_CACHE_BUFFER_SIZE', None)
 
+# Metatile rows and columns: tiles of a metatile are rendered by a single request and stored together
+TILESTACHE_CACHE_METATILE_SIZE = getattr(settings, 'TILESTACHE_CACHE_METATILE_SIZE', 4)
+
+# Pixels added to the changed area to invalidate tiles with symbols and labels of changed features
+TILESTACHE_CACHE_INVALIDATION_BUFFER = getattr(settings, 'TILESTACHE_CACHE_INVALIDATION_BUFFER', 32)
+
+# Max tiles to invalidate one by one for a zoom level, over it the whole zoom level is invalidated
+TILESTACHE_CACHE_INVALIDATION_MAX_TILES = getattr(settings, 'TILESTACHE_CACHE_INVALIDATION_MAX_TILES', 10000)
+
+# Zoom levels of caching layers tile grids
+TILESTACHE_CACHE_MAX_ZOOM = getattr(settings, 'TILESTACHE_CACHE_MAX_ZOOM', 24)
+
 LAYER_CLASSES = dict()
 
 for app_name in settings.G3WADMIN_PROJECT_APPS:
@@ -28,21 +41,75 @@ for app_name in settings.G3WADMIN_PROJECT_APPS:
         continue
 
 
+# Per process compiled TileStache config, with the version of the shared config and of every layer
+_COMPILED_CONFIG = {
+    'version': None,
+    'layers_versions': {},
+    'config': None
+}
+
+TILESTACHE_CONFIG_VERSION_KEY = 'tilestache_cfg_version'
+TILESTACHE_CONFIG_LAYER_VERSION_KEY = 'tilestache_cfg_layer_version_{}'
+
+
+def get_config_version():
+    """
+    Return the version of the TileStache config shared by processes, None if not set
+    :return: int, None
+    """
+
+    return caches[TilestacheConfig.cache_name].get(TILESTACHE_CONFIG_VERSION_KEY)
+
+
+def bump_config_version(layer_key_name=None):
+    """
+    Increment the version of the TileStache config shared by processes,
+    processes update their compiled config on next get_config() call.
+    :param layer_key_name: key name of the layer to rebuild, i.e. 'qdjango12'
+    :return: new version
+    """
+
+    shared_cache = caches[TilestacheConfig.cache_name]
+
+    # start from the current time to not reuse the versions of an expired counter
+    shared_cache.add(TILESTACHE_CONFIG_VERSION_KEY, int(time.time() * 1000), None)
+    try:
+        version = shared_cache.incr(TILESTACHE_CONFIG_VERSION_KEY)
+    except ValueError:
+        version = int(time.time() * 1000)
+        shared_cache.set(TILESTACHE_CONFIG_VERSION_KEY, version, None)
+
+    if layer_key_name:
+        shared_cache.set(TILESTACHE_CONFIG_LAYER_VERSION_KEY.format(layer_key_name), version, None)
+
+    return version
+
+
 def get_config():
     """
-    Get global config tilestache object
-    :return:
+    Get global config tilestache object.
+    The config is compiled once per process and updated, layer by layer,
+    when the shared config version changes.
+    :return: TilestacheConfig instance
     """
 
+    version = get_config_version()
+    cfg = _COMPILED_CONFIG['config']
 
-    # si prova con dict
-    current_cfg = TilestacheConfig.get_cache_config_dict()
-    if current_cfg:
-        return TilestacheConfig(config_dict=current_cfg)
-    else:
+    if cfg is None:
+        if version is None:
+            version = bump_config_version()
         cfg = TilestacheConfig()
-        TilestacheConfig.set_cache_config_dict(cfg.config_dict)
-        return cfg
+        _COMPILED_CONFIG.update({
+            'config': cfg,
+            'version': version,
+            'layers_versions': cfg.get_layers_versions()
+        })
+    elif version != _COMPILED_CONFIG['version']:
+        _COMPILED_CONFIG['layers_versions'] = cfg.update_layers(_COMPILED_CONFIG['layers_versions'])
+        _COMPILED_CONFIG['version'] = version
+
+    return cfg
 
 
 class TilestacheConfig(object):
@@ -62,7 +129,7 @@ class TilestacheConfig(object):
             self.init_cache()
         else:
             self.init_cache()
-            self.config_dict.update({'cache': self.cache.cache_dict})
+            self.config_dict = {'cache': self.cache.cache_dict}
         self.config = parseConfig(self.config_dict)
         try:
             self.init_layers()
@@ -89,12 +156,56 @@ class TilestacheConfig(object):
         for caching_layer in caching_layers:
             self.add_layer(str(caching_layer), caching_layer)
 
+    def get_layers_versions(self, layer_key_names=None):
+        """
+        Return the shared versions of config layers
+        :param layer_key_names: layers key names, default config layers
+        :return: dict, {<layer_key_name>: <version>}
+        """
+
+        if layer_key_names is None:
+            layer_key_names = list(self.config.layers.keys())
+
+        versions = caches[self.cache_name].get_many(
+            [TILESTACHE_CONFIG_LAYER_VERSION_KEY.format(k) for k in layer_key_names])
+        return {k: versions.get(TILESTACHE_CONFIG_LAYER_VERSION_KEY.format(k)) for k in layer_key_names}
+
+    def update_layers(self, layers_versions):
+        """
+        Update config layers with activated caching layers: add new layers, remove deactivated ones
+        and rebuild the layers with a changed shared version.
+        :param layers_versions: shared versions of config layers at their building
+        :return: dict, current shared versions of config layers
+        """
+
+        caching_layers = {str(cl): cl for cl in G3WCachingLayer.objects.all()}
+        current_versions = self.get_layers_versions(list(caching_layers.keys()))
+
+        for layer_key_name in list(self.config.layers.keys()):
+            if layer_key_name not in caching_layers:
+                self.remove_layer(layer_key_name)
+
+        for layer_key_name, caching_layer in caching_layers.items():
+            if layer_key_name not in self.config.layers or \
+                    current_versions[layer_key_name] != layers_versions.get(layer_key_name):
+                try:
+                    self.add_layer(layer_key_name, caching_layer)
+                except Exception as e:
+                    logger.error('Error building tilestache layer {}: {}'.format(layer_key_name, e))
+
+        return current_versions
+
     def build_layer_dict(self, caching_layer, layer_key_name):
 
         layer_dict = LAYER_CLASSES[caching_layer.app_name](caching_layer, layer_key_name).layer_dict
 
+        metatile = dict()
+        if TILESTACHE_CACHE_METATILE_SIZE > 1:
+            metatile.update({"rows": TILESTACHE_CACHE_METATILE_SIZE, "columns": TILESTACHE_CACHE_METATILE_SIZE})
         if TILESTACHE_CACHE_BUFFER_SIZE is not None:
-            layer_dict["metatile"] = { "buffer": TILESTACHE_CACHE_BUFFER_SIZE }
+            metatile["buffer"] = TILESTACHE_CACHE_BUFFER_SIZE
+        if metatile:
+            layer_dict["metatile"] = metatile
 
         # add layer_dict to config_dict
         if 'layers' not in self.config_dict:
@@ -120,6 +231,7 @@ class TilestacheConfig(object):
         :return: None
         """
         del(self.config.layers[layer_key_name])
+        self.config_dict.get('layers', {}).pop(layer_key_name, None)
 
     def erase_cache_layer(self, layer_key_name):
         """
@@ -130,6 +242,31 @@ class TilestacheConfig(object):
 
         self.cache.reset_cache_layer(layer_key_name)
 
+    def erase_cache_layer_bbox(self, layer_key_name, bbox, extension='PNG'):
+        """
+        Delete cached tiles intersecting a bbox at every zoom level.
+        The bbox is expanded by metatile buffer and by TILESTACHE_CACHE_INVALIDATION_BUFFER pixels.
+        :param layer_key_name: caching layer key name
+        :param bbox: [xmin, ymin, xmax, ymax] in caching layer srs
+        :param extension: tile format
+        """
+
+        tilestache_layer = self.config.layers[layer_key_name]
+        projection = tilestache_layer.projection
+        buffer = TILESTACHE_CACHE_INVALIDATION_BUFFER + getattr(tilestache_layer.metatile, 'buffer', 0)
+
+        for zoom in range(TILESTACHE_CACHE_MAX_ZOOM + 1):
+            margin = buffer * get_resolution(projection, zoom)
+            rows, columns = get_tile_ranges(
+                projection, [bbox[0] - margin, bbox[1] - margin, bbox[2] + margin, bbox[3] + margin], zoom)
+            if len(rows) * len(columns) > TILESTACHE_CACHE_INVALIDATION_MAX_TILES:
+                if not self.cache.reset_cache_zoom(layer_key_name, zoom):
+                    # tiles increase with zoom level: reset the whole layer
+                    self.cache.reset_cache_layer(layer_key_name)
+                    return
+            else:
+                self.cache.remove_tiles(tilestache_layer, zoom, [(r, c) for r in rows for c in columns], extension)
+
     def set_cache_hash(self, cid):
         cache.set(self.cache_key, cid, None)
 
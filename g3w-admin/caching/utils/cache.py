@@ -1,9 +1,16 @@
 from django.conf import settings
 from django.core.cache import caches
+from ModestMaps.Core import Coordinate
+from TileStache.Caches import Disk
 
 #todo: rewrite for python3 memcached cache.
 #from memcached_stats import MemcachedStats
 import shutil
+import sqlite3
+import threading
+import fcntl
+import zlib
+import os
 
 
 class TilestacheCache(object):
@@ -21,8 +28,161 @@ class TilestacheCache(object):
     def reset_cache_layer(self, layer_key_name):
         pass
 
+    def reset_cache_zoom(self, layer_key_name, zoom):
+        """
+        Delete cached tiles of a zoom level
+        :return: False if not supported by cache backend
+        """
+        return False
+
+    def summary(self, layer_key_name):
+        """
+        Return cached tiles summary of a layer: {'tiles': <number of tiles>, 'bytes': <size>}
+        :return: dict, None if not supported by cache backend
+        """
+        return None
+
+    def remove_tiles(self, tilestache_layer, zoom, tiles, extension):
+        """
+        Delete cached tiles by TileStache cache
+        :param tilestache_layer: TileStache layer instance
+        :param zoom: zoom level
+        :param tiles: list of (row, column) tuples
+        :param extension: tile format, i.e. 'PNG'
+        """
+
+        cache = tilestache_layer.config.cache
+        for row, column in tiles:
+            cache.remove(tilestache_layer, Coordinate(row, column, zoom), extension)
+
+
+class FcntlLockMixin(object):
+    """
+    TileStache cache metatile locks by fcntl.flock() on lock files under self.lockdir:
+    processes waiting for a metatile render are woken up when the lock is released, without polling,
+    and locks of dead processes are released by the OS.
+    Metatiles share a fixed number of lock files (lock stripes).
+    """
+
+    lock_stripes = 1024
+
+    def _lockpath(self, layer, coord, format):
+        stripe = zlib.crc32('{}/{}/{}/{}/{}'.format(
+            layer.name(), coord.zoom, coord.column, coord.row, format).encode()) % self.lock_stripes
+        return os.path.join(self.lockdir, '{}.lock'.format(stripe))
+
+    def lock(self, layer, coord, format):
+        lockpath = self._lockpath(layer, coord, format)
+        os.makedirs(os.path.dirname(lockpath), exist_ok=True)
+
+        lockfile = open(lockpath, 'a')
+        fcntl.flock(lockfile, fcntl.LOCK_EX)
+        self._locks[(layer.name(), coord.zoom, coord.column, coord.row, format)] = lockfile
+
+    def unlock(self, layer, coord, format):
+        lockfile = self._locks.pop((layer.name(), coord.zoom, coord.column, coord.row, format), None)
+        if lockfile:
+            fcntl.flock(lockfile, fcntl.LOCK_UN)
+            lockfile.close()
+
+
+class FcntlDiskCache(FcntlLockMixin, Disk):
+    """
+    TileStache Disk cache with metatile locks by fcntl.flock() instead of lock directories.
+    """
+
+    def __init__(self, path, umask=0o022, dirs='safe', lock_stripes=1024):
+        super().__init__(path, umask=umask, dirs=dirs)
+        self.lockdir = os.path.join(self.cachepath, '.locks')
+        self.lock_stripes = lock_stripes
+        self._locks = dict()
+
+
+class MBTilesCache(FcntlLockMixin):
+    """
+    TileStache cache storing the tiles of every layer into a single MBTiles (SQLite) file: <path>/<layer>.mbtiles.
+    Databases are in WAL mode, with a connection per process thread (sqlite3 connections can't be shared
+    between threads). Tile rows are stored flipped (TMS), as by MBTiles spec.
+    A layer file deleted or replaced by another process (layer reset) is reopened.
+    """
+
+    def __init__(self, path, lock_stripes=1024, timeout=30):
+        self.path = path
+        self.lockdir = os.path.join(path, '.locks')
+        self.lock_stripes = lock_stripes
+        self.timeout = timeout
+        self._locks = dict()
+
+        # connections of the current thread: {layer name: (pid, inode, connection)}
+        self._local = threading.local()
+
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def layer_file_path(path, layer_name):
+        return os.path.join(path, '{}.mbtiles'.format(layer_name))
+
+    def _connect(self, layer_name):
+        """
+        Return the connection to the layer database of current process thread, opening and initializing it if needed
+        :param layer_name: TileStache layer name
+        :return: sqlite3.Connection instance
+        """
+
+        file_path = self.layer_file_path(self.path, layer_name)
+        try:
+            inode = os.stat(file_path).st_ino
+        except OSError:
+            inode = None
+
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = dict()
+        connections = self._local.connections
+
+        pid = os.getpid()
+        current = connections.get(layer_name)
+        if current and current[0] == pid and current[1] == inode:
+            return current[2]
 
-class TilestacheCacheTest(object):
+        # connections of the parent process (fork) cannot be used, and are not closed
+        if current and current[0] == pid:
+            current[2].close()
+
+        connection = sqlite3.connect(file_path, timeout=self.timeout, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)')
+        connection.execute('CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, '
+                           'tile_row INTEGER, tile_data BLOB, PRIMARY KEY (zoom_level, tile_column, tile_row))')
+        connection.execute('INSERT OR IGNORE INTO metadata (name, value) VALUES (?, ?)', ('name', layer_name))
+
+        connections[layer_name] = (pid, os.stat(file_path).st_ino, connection)
+        return connection
+
+    @staticmethod
+    def _tile_key(coord):
+        return coord.zoom, coord.column, 2 ** coord.zoom - 1 - coord.row
+
+    def read(self, layer, coord, format):
+        row = self._connect(layer.name()).execute(
+            'SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+            self._tile_key(coord)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def save(self, body, layer, coord, format):
+        self._connect(layer.name()).execute(
+            'INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)',
+            self._tile_key(coord) + (sqlite3.Binary(body),))
+
+    def remove(self, layer, coord, format):
+        self._connect(layer.name()).execute(
+            'DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?', self._tile_key(coord))
+
+    def remove_zoom(self, layer_name, zoom):
+        self._connect(layer_name).execute('DELETE FROM tiles WHERE zoom_level = ?', (zoom, ))
+
+
+class TilestacheCacheTest(TilestacheCache):
 
     def _init_cache_dict(self):
 
@@ -53,14 +213,22 @@ class TilestacheCacheDisk(TilestacheCache):
     """
 
     def _init_cache_dict(self):
+        self.path = getattr(settings, 'TILESTACHE_CACHE_DISK_PATH', '/tmp/tilestache_g3wsuite')
         self.cache_dict = {
-            'name': 'Disk',
-            'path': getattr(settings, 'TILESTACHE_CACHE_DISK_PATH', '/tmp/tilestache_g3wsuite'),
-            'umask': getattr(settings, 'TILESTACHE_CACHE_DISK_UMASK', '0000')
+            'class': 'caching.utils.cache:FcntlDiskCache',
+            'kwargs': {
+                'path': self.path,
+                'umask': int(getattr(settings, 'TILESTACHE_CACHE_DISK_UMASK', '0000'), 8),
+                'lock_stripes': getattr(settings, 'TILESTACHE_CACHE_DISK_LOCK_STRIPES', 1024)
+            }
         }
 
     def reset_cache_layer(self, layer_key_name):
-        shutil.rmtree("{}/{}".format(self.cache_dict['path'], layer_key_name), ignore_errors=True)
+        shutil.rmtree("{}/{}".format(self.path, layer_key_name), ignore_errors=True)
+
+    def reset_cache_zoom(self, layer_key_name, zoom):
+        shutil.rmtree("{}/{}/{}".format(self.path, layer_key_name, zoom), ignore_errors=True)
+        return True
 
 
 class TilestacheCacheMemcache(TilestacheCache):
@@ -100,9 +268,63 @@ class TilestacheCacheMemcache(TilestacheCache):
                 cache.delete(key)
 
 
+class TilestacheCacheMbtiles(TilestacheCache):
+    """
+    Class to manage tilestache cache of MBTiles type, a SQLite file for every layer
+    """
+
+    def _init_cache_dict(self):
+        self.path = getattr(settings, 'TILESTACHE_CACHE_MBTILES_PATH', '/tmp/tilestache_g3wsuite_mbtiles')
+        self.cache_dict = {
+            'class': 'caching.utils.cache:MBTilesCache',
+            'kwargs': {
+                'path': self.path,
+                'lock_stripes': getattr(settings, 'TILESTACHE_CACHE_DISK_LOCK_STRIPES', 1024)
+            }
+        }
+
+    def reset_cache_layer(self, layer_key_name):
+        """ Delete the layer file, processes reopen a new file on next access """
+
+        file_path = MBTilesCache.layer_file_path(self.path, layer_key_name)
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(file_path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def reset_cache_zoom(self, layer_key_name, zoom):
+        if os.path.exists(MBTilesCache.layer_file_path(self.path, layer_key_name)):
+            MBTilesCache(self.path).remove_zoom(layer_key_name, zoom)
+        return True
+
+    def summary(self, layer_key_name):
+        """
+        Return number of tiles and size in bytes of the layer file
+        :return: dict, None if the layer has no file
+        """
+
+        file_path = MBTilesCache.layer_file_path(self.path, layer_key_name)
+        if not os.path.exists(file_path):
+            return None
+
+        connection = sqlite3.connect(file_path, timeout=30)
+        try:
+            tiles = connection.execute('SELECT count(*) FROM tiles').fetchone()[0]
+        finally:
+            connection.close()
+
+        return {
+            'tiles': tiles,
+            'bytes': sum(os.path.getsize(file_path + suffix) for suffix in ('', '-wal')
+                         if os.path.exists(file_path + suffix))
+        }
+
+
 CACHE_CLASSES = {
         'Disk': TilestacheCacheDisk,
         'Memcache': TilestacheCacheMemcache,
+        'Mbtiles': TilestacheCacheMbtiles,
         'Test': TilestacheCacheTest,
         'S3': TilestacheCacheS3
     }
\ No newline at end of file
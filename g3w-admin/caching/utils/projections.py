@@ -1,7 +1,50 @@
 import re
+import math
 from ModestMaps.Core import Point, Coordinate
 from TileStache.Geography import SphericalMercator, WGS84
 
+
+def get_tile_ranges(projection, bbox, zoom):
+    """
+    Return the rows and columns of the tiles covering a bbox at zoom level
+    :param projection: caching layer projection, CustomGridProjection instance
+    :param bbox: [xmin, ymin, xmax, ymax] in projection srs
+    :param zoom: zoom level
+    :return: tuple, (rows range, columns range)
+    """
+
+    ul = projection.pointCoordinate(Point(bbox[0], bbox[3]), zoom)
+    lr = projection.pointCoordinate(Point(bbox[2], bbox[1]), zoom)
+
+    rows = range(int(math.floor(min(ul.row, lr.row))), int(math.ceil(max(ul.row, lr.row))))
+    columns = range(int(math.floor(min(ul.column, lr.column))), int(math.ceil(max(ul.column, lr.column))))
+
+    return rows, columns
+
+
+def get_tiles(projection, bbox, zoom):
+    """
+    Return the tile coordinates covering a bbox at zoom level, ordered by row and column
+    :param projection: caching layer projection, CustomGridProjection instance
+    :param bbox: [xmin, ymin, xmax, ymax] in projection srs
+    :param zoom: zoom level
+    :return: list of (row, column) tuples
+    """
+
+    rows, columns = get_tile_ranges(projection, bbox, zoom)
+    return [(row, column) for row in rows for column in columns]
+
+
+def get_resolution(projection, zoom):
+    """
+    Return map units per pixel of a projection at zoom level
+    """
+
+    ul = projection.coordinateProj(Coordinate(0, 0, zoom))
+    ur = projection.coordinateProj(Coordinate(0, 1, zoom))
+    return abs(ur.x - ul.x) / 256
+
+
 class CustomGridProjection():
     def __init__(self, xyz, srs):
         self.xyz = xyz
@@ -24,9 +67,25 @@ class CustomGridProjection():
         row = (2**coord.zoom - coord.row) if self.xyz else coord.row
         px = coord.column * tile_meters
         py = row * tile_meters
-        print(px, py)
         return Point(px,py)
 
+    def pointCoordinate(self, point, zoom):
+        """
+        Return the tile coordinate (with decimals) of a point in projection srs at zoom level,
+        inverse of coordinateProj.
+        """
+
+        standardProjection = self.standardProjections.get(self.srs, None)
+        if standardProjection:
+            return standardProjection.projCoordinate(point).zoomTo(zoom)
+
+        tile_meters = self.tilesize * self.resolutions[zoom]
+        column = point.x / tile_meters
+        row = point.y / tile_meters
+        if self.xyz:
+            row = 2**zoom - row
+        return Coordinate(row, column, zoom)
+
     def normalizeSrs(self,srs):
         if isinstance(srs, (int, float)):
             return 'EPSG:' + srs
@@ -0,0 +1,233 @@
+# coding=utf-8
+""""
+Tiles seeding of caching layers.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+    it under the terms of the Mozilla Public License 2.0.
+
+"""
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import close_caches
+from django.db import connections
+from ModestMaps.Core import Coordinate
+from core.utils.models import parse_stored_structure
+from core.utils.qgisapi import get_coordinate_transform
+from qgis.core import QgsRectangle
+from . import get_config
+from .projections import get_tiles
+import multiprocessing
+import tempfile
+import fcntl
+import json
+import time
+import os
+import logging
+
+logger = logging.getLogger('g3wadmin.debug')
+
+# Tiles number rendered by a worker process task
+SEED_CHUNK_SIZE = 64
+
+
+class SeedingLocked(Exception):
+    """Raised when a seeding of the same caching layer is already running"""
+
+
+def get_seed_bbox(caching_layer):
+    """
+    Return the default seeding bbox of a caching layer, in project group CRS: layer extent or project max extent
+    :param caching_layer: G3WCachingLayer model instance
+    :return: list, [xmin, ymin, xmax, ymax] or None
+    """
+
+    layer = apps.get_app_config(caching_layer.app_name).get_model('layer').objects.get(pk=caching_layer.layer_id)
+
+    try:
+        rect = layer.extent_rect
+        if rect['minx'] < rect['maxx'] and rect['miny'] < rect['maxy']:
+
+            # layer extent is in layer CRS, tiles grid is in project group CRS
+            group_srid = layer.project.group.srid.auth_srid
+            if layer.srid and int(layer.srid) != int(group_srid):
+                rect = get_coordinate_transform(layer.srid, group_srid).transformBoundingBox(
+                    QgsRectangle(rect['minx'], rect['miny'], rect['maxx'], rect['maxy']))
+                return [rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum()]
+
+            return [rect['minx'], rect['miny'], rect['maxx'], rect['maxy']]
+    except Exception:
+        pass
+
+    max_extent = parse_stored_structure(layer.project.max_extent) if layer.project.max_extent else None
+    if max_extent:
+        return [float(max_extent[k]) for k in ('xmin', 'ymin', 'xmax', 'ymax')]
+
+    return None
+
+
+def _seed_tiles(layer_key_name, zoom, tiles, extension, delay):
+    """
+    Render and store tiles not in cache, worker process task
+    :return: tuple, (rendered, skipped, errors)
+    """
+
+    config = get_config().config
+    tilestache_layer = config.layers[layer_key_name]
+
+    rendered = skipped = errors = 0
+    for row, column in tiles:
+        coord = Coordinate(row, column, zoom)
+        try:
+            if config.cache.read(tilestache_layer, coord, extension):
+                skipped += 1
+                continue
+            tilestache_layer.getTileResponse(coord, extension)
+            rendered += 1
+        except Exception as e:
+            logger.error('Error seeding tile {}/{}/{}/{}: {}'.format(layer_key_name, zoom, column, row, e))
+            errors += 1
+
+        if delay:
+            time.sleep(delay)
+
+    return rendered, skipped, errors
+
+
+def _seed_tiles_task(args):
+    return _seed_tiles(*args)
+
+
+class TilesSeeder(object):
+    """
+    Render and store caching layer tiles for a zoom range and a bbox by a process pool,
+    skipping the tiles already in cache. Progress is saved into a state file to resume seeding.
+    """
+
+    def __init__(self, caching_layer, min_zoom, max_zoom, bbox=None, processes=None, delay=0,
+                 extension='PNG', state_file=None, progress=None):
+        """
+        :param caching_layer: G3WCachingLayer model instance
+        :param min_zoom: min zoom level
+        :param max_zoom: max zoom level
+        :param bbox: [xmin, ymin, xmax, ymax] in caching layer srs, default layer extent or project max extent
+        :param processes: number of worker processes, default cpu count
+        :param delay: seconds to wait after every rendered tile by every worker, to throttle seeding
+        :param extension: tile format
+        :param state_file: file path for progress state, default into temp dir
+        :param progress: callable called after every task with a progress dict
+        """
+
+        self.layer_key_name = str(caching_layer)
+        self.zooms = list(range(min_zoom, max_zoom + 1))
+        self.bbox = bbox or get_seed_bbox(caching_layer)
+        if not self.bbox:
+            raise ValueError('No bbox for caching layer {}'.format(self.layer_key_name))
+
+        self.processes = processes or getattr(settings, 'TILESTACHE_SEED_PROCESSES', None) or os.cpu_count()
+        self.delay = delay
+        self.extension = extension.upper()
+        self.state_file = state_file or os.path.join(tempfile.gettempdir(),
+                                                     'tilestache_seed_{}.json'.format(self.layer_key_name))
+        self.progress = progress
+
+    @property
+    def params(self):
+        return {
+            'layer': self.layer_key_name,
+            'zooms': self.zooms,
+            'bbox': self.bbox,
+            'extension': self.extension
+        }
+
+    def read_state(self):
+        """
+        Return the number of tiles seeded by a previous interrupted seeding with same params
+        :return: int
+        """
+
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 0
+
+        return state['done'] if state.get('params') == self.params else 0
+
+    def write_state(self, done):
+        with open(self.state_file, 'w') as f:
+            json.dump({'params': self.params, 'done': done}, f)
+
+    def get_tasks(self, projection, start):
+        """
+        Return worker tasks for tiles of all zoom levels, skipping the first start tiles
+        :return: list of (task args, tiles number) tuples
+        """
+
+        tasks = []
+        index = 0
+        for zoom in self.zooms:
+            tiles = get_tiles(projection, self.bbox, zoom)
+            for i in range(0, len(tiles), SEED_CHUNK_SIZE):
+                chunk = tiles[i:i + SEED_CHUNK_SIZE]
+                if index + len(chunk) > start:
+                    todo = chunk[max(start - index, 0):]
+                    tasks.append(((self.layer_key_name, zoom, todo, self.extension, self.delay), len(todo)))
+                index += len(chunk)
+        return tasks, index
+
+    def seed(self):
+        """
+        Seed tiles, only one seeding per state file runs at a time
+        :raise SeedingLocked: if a seeding with the same state file is running
+        :return: dict, seeding stats
+        """
+
+        # lock file is never removed: the lock is on the same inode for every seeding
+        with open(self.state_file + '.lock', 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise SeedingLocked('Seeding of caching layer {} is already running'.format(self.layer_key_name))
+
+            try:
+                return self._seed()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _seed(self):
+
+        tilestache_layer = get_config().config.layers[self.layer_key_name]
+        done = self.read_state()
+        tasks, total = self.get_tasks(tilestache_layer.projection, done)
+
+        stats = {
+            'total': total,
+            'done': done,
+            'rendered': 0,
+            'skipped': 0,
+            'errors': 0,
+            'start': time.time()
+        }
+
+        # database and cache connections cannot be shared with worker processes
+        connections.close_all()
+        close_caches()
+
+        with multiprocessing.get_context('fork').Pool(self.processes) as pool:
+            for (rendered, skipped, errors), (args, n) in zip(
+                    pool.imap(_seed_tiles_task, [args for args, n in tasks]), tasks):
+                stats['done'] += n
+                stats['rendered'] += rendered
+                stats['skipped'] += skipped
+                stats['errors'] += errors
+                stats['zoom'] = args[1]
+                self.write_state(stats['done'])
+                if self.progress:
+                    self.progress(stats)
+
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+        stats['time'] = time.time() - stats['start']
+
+        return stats
@@ -12,10 +12,11 @@ from rest_framework import status
 from rest_framework.response import Response
 from core.mixins.views import AjaxableFormResponseMixin, G3WRequestViewMixin, G3WProjectViewMixin
 from core.utils.decorators import project_type_permission_required
+from core.utils.response import make_etag, get_cache_control, get_not_modified_response, patch_conditional_headers
 from core.models import BaseLayer
 from .forms import ActiveCachingLayerForm
 from .models import G3WCachingLayer
-from .utils import get_config, TilestacheConfig
+from .utils import get_config, bump_config_version
 from .api.permissions import TilePermission
 from django.core.cache import caches
 from qdjango.models import Layer as QdjangoLayer
@@ -167,7 +168,7 @@ class ActiveCachingLayerView(AjaxableFormResponseMixin, G3WProjectViewMixin, G3W
             if self.base_layer:
                 self.base_layer.delete()
 
-        TilestacheConfig.set_cache_config_dict(TilestacheConfig().config_dict)
+        bump_config_version('{}{}'.format(self.app_name, self.layer_id))
 
         return super(ActiveCachingLayerView, self).form_valid(form)
 
@@ -232,6 +233,15 @@ class TileStacheTileApiView(APIView):
             if len(content) == 0:
                 status_code = 404
 
+            # HTTP conditional caching by tile content hash
+            etag = cache_control = None
+            if status_code == 200:
+                etag = make_etag(content)
+                cache_control = get_cache_control('TILES')
+                not_modified = get_not_modified_response(request, etag=etag, cache_control=cache_control)
+                if not_modified is not None:
+                    return not_modified
+
             response = HttpResponse(
                 content,
                 **{
@@ -241,7 +251,7 @@ class TileStacheTileApiView(APIView):
             )
             if hasattr(tilestache_layer, 'allowed origin'):
                 response['Access-Control-Allow-Origin'] = tilestache_layer.get('allowed origin')
-            return response
+            return patch_conditional_headers(response, etag=etag, cache_control=cache_control)
         except Exception as ex:
             return Response(
                 {
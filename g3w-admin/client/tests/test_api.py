@@ -12,9 +12,12 @@ __copyright__ = 'Copyright 2019, Gis3w'
 
 import os
 import json
+from unittest.mock import patch
 from django.conf import settings
 from django.test import override_settings
 from django.core.files import File
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from qdjango.models import Project
 from qdjango.utils.data import QgisProject
 from django.core.cache import caches
@@ -22,6 +25,8 @@ from core.tests.base import CoreTestBase
 from core.models import MacroGroup, Group, G3WSpatialRefSys
 from core.utils.structure import FIELD_TYPES_MAPPING
 from qdjango.models import Widget, WIDGET_TYPES
+from editing.models import G3WEditingLayer
+from caching.models import G3WCachingLayer
 from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransformContext
 
 # Re-use test data from qdjango module
@@ -462,6 +467,14 @@ class ClientApiTest(CoreTestBase):
                          set(['a point', 'another point']))
         self.assertEqual(resp_serach['options']['filter'][0]['logicop'], 'AND')
 
+        # selectbox values are served from cache, without scanning the layer data
+        with patch('qdjango.utils.models.get_qgis_unique_values') as mock_unique_values:
+            response = self._testApiCall('group-project-map-config', ['gruppo-1', 'qdjango', '1'])
+            self.assertFalse(mock_unique_values.called)
+        resp = json.loads(response.content)
+        self.assertEqual(set(resp['search'][0]['options']['filter'][0]['input']['options']['values']),
+                         set(['a point', 'another point']))
+
         # create a search widget with autocompletebox
         # -------------------------------------------
         widget_body = {
@@ -588,3 +601,74 @@ class ClientApiTest(CoreTestBase):
                          [166021.44308054161956534, 0, 534994.65506113646551967, 9329005.18244743719696999])
 
 
+
+    @override_settings(G3WADMIN_CLIENT_CONFIG_CACHE_TIMEOUT=60)
+    def testClientConfigApiViewCache(self):
+        """Test cache of the user independent client config data"""
+
+        response = self._testApiCall('group-project-map-config', ['gruppo-1', 'qdjango', '1'])
+        resp = json.loads(response.content)
+
+        # From cache: the QGIS project is not read
+        with patch('qdjango.api.projects.serializers.get_qgs_project') as mock_get_qgs_project:
+            response = self._testApiCall('group-project-map-config', ['gruppo-1', 'qdjango', '1'])
+            self.assertFalse(mock_get_qgs_project.called)
+        self.assertEqual(json.loads(response.content), resp)
+
+        # Layer update invalidates the cache
+        layer = self.prj_test.layer_set.get(qgs_layer_id='spatialite_points20190604101052075')
+        layer.title = 'Spatialite points cached'
+        layer.save()
+
+        response = self._testApiCall('group-project-map-config', ['gruppo-1', 'qdjango', '1'])
+        resp = json.loads(response.content)
+        self.assertEqual([l['title'] for l in resp['layers'] if l['id'] == layer.qgs_layer_id],
+                         ['Spatialite points cached'])
+
+    def testClientConfigApiViewQueriesCount(self):
+        """Test the queries count of client config API doesn't grow with editing, caching and widgets layers"""
+
+        project = self.project_print310.instance
+        path = self._getPath('group-project-map-config', [self.print_group.slug, 'qdjango', project.pk])
+        self.assertTrue(self.client.login(username=self.test_admin1.username, password=self.test_admin1.username))
+
+        with CaptureQueriesContext(connection) as base_queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+
+        # set every layer as editing layer, caching layer and with a search widget
+        layers = list(project.layer_set.all())
+        self.assertTrue(len(layers) > 1)
+        for layer in layers:
+            G3WEditingLayer.objects.create(app_name='qdjango', layer_id=layer.pk)
+            G3WCachingLayer.objects.create(app_name='qdjango', layer_id=layer.pk)
+            widget = Widget.objects.create(
+                widget_type='search',
+                name=f'Test queries count {layer.pk}',
+                datasource=layer.datasource,
+                body=json.dumps({
+                    'title': 'queries count',
+                    'query': 'simpleWmsSearch',
+                    'usewmsrequest': True,
+                    'fields': [],
+                    'results': [],
+                    'selectionlayer': layer.qgs_layer_id,
+                    'selectionzoom': 0,
+                    'dozoomtoextent': True
+                })
+            )
+            widget.layers.add(layer)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        resp = json.loads(response.content)
+        self.assertEqual(len(resp['search']), len(layers))
+        self.assertTrue(all('cache_url' in l for l in resp['layers']))
+
+        # editing, caching and widgets data are loaded with a constant number of queries
+        self.assertTrue(len(queries) <= len(base_queries) + 4,
+                        f'{len(queries)} queries for {len(layers)} layers, {len(base_queries)} without editing, '
+                        f'caching and widgets')
+
+        self.client.logout()
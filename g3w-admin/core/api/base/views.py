@@ -3,9 +3,8 @@ from collections import OrderedDict
 from copy import copy
 
 from django.conf import settings
-from django.contrib.gis.geos import GEOSGeometry
 from django.core.exceptions import PermissionDenied
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
 from django.utils import six
 from django.utils.translation import ugettext
 from django.utils.translation import ugettext_lazy as _
@@ -20,7 +19,7 @@ from qgis.core import (
     QgsJsonUtils
 )
 from rest_framework import exceptions, status
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, ParseError
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -32,8 +31,9 @@ from core.signals import (before_return_vector_data_layer,
                           post_serialize_maplayer)
 from core.utils.structure import (APIVectorLayerStructure, mapLayerAttributes,
                                   mapLayerAttributesFromQgisLayer)
-from core.utils.vector import BaseUserMediaHandler as UserMediaHandler
-from core.utils.qgisapi import get_qgis_features, count_qgis_features
+from core.utils.vector import BaseUserMediaHandler as UserMediaHandler, MediaPlan
+from core.utils.qgisapi import (get_qgis_features, count_qgis_features, get_next_paging_cursor,
+                                get_qgis_unique_values, get_coordinate_transform, get_geometries_from_geojson)
 
 import logging
 
@@ -48,6 +48,9 @@ MODE_CSV = 'csv'
 MODE_GPKG = 'gpkg'
 MODE_FILTER_TOKEN = 'filtertoken'
 
+# Placeholder for the features array into the streaming output envelope
+STREAMING_FEATURES_PLACEHOLDER = '__g3w_streaming_features__'
+
 MIME_TYPES_MOD = {
     MODE_SHP: {
         'mime_type': 'application/zip',
@@ -299,48 +302,118 @@ class BaseVectorOnModelApiView(G3WAPIView):
         :param kwargs:
         """
 
+    def get_coordinate_transform(self, to_layer=False):
+        """
+        Coordinate transform between layer CRS and project group CRS, the group srid is read once for the request
+
+        :param to_layer: Reprojecting versus
+        :return: QgsCoordinateTransform instance
+        """
+
+        if not hasattr(self, '_group_srid'):
+            self._group_srid = self.layer.project.group.srid.auth_srid
+
+        if to_layer:
+            return get_coordinate_transform(self._group_srid, self.layer.srid)
+        return get_coordinate_transform(self.layer.srid, self._group_srid)
+
     def reproject_feature(self, feature, to_layer=False):
         """
         Reproject single geometry feature
 
         :param feature: Feature object
         :param to_layer: Reprojecting versus
-        :return:
+        :return: reprojected QgsGeometry instance
         """
 
-        # FIXME: use QGIS API!
-        if to_layer:
-            from_srid = self.layer.project.group.srid.auth_srid
-            to_srid = self.layer.srid
-        else:
-            from_srid = self.layer.srid
-            to_srid = self.layer.project.group.srid.auth_srid
-
-        geometry = GEOSGeometry(GEOSGeometry(json.dumps(
-            feature['geometry'])).wkt, srid=int(from_srid))
-        geometry.transform(to_srid)
-        feature['geometry'] = json.loads(geometry.json)
+        return self.reproject_featurecollection({'features': [feature]}, to_layer)[0]
 
     def reproject_featurecollection(self, featurecollection, to_layer=False):
         """
-        Reproject features
-        :param featurecollection:
-        :return:
+        Reproject features: geometries are parsed by a single QGIS call and transformed in place
+        by the same coordinate transform, GeoJSON geometries of the features are replaced.
+
+        :param featurecollection: GeoJSON feature collection
+        :param to_layer: Reprojecting versus
+        :return: list of reprojected QgsGeometry instances, in the order of the features
+        """
+
+        features = featurecollection['features']
+        geojson_geometries = [{k: v for k, v in f['geometry'].items() if k != 'crs'} if f.get('geometry') else None
+                              for f in features]
+
+        geometries = get_geometries_from_geojson(geojson_geometries)
+        if geometries is None:
+            # parse geometries one by one to find the invalid one
+            geometries = []
+            for geojson_geometry in geojson_geometries:
+                geometry = get_geometries_from_geojson([geojson_geometry])
+                if geometry is None:
+                    raise ParseError(_('Invalid geometry: {}').format(json.dumps(geojson_geometry)))
+                geometries += geometry
+
+        ct = self.get_coordinate_transform(to_layer)
+        for feature, geometry in zip(features, geometries):
+            if geometry.isNull():
+                continue
+            geometry.transform(ct)
+            feature['geometry'] = json.loads(geometry.asJson())
+
+        return geometries
+
+    def get_media_plan(self):
         """
-        for feature in featurecollection['features']:
-            self.reproject_feature(feature, to_layer)
+        Media plan of the layer, computed once for the request
+        :return: MediaPlan instance
+        """
+
+        if not hasattr(self, '_media_plan'):
+            self._media_plan = MediaPlan(self.layer, UserMediaHandler)
+        return self._media_plan
 
     def change_media(self, featurecollection):
 
-        if 'features' in featurecollection:
+        media_plan = self.get_media_plan()
+        if not media_plan:
+            return
 
-            for feature in featurecollection['features']:
-                UserMediaHandler(layer=self.layer,
-                                 feature=feature).new_value(change=True)
+        if 'features' in featurecollection:
+            media_plan.change_values(featurecollection['features'])
         else:
-            for feature in featurecollection:
-                UserMediaHandler(layer=self.layer,
-                                 feature=feature).new_value(change=True)
+            media_plan.change_values(featurecollection)
+
+    def has_media_fields(self):
+        """
+        Check if the layer has fields with media (ExternalResource) widgets
+        :return: bool
+        """
+
+        return bool(self.get_media_plan())
+
+    def stream_results(self, features, export_feature):
+        """
+        Generator for streaming output: yields the results envelope and
+        every exported GeoJSON feature.
+
+        :param features: the features to export
+        :param export_feature: function that returns the GeoJSON string of a feature
+        :return: generator of JSON strings
+        """
+
+        head, tail = json.dumps(self.results.results).split(json.dumps(STREAMING_FEATURES_PLACEHOLDER))
+
+        # Features are parsed only if media values have to be changed
+        has_media_fields = self.has_media_fields()
+
+        yield head + '['
+        for n, feature in enumerate(features):
+            jfeature = export_feature(feature)
+            if has_media_fields:
+                jfeature = json.loads(jfeature)
+                self.change_media([jfeature])
+                jfeature = json.dumps(jfeature)
+            yield jfeature if n == 0 else ',' + jfeature
+        yield ']' + tail
 
     def initial(self, request, *args, **kwargs):
         super(BaseVectorOnModelApiView, self).initial(request, *args, **kwargs)
@@ -419,7 +492,8 @@ class BaseVectorOnModelApiView(G3WAPIView):
         Query layer and return data
         :param request: DjangoREST API request object
         :param formatter: Boolean, default False, True for to use QgsJsonExport.exportFeatures method
-        :return: response dict data
+        :return: None (response dict data into self.results) or a StreamingHttpResponse
+                 if 'stream' request param is set.
         """
 
         # Create the QGIS feature request, it will be passed through filters
@@ -436,35 +510,36 @@ class BaseVectorOnModelApiView(G3WAPIView):
                 backend().apply_filter(request, self.metadata_layer.qgis_layer, qgis_feature_request, self)
 
         # Paging cannot be a backend filter
+        # A 'cursor' (as returned into 'next_cursor' of a previous page) can
+        # be used instead of 'page' to page without offsets
         if 'page' in request.query_params:
             kwargs['page'] = request.query_params.get('page')
             kwargs['page_size'] = request.query_params.get('page_size', 10)
-
-        self.features = get_qgis_features(
-            self.metadata_layer.qgis_layer, qgis_feature_request, **kwargs)
-        ex = QgsJsonExporter(self.metadata_layer.qgis_layer)
+        elif 'cursor' in request.query_params:
+            kwargs['cursor'] = request.query_params.get('cursor')
+            kwargs['page_size'] = request.query_params.get('page_size', 10)
 
         # If 'unique' request params is set,
         # api return a list of unique
         # field name sent with 'unique' param.
+        # 'limit' request param limits the number of values (i.e. for autocomplete)
         # --------------------------------------
-        # IDEA:     for big data it'll be iterate over features to get unique
-        #           c++ iteration is fast. Instead memory layer fith to much features can be a problem.
         if 'unique' in request.query_params:
 
-            vl = QgsVectorLayer(QgsWkbTypes.displayString(self.metadata_layer.qgis_layer.wkbType()),
-                                "temporary_vector", "memory")
-            pr = vl.dataProvider()
-
-            # add fields
-            pr.addAttributes(self.metadata_layer.qgis_layer.fields())
-            vl.updateFields()  # tell the vector layer to fetch changes from the provider
-
-            res = pr.addFeatures(self.features)
-
-            uniques = vl.uniqueValues(
-                self.metadata_layer.qgis_layer.fields().indexOf(request.query_params.get('unique'))
-            )
+            self.features = []
+
+            try:
+                uniques = get_qgis_unique_values(
+                    self.metadata_layer.qgis_layer,
+                    request.query_params.get('unique'),
+                    qgis_feature_request,
+                    limit=request.query_params.get('limit')
+                )
+            except ValueError as e:
+                raise ParseError(str(e))
+            finally:
+                # Restore the original subset string
+                self.metadata_layer.qgis_layer.setSubsetString(original_subset_string)
 
             values = []
             for u in uniques:
@@ -482,59 +557,96 @@ class BaseVectorOnModelApiView(G3WAPIView):
                 'count': len(values)
             })
 
-            del(vl)
-
-        else:
+            return
 
-            # patch for return GeoJson feature with CRS different from WGS84
-            # TODO: use .setTransformGeometries( false ) with QGIS >= 3.12
-            ex.setSourceCrs(QgsCoordinateReferenceSystem('EPSG:4326'))
+        try:
+            self.features = get_qgis_features(
+                self.metadata_layer.qgis_layer, qgis_feature_request, **kwargs)
+        except ValueError as e:
+            self.metadata_layer.qgis_layer.setSubsetString(original_subset_string)
+            raise ParseError(str(e))
+        ex = QgsJsonExporter(self.metadata_layer.qgis_layer)
 
-            # check for formatter query url param and check if != 0
-            if 'formatter' in request.query_params:
-                formatter = request.query_params.get('formatter')
-                if formatter.isnumeric() and int(formatter) == 0:
-                    export_features = False
-                else:
-                    export_features = True
+        # patch for return GeoJson feature with CRS different from WGS84
+        # TODO: use .setTransformGeometries( false ) with QGIS >= 3.12
+        ex.setSourceCrs(QgsCoordinateReferenceSystem('EPSG:4326'))
 
-            if export_features:
-                feature_collection = json.loads(ex.exportFeatures(self.features))
+        # check for formatter query url param and check if != 0
+        if 'formatter' in request.query_params:
+            formatter = request.query_params.get('formatter')
+            if formatter.isnumeric() and int(formatter) == 0:
+                export_features = False
             else:
+                export_features = True
 
-                # to exclude QgsFormater used into QgsJsonjExporter is necessary build by hand single json feature
-                ex.setIncludeAttributes(False)
+        # Field names are the same for every feature of the layer
+        fnames = self.metadata_layer.qgis_layer.fields().names()
 
-                feature_collection = {
-                    'type': 'FeatureCollection',
-                    'features': []
-                }
+        if not export_features:
+            # to exclude QgsFormater used into QgsJsonjExporter is necessary build by hand single json feature
+            ex.setIncludeAttributes(False)
 
-                for feature in self.features:
-                    fnames = [f.name() for f in feature.fields()]
-                    feature_collection['features'].append(
-                        json.loads(ex.exportFeature(feature, dict(zip(fnames, feature.attributes()))))
-                    )
+        def export_feature(feature):
+            """Returns the GeoJSON string of a feature"""
 
+            if export_features:
+                return ex.exportFeature(feature)
+            return ex.exportFeature(feature, dict(zip(fnames, feature.attributes())))
 
+        count = count_qgis_features(self.metadata_layer.qgis_layer, qgis_feature_request, **kwargs)
 
-            # FIXME: QGIS api reprojecting?
-            # Reproject if necessary
-            # if self.reproject:
-            #    self.reproject_featurecollection(feature_collection)
+        # Opaque cursor for the next page, None if keyset paging is not available
+        if 'page_size' in kwargs:
+            self.results.update({
+                'next_cursor': get_next_paging_cursor(self.metadata_layer.qgis_layer, self.features,
+                                                      kwargs['page_size'], qgis_feature_request)
+            })
 
-            # Change media
-            self.change_media(feature_collection)
+        # Streaming output: features are written one by one to the response
+        if self.mode_call == MODE_DATA and request.query_params.get('stream', '0').lower() in ('1', 'true'):
 
             self.results.update(APIVectorLayerStructure(**{
-                'data': feature_collection,
-                'count': count_qgis_features(self.metadata_layer.qgis_layer, qgis_feature_request, **kwargs),
+                'data': {
+                    'type': 'FeatureCollection',
+                    'features': STREAMING_FEATURES_PLACEHOLDER
+                },
+                'count': count,
                 'geometryType': self.metadata_layer.geometry_type,
             }).as_dict())
 
-            # FIXME: add extra fields data by signals and receivers
-            # FIXME: featurecollection = post_serialize_maplayer.send(layer_serializer, layer=self.layer_name)
-            # FIXME: Not sure how to map this to the new QGIS API
+            # extra data are sent before the features, into the envelope
+            self.update_extra_results()
+
+            # Restore the original subset string
+            self.metadata_layer.qgis_layer.setSubsetString(original_subset_string)
+
+            return StreamingHttpResponse(
+                self.stream_results(self.features, export_feature),
+                content_type='application/json'
+            )
+
+        feature_collection = {
+            'type': 'FeatureCollection',
+            'features': [json.loads(export_feature(feature)) for feature in self.features]
+        }
+
+        # FIXME: QGIS api reprojecting?
+        # Reproject if necessary
+        # if self.reproject:
+        #    self.reproject_featurecollection(feature_collection)
+
+        # Change media
+        self.change_media(feature_collection)
+
+        self.results.update(APIVectorLayerStructure(**{
+            'data': feature_collection,
+            'count': count,
+            'geometryType': self.metadata_layer.geometry_type,
+        }).as_dict())
+
+        # FIXME: add extra fields data by signals and receivers
+        # FIXME: featurecollection = post_serialize_maplayer.send(layer_serializer, layer=self.layer_name)
+        # FIXME: Not sure how to map this to the new QGIS API
 
         # Restore the original subset string
         self.metadata_layer.qgis_layer.setSubsetString(original_subset_string)
@@ -562,6 +674,16 @@ class BaseVectorOnModelApiView(G3WAPIView):
             method = getattr(self, 'response_{}_mode'.format(self.mode_call))
             return method(request)
 
+    def update_extra_results(self):
+        """
+        Add to results the extra data of the before_return_vector_data_layer receivers (i.e. editing constraints)
+        """
+
+        extra_data = before_return_vector_data_layer.send(self)
+        for ed in extra_data:
+            if ed[1] and ed[0].__name__ == 'add_constraints':
+                self.results.results.update(ed[1])
+
     def get_response(self, request, mode_call=None, project_type=None, layer_id=None, **kwargs):
 
         # set layer model object to work
@@ -577,10 +699,7 @@ class BaseVectorOnModelApiView(G3WAPIView):
         if response is None:
 
             # before to send response
-            extra_data = before_return_vector_data_layer.send(self)
-            for ed in extra_data:
-                if ed[1] and ed[0].__name__ == 'add_constraints':
-                    self.results.results.update(ed[1])
+            self.update_extra_results()
 
             # response a APIVectorLayer
             return Response(self.results.results)
@@ -3,6 +3,8 @@ from django.apps import apps
 from django.contrib.gis.geos import GEOSGeometry, GEOSException
 from django.contrib.gis.gdal import GDALException
 from django.core.exceptions import ValidationError
+from django.utils.functional import cached_property
+from guardian.core import ObjectPermissionChecker
 from guardian.shortcuts import get_objects_for_user, get_user_model
 from rest_framework import serializers
 from rest_framework.fields import empty
@@ -39,6 +41,48 @@ def update_serializer_data(serializer_data, data):
                 to_append.append(value)
 
 
+class ProjectLayersContext(object):
+    """
+    Data of all the layers of a project loaded in bulk during project serialization,
+    shared with after_serialized_project_layer receivers to avoid queries for every layer.
+    """
+
+    def __init__(self, layers, user):
+        """
+        :param layers: project layer model instances
+        :param user: request user
+        """
+        self.layers = list(layers)
+        self.user = user
+        self._data = {}
+
+    @cached_property
+    def layer_pks(self):
+        return [l.pk for l in self.layers]
+
+    @cached_property
+    def permission_checker(self):
+        """
+        Guardian permission checker with prefetched user permissions for all project layers
+        """
+
+        checker = ObjectPermissionChecker(self.user)
+        if self.layers:
+            checker.prefetch_perms(self.layers)
+        return checker
+
+    def get(self, name, loader):
+        """
+        Return data by name, loaded once by the loader callable for all project layers
+        :param name: data name, i.e. 'editing_layers'
+        :param loader: callable, receives the context instance and returns the data
+        """
+
+        if name not in self._data:
+            self._data[name] = loader(self)
+        return self._data[name]
+
+
 class BaseLayerSerializer(serializers.ModelSerializer):
     """
     Serializer Class base for layer project
@@ -21,6 +21,18 @@ Arguments:
 """
 pre_save_maplayer = django.dispatch.Signal(providing_args=["layer_metadata", "mode", "data", "user"])
 
+"""Signal sent after edited features are committed to the backend.
+Listeners can invalidate any data cached for the layer.
+
+Arguments:
+    layer: the qdjango Layer instance
+    qgis_layer: the QGIS vector layer
+    user: current user from the request
+    extent: QgsRectangle of the added, updated and deleted features (before and after changes) in layer crs,
+            None if no geometry is changed
+"""
+post_commit_maplayer = django.dispatch.Signal(providing_args=["layer", "qgis_layer", "user", "extent"])
+
 # signal to add extra maplayers attribute: i.e. iternet
 pre_delete_maplayer = django.dispatch.Signal(providing_args=["layer", "data", "user"])
 
@@ -35,7 +47,8 @@ post_serialize_project = django.dispatch.Signal(providing_args=["app_name", "req
 
 # signal after layer serialized data on /api/config/
 # send layer seralized original object and came back only dict data changed
-after_serialized_project_layer = django.dispatch.Signal(providing_args=["layer", "request"])
+# context is a core.api.serializers.ProjectLayersContext instance with bulk loaded data for all project layers
+after_serialized_project_layer = django.dispatch.Signal(providing_args=["layer", "request", "context"])
 
 # signals pre update project
 pre_update_project = django.dispatch.Signal(providing_args=["projectType", "project"])
@@ -12,6 +12,7 @@ __copyright__ = 'Copyright 2020, Gis3w'
 
 import os
 import json
+from unittest.mock import patch
 from rest_framework.test import APITestCase, APIClient
 from django.conf import settings
 from django.urls import reverse
@@ -21,8 +22,12 @@ from qdjango.models import Project
 from django.core.cache import caches
 from qdjango.models import Layer
 
-from core.utils.qgisapi import get_qgis_layer, get_qgis_features
-from qgis.core import QgsRectangle
+from core.utils.qgisapi import (get_qgis_layer, get_qgis_features, get_next_paging_cursor,
+                                encode_paging_cursor, count_qgis_features, bump_layer_data_version,
+                                get_qgis_unique_values, get_coordinate_transform, get_geometries_from_geojson,
+                                get_layer_data_version, get_layer_datasource_key, LAYER_DATA_VERSION_CACHE_KEY,
+                                _count_features_provider_side, _coordinate_transforms)
+from qgis.core import QgsRectangle, QgsFeatureRequest, QgsFeature, QgsVectorLayer
 
 # Re-use test data from qdjango module
 DATASOURCE_PATH = os.path.join(os.getcwd(), 'qdjango', 'tests', 'data')
@@ -122,6 +127,44 @@ class CoreQgisApiTest(APITestCase):
         features = get_qgis_features(qgis_layer, page_size=1000)
         self.assertEqual(len(features), 2)
 
+    def testGetQgisFeaturesCursor(self):
+        """Test QGIS API get_qgis_features with keyset paging cursor"""
+
+        qgis_layer = get_qgis_layer(self.layer)
+        self.assertTrue(qgis_layer.isValid())
+
+        # First page, keyset on pkuid
+        features = get_qgis_features(qgis_layer, page=1, page_size=1)
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]['pkuid'], 1)
+        cursor = get_next_paging_cursor(qgis_layer, features, 1)
+        self.assertIsNotNone(cursor)
+
+        # Second page by cursor matches second page by offset
+        features = get_qgis_features(qgis_layer, cursor=cursor, page_size=1)
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]['pkuid'], 2)
+        features = get_qgis_features(qgis_layer, page=2, page_size=1)
+        self.assertEqual(len(features), 1)
+        self.assertEqual(features[0]['pkuid'], 2)
+
+        # Last page
+        cursor = get_next_paging_cursor(qgis_layer, features, 1)
+        features = get_qgis_features(qgis_layer, cursor=cursor, page_size=1)
+        self.assertEqual(len(features), 0)
+        self.assertIsNone(get_next_paging_cursor(qgis_layer, features, 1))
+
+        # Not a full page: no next cursor
+        features = get_qgis_features(qgis_layer, page=1, page_size=10)
+        self.assertEqual(len(features), 2)
+        self.assertIsNone(get_next_paging_cursor(qgis_layer, features, 10))
+
+        # Invalid cursors
+        with self.assertRaises(ValueError):
+            get_qgis_features(qgis_layer, cursor='not_a_cursor', page_size=1)
+        with self.assertRaises(ValueError):
+            get_qgis_features(qgis_layer, cursor=encode_paging_cursor('name', 'a point'), page_size=1)
+
     def testGetQgisFeaturesOrdering(self):
         """Test QGIS API get_qgis_features with ordering"""
 
@@ -296,3 +339,140 @@ class CoreQgisApiTest(APITestCase):
         features = get_qgis_features(qgis_layer_clone)
         self.assertEqual(len(features), 1)
         self.assertEqual(features[0]['name'], 'another point')
+
+    def testCountQgisFeatures(self):
+        """Test QGIS API count_qgis_features"""
+
+        qgis_layer = get_qgis_layer(self.layer)
+        self.assertTrue(qgis_layer.isValid())
+
+        self.assertEqual(count_qgis_features(qgis_layer), 2)
+        self.assertEqual(count_qgis_features(qgis_layer, search_filter='another'), 1)
+        self.assertEqual(count_qgis_features(qgis_layer, extra_subset_string='name != \'another point\''), 1)
+        self.assertEqual(qgis_layer.subsetString(), '')
+
+        # Provider side count (valid SQL) and streaming count ($id is not SQL)
+        qgis_feature_request = QgsFeatureRequest()
+        qgis_feature_request.setFilterExpression('"name" = \'a point\'')
+        self.assertEqual(count_qgis_features(qgis_layer, qgis_feature_request), 1)
+        qgis_feature_request.setFilterExpression('$id = 2')
+        self.assertEqual(count_qgis_features(qgis_layer, qgis_feature_request), 1)
+        self.assertEqual(qgis_layer.subsetString(), '')
+
+        # Only expressions compiled by the provider are counted provider side
+        qgis_feature_request.setFilterExpression('"name" = \'a point\'')
+        self.assertIsNotNone(_count_features_provider_side(qgis_layer, qgis_feature_request))
+        with patch('core.utils.qgisapi._is_compiled_by_provider', return_value=False):
+            self.assertIsNone(_count_features_provider_side(qgis_layer, qgis_feature_request))
+            self.assertEqual(count_qgis_features(qgis_layer, qgis_feature_request), 1)
+
+        # Estimated metadata counts ignore the subset string
+        with patch('core.utils.qgisapi.QgsDataSourceUri.useEstimatedMetadata', return_value=True):
+            self.assertIsNone(_count_features_provider_side(qgis_layer, qgis_feature_request))
+
+        # Caller request is not changed
+        qgis_feature_request.setLimit(1)
+        self.assertEqual(count_qgis_features(qgis_layer, qgis_feature_request), 1)
+        self.assertEqual(qgis_feature_request.limit(), 1)
+
+        # Count cache
+        with override_settings(G3WADMIN_VECTOR_COUNT_CACHE_TIMEOUT=60):
+            self.assertEqual(count_qgis_features(qgis_layer, search_filter='point'), 2)
+            with patch('core.utils.qgisapi._count_features', return_value=42):
+                # From cache
+                self.assertEqual(count_qgis_features(qgis_layer, search_filter='point'), 2)
+                bump_layer_data_version(qgis_layer)
+                self.assertEqual(count_qgis_features(qgis_layer, search_filter='point'), 42)
+
+    def testLayerDataVersion(self):
+        """Test QGIS API layer data version, stored into the cache shared by processes"""
+
+        qgis_layer = get_qgis_layer(self.layer)
+        cache_key = LAYER_DATA_VERSION_CACHE_KEY.format(get_layer_datasource_key(qgis_layer))
+
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+            'versions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'versions'}
+        }, G3WADMIN_LAYER_DATA_VERSION_CACHE='versions'):
+
+            version = get_layer_data_version(qgis_layer)
+            self.assertEqual(get_layer_data_version(qgis_layer), version)
+            self.assertEqual(caches['versions'].get(cache_key), version)
+            self.assertIsNone(caches['default'].get(cache_key))
+
+            new_version = bump_layer_data_version(qgis_layer)
+            self.assertNotEqual(new_version, version)
+            self.assertEqual(get_layer_data_version(qgis_layer), new_version)
+
+            # versions never expire
+            self.assertEqual(caches['versions']._expire_info.get(caches['versions'].make_key(cache_key)), None)
+
+            # evicted version
+            caches['versions'].delete(cache_key)
+            self.assertNotEqual(get_layer_data_version(qgis_layer), new_version)
+
+    def testGetQgisUniqueValues(self):
+        """Test QGIS API get_qgis_unique_values"""
+
+        qgis_layer = get_qgis_layer(self.layer)
+        self.assertTrue(qgis_layer.isValid())
+
+        self.assertEqual(sorted(get_qgis_unique_values(qgis_layer, 'name')), ['a point', 'another point'])
+        self.assertEqual(len(get_qgis_unique_values(qgis_layer, 'name', limit=1)), 1)
+
+        # Provider side (valid SQL) and streaming ($id is not SQL)
+        qgis_feature_request = QgsFeatureRequest()
+        qgis_feature_request.setFilterExpression('"name" = \'a point\'')
+        self.assertEqual(get_qgis_unique_values(qgis_layer, 'name', qgis_feature_request), ['a point'])
+        qgis_feature_request.setFilterExpression('$id = 2')
+        self.assertEqual(len(get_qgis_unique_values(qgis_layer, 'name', qgis_feature_request)), 1)
+        self.assertEqual(qgis_layer.subsetString(), '')
+
+        with self.assertRaises(ValueError):
+            get_qgis_unique_values(qgis_layer, 'not_a_field')
+
+        # Not SQL providers: provider unique values without filters, NULL values are None for every path
+        memory_layer = QgsVectorLayer('Point?field=name:string', 'memory', 'memory')
+        for name in ('a point', None, 'a point'):
+            feature = QgsFeature(memory_layer.fields())
+            feature.setAttribute('name', name)
+            memory_layer.dataProvider().addFeatures([feature])
+
+        with patch.object(memory_layer, 'getFeatures', wraps=memory_layer.getFeatures) as get_features:
+            self.assertEqual(sorted(get_qgis_unique_values(memory_layer, 'name'), key=str), ['a point', None])
+            get_features.assert_not_called()
+
+        qgis_feature_request = QgsFeatureRequest()
+        qgis_feature_request.setFilterExpression('"name" IS NULL OR "name" = \'a point\'')
+        self.assertEqual(sorted(get_qgis_unique_values(memory_layer, 'name', qgis_feature_request), key=str),
+                         ['a point', None])
+
+    def testGetCoordinateTransform(self):
+        """Test QGIS API get_coordinate_transform and get_geometries_from_geojson"""
+
+        ct = get_coordinate_transform(4326, 3857)
+        self.assertTrue(ct.isValid())
+        self.assertEqual(ct.sourceCrs().authid(), 'EPSG:4326')
+        self.assertEqual(ct.destinationCrs().authid(), 'EPSG:3857')
+
+        # Reused transform
+        with patch('core.utils.qgisapi.QgsCoordinateReferenceSystem') as crs:
+            get_coordinate_transform('4326', '3857')
+            crs.fromEpsgId.assert_not_called()
+
+        # Invalid transforms are not reused
+        self.assertFalse(get_coordinate_transform(4326, 999999).isValid())
+        self.assertNotIn((4326, 999999), _coordinate_transforms)
+        self.assertIn((4326, 3857), _coordinate_transforms)
+
+        geometries = get_geometries_from_geojson([
+            {'type': 'Point', 'coordinates': [11.0, 44.0]},
+            None,
+            {'type': 'LineString', 'coordinates': [[11.0, 44.0], [12.0, 45.0]]}
+        ])
+        self.assertEqual(len(geometries), 3)
+        self.assertTrue(geometries[1].isNull())
+
+        geometries[0].transform(ct)
+        self.assertAlmostEqual(geometries[0].asPoint().x(), 1224514.398, 2)
+        self.assertEqual(get_geometries_from_geojson([]), [])
@@ -11,14 +11,16 @@ __date__ = '2020-04-18'
 __copyright__ = 'Copyright 2015 - 2020, Gis3w'
 
 
+import os
 import re
+import tempfile
 
 from crispy_forms.layout import Div
 from django.core.exceptions import PermissionDenied
 from django.core.files import File
 from django.forms import Form
 from django.http import HttpResponse
-from django.test import RequestFactory, TestCase
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from guardian.exceptions import GuardianError
 from guardian.shortcuts import assign_perm, get_anonymous_user
@@ -31,8 +33,10 @@ from core.utils.forms import crispyBoxBaseLayer, crispyBoxMacroGroups
 from core.utils.general import *
 from core.utils.geo import camel_geometry_type
 from core.utils.ie import modelresource_factory
+from core.utils.models import parse_stored_structure
 from core.utils.projects import countAllProjects
 from core.utils.response import send_file
+from core.utils.vector import MediaPlan
 from qdjango.models import Project
 
 from .base import CoreTestBase
@@ -205,3 +209,61 @@ class CoreUtilsTest(CoreTestBase):
         fobj = File(open(file, 'rb'))
         self.assertEqual(fobj.read(), response.content)
         fobj.close()
+
+    def test_parse_stored_structure(self):
+        """ Test function utils with same name """
+
+        # JSON and python literal (stored by older versions)
+        self.assertEqual(parse_stored_structure('{"a": [true, null]}'), {'a': [True, None]})
+        self.assertEqual(parse_stored_structure("{'a': [True, None]}"), {'a': [True, None]})
+
+        # no code execution
+        self.assertIsNone(parse_stored_structure("__import__('os').getcwd()"))
+
+        # parsed once
+        self.assertIs(parse_stored_structure('[1, 2]'), parse_stored_structure('[1, 2]'))
+
+        # model accessor
+        layer = Project.objects.first().layer_set.first()
+        layer.edittypes = "{'NAME': {'widgetv2type': 'TextEdit', 'values': []}}"
+        self.assertEqual(layer.edittypes_data['NAME']['widgetv2type'], 'TextEdit')
+        layer.edittypes = None
+        self.assertEqual(layer.edittypes_data, {})
+
+    def test_media_plan(self):
+        """ Test MediaPlan change values """
+
+        class MediaLayer(object):
+            pk = 1
+            datasource = 'test_media_plan'
+            edittypes = "{'photo': {'widgetv2type': 'ExternalResource'}, 'name': {'widgetv2type': 'TextEdit'}}"
+
+        # no media fields
+        layer = MediaLayer()
+        layer.edittypes = '{}'
+        self.assertFalse(MediaPlan(layer))
+
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(USER_MEDIA_ROOT=f'{media_root}/'):
+                media_plan = MediaPlan(MediaLayer())
+                self.assertTrue(media_plan)
+                self.assertEqual(media_plan.fields, ['photo'])
+
+                os.makedirs(media_plan.path_to_save)
+                with open(f'{media_plan.path_to_save}/file%201.txt'.replace('%20', ' '), 'w') as f:
+                    f.write('media plan test')
+
+                features = [
+                    {'properties': {'name': 'a', 'photo': 'http://localhost/media_user/qdjango/1/file%201.txt'}},
+                    {'properties': {'name': 'b', 'photo': 'http://localhost/media_user/qdjango/1/missing.png'}},
+                    {'properties': {'name': 'c', 'photo': None}},
+                ]
+                media_plan.change_values(features)
+
+                self.assertEqual(features[0]['properties']['photo'], {
+                    'value': 'http://localhost/media_user/qdjango/1/file%201.txt',
+                    'mime_type': 'text/plain'
+                })
+                self.assertIsNone(features[1]['properties']['photo']['mime_type'])
+                self.assertIsNone(features[2]['properties']['photo'])
+                self.assertEqual(features[0]['properties']['name'], 'a')
@@ -1,4 +1,10 @@
 from model_utils import Choices
+from functools import lru_cache
+import ast
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class G3WChoices(Choices):
@@ -9,4 +15,51 @@ class G3WChoices(Choices):
         self._store((key, key, value), self._triples, self._doubles)
 
 
+@lru_cache(maxsize=2048)
+def parse_stored_structure(value):
+    """
+    Parse a structure (dict, list) stored into a text field: JSON or, for data saved by older versions,
+    python literal. Every stored value is parsed once per process, the returned object is shared
+    and must not be changed.
+    :param value: stored text
+    :return: dict, list or None if value is not valid
+    """
+
+    try:
+        return json.loads(value)
+    except ValueError:
+        pass
+
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError) as e:
+        logger.error(f'Invalid stored structure: {e}')
+        return None
+
+
+class StoredStructure(object):
+    """
+    Read only model attribute with the structure (dict, list) stored into a text field.
+    The stored text is parsed once per process and the parsed object is reused while the text
+    doesn't change: it is shared between model instances and must be copied before changes.
+
+    I.e.: edittypes_data = StoredStructure('edittypes', dict)
+    """
+
+    def __init__(self, field_name, default=None):
+        """
+        :param field_name: name of the model text field
+        :param default: callable returning the value for empty field
+        """
+        self.field_name = field_name
+        self.default = default
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
 
+        value = getattr(instance, self.field_name)
+        parsed = parse_stored_structure(value) if value else None
+        if parsed is None and self.default:
+            return self.default()
+        return parsed
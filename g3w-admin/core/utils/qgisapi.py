@@ -12,14 +12,267 @@ __author__ = 'elpaso@itopen.it'
 __date__ = '2020-02-03'
 __copyright__ = 'Copyright 2020, Gis3W'
 
+import base64
+import json
 import logging
-
-from qgis.core import QgsFeatureRequest, QgsRectangle, QgsVectorLayer
+import re
+import threading
+import time
+from collections import OrderedDict
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from qgis.core import (QgsAbstractFeatureIterator, QgsCoordinateReferenceSystem, QgsCoordinateTransform,
+                       QgsCoordinateTransformContext, QgsDataSourceUri, QgsExpression, QgsFeatureRequest, QgsFields,
+                       QgsJsonUtils, QgsRectangle, QgsVectorLayer)
+from qgis.PyQt.QtCore import QVariant
 
 from qdjango.apps import get_qgs_project
 
 logger = logging.getLogger(__file__)
 
+# Providers that can run count and distinct queries with a SQL subset string
+# (i.e. SELECT count(*) ... WHERE <subset string>)
+SQL_SUBSET_STRING_PROVIDERS = ('postgres', 'spatialite')
+
+# Providers with a SQL datasource uri
+SQL_DATASOURCE_PROVIDERS = ('postgres', 'spatialite', 'mssql', 'oracle')
+
+LAYER_DATA_VERSION_CACHE_KEY = 'qgisapi_layer_data_version_{}'
+LAYER_COUNT_CACHE_KEY = 'qgisapi_layer_count_{}_{}_{}'
+
+# Per process coordinate transforms by (from srid, to srid), least recently used first
+_coordinate_transforms = OrderedDict()
+_coordinate_transforms_lock = threading.Lock()
+
+
+def get_layer_datasource_key(qgis_layer):
+    """Returns a key identifying the data source of a QGIS vector layer,
+    the subset string of the layer is not taken into account.
+
+    :param qgis_layer: the QGIS vector layer instance
+    :type qgis_layer: QgsVectorLayer
+    :return: md5 hex digest of the provider type and source
+    :rtype: str
+    """
+
+    source = qgis_layer.source()
+    if qgis_layer.providerType() in SQL_DATASOURCE_PROVIDERS:
+        uri = QgsDataSourceUri(source)
+        uri.setSql('')
+        source = uri.uri(False)
+    else:
+        source = source.split('|subset=')[0]
+
+    return md5('{}:{}'.format(qgis_layer.providerType(), source).encode('utf-8')).hexdigest()
+
+
+def _get_layer_data_version_cache():
+    """Returns the Django cache of the layers data versions: settings.G3WADMIN_LAYER_DATA_VERSION_CACHE,
+    it has to be shared by all the worker processes (i.e. memcached, redis, database) to invalidate
+    the data caches of all the processes on editing."""
+
+    return caches[getattr(settings, 'G3WADMIN_LAYER_DATA_VERSION_CACHE', 'default')]
+
+
+def get_layer_data_version(qgis_layer):
+    """Returns the current data version of the layer data source,
+    the version changes only when the data are edited by g3w-admin: data edited
+    outside g3w-admin are seen after the timeout of every data cache.
+
+    :param qgis_layer: the QGIS vector layer instance
+    :type qgis_layer: QgsVectorLayer
+    :return: the data version
+    :rtype: str
+    """
+
+    cache_key = LAYER_DATA_VERSION_CACHE_KEY.format(get_layer_datasource_key(qgis_layer))
+    version = _get_layer_data_version_cache().get(cache_key)
+    if version is None:
+        version = bump_layer_data_version(qgis_layer)
+    return version
+
+
+def bump_layer_data_version(qgis_layer):
+    """Changes the data version of the layer data source, it invalidates
+    all the data caches (i.e. features count) of the layers sharing
+    the same data source.
+
+    :param qgis_layer: the QGIS vector layer instance
+    :type qgis_layer: QgsVectorLayer
+    :return: the new data version
+    :rtype: str
+    """
+
+    version = '{:f}'.format(time.time())
+    _get_layer_data_version_cache().set(LAYER_DATA_VERSION_CACHE_KEY.format(get_layer_datasource_key(qgis_layer)),
+                                        version, None)
+    return version
+
+
+def get_coordinate_transform(from_srid, to_srid):
+    """Returns a coordinate transform between two CRSs, valid transforms are created once
+    per process and reused (CRS database lookups and PROJ pipeline creation are expensive).
+
+    :param from_srid: source CRS postgis srid
+    :type from_srid: int
+    :param to_srid: destination CRS postgis srid
+    :type to_srid: int
+    :return: the coordinate transform
+    :rtype: QgsCoordinateTransform
+    """
+
+    key = (int(from_srid), int(to_srid))
+    with _coordinate_transforms_lock:
+        ct = _coordinate_transforms.get(key)
+        if ct is not None:
+            _coordinate_transforms.move_to_end(key)
+
+    if ct is None:
+        ct = QgsCoordinateTransform(QgsCoordinateReferenceSystem.fromEpsgId(key[0]),
+                                    QgsCoordinateReferenceSystem.fromEpsgId(key[1]),
+                                    QgsCoordinateTransformContext())
+
+        # invalid transforms (i.e. unknown CRS) are not reused: they are built again by next calls
+        if not ct.isValid():
+            logger.warning('Invalid coordinate transform from EPSG:{} to EPSG:{}'.format(*key))
+            return ct
+
+        with _coordinate_transforms_lock:
+            _coordinate_transforms[key] = ct
+            while len(_coordinate_transforms) > getattr(settings, 'G3WADMIN_COORDINATE_TRANSFORM_CACHE_SIZE', 64):
+                _coordinate_transforms.popitem(last=False)
+
+    # transforms are implicitly shared: the copy is cheap and the cached instance is never changed by callers
+    return QgsCoordinateTransform(ct)
+
+
+def get_geometries_from_geojson(geojson_geometries):
+    """Parses GeoJSON geometries with a single call to QgsJsonUtils
+
+    :param geojson_geometries: GeoJSON geometries (dict), None for features without geometry
+    :type geojson_geometries: list
+    :return: the geometries, None if some geometry could not be parsed
+    :rtype: list
+    """
+
+    if not geojson_geometries:
+        return []
+
+    features = QgsJsonUtils.stringToFeatureList(json.dumps({
+        'type': 'FeatureCollection',
+        'features': [{'type': 'Feature', 'geometry': g, 'properties': {}} for g in geojson_geometries]
+    }), QgsFields(), None)  # UTF8 codec
+
+    if len(features) != len(geojson_geometries):
+        return None
+
+    return [f.geometry() for f in features]
+
+
+def encode_paging_cursor(field_name, value):
+    """Returns an opaque paging cursor for a keyset (last seen key) value
+
+    :param field_name: the name of the key field
+    :type field_name: str
+    :param value: the last seen value of the key field
+    :type value: int, float or str
+    :return: the URL safe cursor string
+    :rtype: str
+    """
+
+    return base64.urlsafe_b64encode(json.dumps([field_name, value]).encode('utf-8')).decode('ascii')
+
+
+def decode_paging_cursor(cursor):
+    """Decodes an opaque paging cursor created by encode_paging_cursor
+
+    :param cursor: the cursor string
+    :type cursor: str
+    :raises ValueError: if the cursor is not valid
+    :return: a (field_name, value) tuple
+    :rtype: tuple
+    """
+
+    try:
+        field_name, value = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError('Invalid paging cursor: %s' % cursor)
+
+    if not isinstance(field_name, str) or not isinstance(value, (int, float, str)):
+        raise ValueError('Invalid paging cursor: %s' % cursor)
+
+    return field_name, value
+
+
+def get_keyset_field(qgis_layer, qgis_feature_request=None):
+    """Returns the key field that can be used for keyset paging of the layer
+    with the ordering of the feature request, if any.
+
+    Keyset paging requires a single numeric or string primary key column and
+    the request to be either not ordered or ordered by that column only.
+
+    :param qgis_layer: the QGIS vector layer instance
+    :type qgis_layer: QgsVectorLayer
+    :param qgis_feature_request: the QGIS feature request
+    :type qgis_feature_request: QgsFeatureRequest, optional
+    :return: a (field_name, ascending) tuple or None
+    :rtype: tuple, None
+    """
+
+    pk_attributes = qgis_layer.primaryKeyAttributes()
+    if len(pk_attributes) != 1:
+        return None
+
+    field = qgis_layer.fields()[pk_attributes[0]]
+    if not field.isNumeric() and field.type() != QVariant.String:
+        return None
+
+    if qgis_feature_request is not None and qgis_feature_request.filterType() == QgsFeatureRequest.FilterFids:
+        return None
+
+    ascending = True
+    if qgis_feature_request is not None and len(qgis_feature_request.orderBy()):
+        order_by = qgis_feature_request.orderBy()
+        if len(order_by) != 1:
+            return None
+        clause = order_by[0]
+        if not clause.expression().isField() or \
+                list(clause.expression().referencedColumns()) != [field.name()]:
+            return None
+        ascending = clause.ascending()
+
+    return field.name(), ascending
+
+
+def get_next_paging_cursor(qgis_layer, features, page_size, qgis_feature_request=None):
+    """Returns the cursor for the page following the given features or None
+    if keyset paging is not available or there are no more features.
+
+    :param qgis_layer: the QGIS vector layer instance
+    :type qgis_layer: QgsVectorLayer
+    :param features: the features of the current page
+    :type features: QgsFeature list
+    :param page_size: the page size
+    :type page_size: int
+    :param qgis_feature_request: the QGIS feature request used to fetch the page
+    :type qgis_feature_request: QgsFeatureRequest, optional
+    :return: the cursor or None
+    :rtype: str, None
+    """
+
+    keyset = get_keyset_field(qgis_layer, qgis_feature_request)
+    if keyset is None or not features or len(features) < int(page_size):
+        return None
+
+    value = features[-1].attribute(keyset[0])
+    if not isinstance(value, (int, float, str)):
+        return None
+
+    return encode_paging_cursor(keyset[0], value)
+
+
 def get_qgis_layer(layer_info):
     """Returns a QGIS vector layer from a layer information record.
     The layer is normally not a clone but it is the live
@@ -53,8 +306,11 @@ def __get_qgis_features(qgis_layer,
                         ordering=None,
                         exclude_fields=None,
                         extra_expression=None,
-                        extra_subset_string=None):
-    """Private implementation for count and get"""
+                        extra_subset_string=None,
+                        cursor=None,
+                        count_only=False):
+    """Private implementation for count and get, returns the number of
+    features instead of the features list if count_only is True"""
 
     if qgis_feature_request is None:
         qgis_feature_request = QgsFeatureRequest()
@@ -102,15 +358,11 @@ def __get_qgis_features(qgis_layer,
         expression_parts.append(' AND '.join(exp_parts))
 
     offset = 0
-    feature_count = qgis_layer.featureCount()
 
-    if page is not None and page_size is not None:
+    if (page is not None or cursor is not None) and page_size is not None:
         page_size = int(page_size)
-        page = int(page)
+        page = int(page) if page is not None else 1
         offset = page_size * (page - 1)
-        feature_count =  page_size * page
-        # Set to max, without taking filters into account
-        qgis_feature_request.setLimit(feature_count)
     else:
         page_size = None  # make sure it's none
 
@@ -118,6 +370,26 @@ def __get_qgis_features(qgis_layer,
     if expression_parts:
         qgis_feature_request.setFilterExpression('(' + ') AND ('.join(expression_parts) + ')')
 
+    # Keyset paging: LIMIT and "key > last seen key" are compiled by the
+    # provider, the python skip loop is only used as fallback
+    keyset = None
+    if page_size is not None:
+        keyset = get_keyset_field(qgis_layer, qgis_feature_request)
+
+    if cursor is not None:
+        field_name, last_value = decode_paging_cursor(cursor)
+        if keyset is None or keyset[0] != field_name:
+            raise ValueError('Paging cursor is not valid for layer %s' % qgis_layer.name())
+
+    if keyset is not None:
+        # Work on a copy: the caller request is reused for counting
+        qgis_feature_request = QgsFeatureRequest(qgis_feature_request)
+        qgis_feature_request.setOrderBy(QgsFeatureRequest.OrderBy(
+            [QgsFeatureRequest.OrderByClause(QgsExpression.quotedColumnRef(keyset[0]), keyset[1])]))
+        qgis_feature_request.setLimit(page_size)
+    elif page_size is not None:
+        # Set to max, without taking filters into account
+        qgis_feature_request.setLimit(page_size * page)
 
     logger.debug('Fetching features from layer {layer_name} - filter expression: {filter} - BBOX: {bbox}'.format(
         layer_name=qgis_layer.name(),
@@ -135,24 +407,223 @@ def __get_qgis_features(qgis_layer,
         else:
             qgis_layer.setSubsetString(extra_subset_string)
 
-    iterator = qgis_layer.getFeatures(qgis_feature_request)
-
     try:
-        for _ in range(offset):
-            next(iterator)
-        if page_size is not None:
-            for __ in range(page_size):
-                features.append(next(iterator))
-        else:
-            while True:
-                features.append(next(iterator))
-    except StopIteration:
-        pass
+        if keyset is not None:
+            field_name, ascending = keyset
+            if cursor is None and offset > 0:
+                last_value = _get_keyset_value_at_offset(qgis_layer, qgis_feature_request, field_name, offset)
+                if last_value is None:
+                    return features
+            if cursor is not None or offset > 0:
+                qgis_feature_request.combineFilterExpression('{field} {operator} {value}'.format(
+                    field=QgsExpression.quotedColumnRef(field_name),
+                    operator='>' if ascending else '<',
+                    value=QgsExpression.quotedValue(last_value)))
+            offset = 0
+
+        if count_only:
+            return _count_features(qgis_layer, qgis_feature_request)
+
+        iterator = qgis_layer.getFeatures(qgis_feature_request)
+
+        try:
+            for _ in range(offset):
+                next(iterator)
+            if page_size is not None:
+                for __ in range(page_size):
+                    features.append(next(iterator))
+            else:
+                while True:
+                    features.append(next(iterator))
+        except StopIteration:
+            pass
+
+    finally:
+        if extra_subset_string is not None:
+            qgis_layer.setSubsetString(original_subset_string)
 
-    if extra_subset_string is not None:
+    return features
+
+
+def _get_keyset_value_at_offset(qgis_layer, qgis_feature_request, field_name, offset):
+    """Returns the value of the key field of the feature at position offset - 1
+    of the ordered request, only the key field is fetched from the provider.
+    Returns None if the request returns less than offset features."""
+
+    key_request = QgsFeatureRequest(qgis_feature_request)
+    key_request.setFlags(QgsFeatureRequest.NoGeometry)
+    key_request.setSubsetOfAttributes([field_name], qgis_layer.fields())
+    key_request.setLimit(offset)
+
+    value = None
+    count = 0
+    for feature in qgis_layer.getFeatures(key_request):
+        value = feature.attribute(field_name)
+        count += 1
+
+    return value if count == offset else None
+
+
+def _count_features(qgis_layer, qgis_feature_request):
+    """Counts the features of the request: the count is executed by the
+    provider (SELECT count(*)) when the request filter expression is valid SQL
+    for the provider, else the features are streamed and counted without
+    storing them."""
+
+    count = _count_features_provider_side(qgis_layer, qgis_feature_request)
+    if count is not None:
+        return count
+
+    qgis_feature_request.setFlags(QgsFeatureRequest.NoGeometry)
+    qgis_feature_request.setNoAttributes()
+
+    count = 0
+    for _ in qgis_layer.getFeatures(qgis_feature_request):
+        count += 1
+
+    return count
+
+
+def _count_features_provider_side(qgis_layer, qgis_feature_request):
+    """Returns the features count computed by the provider or None if
+    the request cannot be translated into a provider subset string."""
+
+    return _run_provider_side(qgis_layer, qgis_feature_request, lambda layer: layer.featureCount())
+
+
+def _run_provider_side(qgis_layer, qgis_feature_request, function):
+    """Translates the request filters into a provider subset string of the layer
+    and returns the result of function(qgis_layer), the original subset string
+    is restored afterwards. Requests without filters run function(qgis_layer) for every provider.
+    Returns None if the request filters cannot be translated into a subset string."""
+
+    if not qgis_feature_request.filterRect().isEmpty() or \
+            qgis_feature_request.filterType() not in (QgsFeatureRequest.FilterNone, QgsFeatureRequest.FilterExpression):
+        return None
+
+    # Without filters every provider runs the function
+    if qgis_feature_request.filterType() == QgsFeatureRequest.FilterNone:
+        return function(qgis_layer)
+
+    if qgis_layer.providerType() not in SQL_SUBSET_STRING_PROVIDERS:
+        return None
+
+    # Estimated metadata counts ignore the subset string
+    if QgsDataSourceUri(qgis_layer.source()).useEstimatedMetadata():
+        return None
+
+    # QGIS variables, $ functions and backslash escaped quotes are not SQL
+    expression = qgis_feature_request.filterExpression().expression()
+    if re.search(r'[$@\\]', expression) or not _is_compiled_by_provider(qgis_layer, qgis_feature_request):
+        return None
+
+    original_subset_string = qgis_layer.subsetString()
+    if original_subset_string:
+        subset_string = '({}) AND ({})'.format(original_subset_string, expression)
+    else:
+        subset_string = expression
+
+    # The provider validates the subset string
+    try:
+        if not qgis_layer.setSubsetString(subset_string):
+            return None
+        return function(qgis_layer)
+    finally:
         qgis_layer.setSubsetString(original_subset_string)
 
-    return features
+
+def _is_compiled_by_provider(qgis_layer, qgis_feature_request):
+    """Returns True if the filter expression of the request is entirely compiled into SQL
+    by the provider: only then the expression has the same meaning as a subset string
+    (i.e. integer division and string concatenation are not compiled)."""
+
+    request = QgsFeatureRequest(qgis_feature_request)
+    request.setFlags(QgsFeatureRequest.NoGeometry)
+    request.setNoAttributes()
+    request.setLimit(1)
+
+    iterator = qgis_layer.getFeatures(request)
+    try:
+        return iterator.compileStatus() == QgsAbstractFeatureIterator.Compiled
+    finally:
+        iterator.close()
+
+
+def _get_count_cache_key(qgis_layer, qgis_feature_request, *filters):
+    """Returns the cache key for the count of the features of the layer
+    matching the request and the filters"""
+
+    filter_expression = qgis_feature_request.filterExpression()
+    filter_parts = [
+        qgis_layer.subsetString(),
+        filter_expression.expression() if filter_expression else '',
+        qgis_feature_request.filterRect().toString(),
+        qgis_feature_request.filterFid(),
+        sorted(qgis_feature_request.filterFids()),
+    ] + [f.toString() if isinstance(f, QgsRectangle) else f for f in filters]
+
+    filter_hash = md5(json.dumps(filter_parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    return LAYER_COUNT_CACHE_KEY.format(get_layer_datasource_key(qgis_layer),
+                                        get_layer_data_version(qgis_layer),
+                                        filter_hash)
+
+
+def _null_to_none(value):
+    """Returns None for NULL QVariant values"""
+
+    return None if isinstance(value, QVariant) and value.isNull() else value
+
+
+def get_qgis_unique_values(qgis_layer, field_name, qgis_feature_request=None, limit=None):
+    """Returns the distinct values of a field of the QGIS vector layer,
+    with the (optional) filters of the feature request.
+
+    The SELECT DISTINCT query is executed by the provider when there are no filters
+    or when the filters can be translated into a provider subset string, otherwise
+    only the field values (no geometry) are streamed into a set.
+
+    :param qgis_layer: the QGIS vector layer instance
+    :type qgis_layer: QgsVectorLayer
+    :param field_name: the field name
+    :type field_name: str
+    :param qgis_feature_request: the QGIS feature request
+    :type qgis_feature_request: QgsFeatureRequest, optional
+    :param limit: max number of values to return, defaults to None (all values)
+    :type limit: int, optional
+    :raises ValueError: if the field does not exist
+    :return: list of unique values
+    :rtype: list
+    """
+
+    field_index = qgis_layer.fields().lookupField(field_name)
+    if field_index < 0:
+        raise ValueError('Field %s does not exist in layer %s' % (field_name, qgis_layer.name()))
+
+    limit = int(limit) if limit else -1
+
+    if qgis_feature_request is None:
+        qgis_feature_request = QgsFeatureRequest()
+
+    values = _run_provider_side(qgis_layer, qgis_feature_request,
+                                lambda layer: layer.uniqueValues(field_index, limit))
+    if values is not None:
+        return [_null_to_none(value) for value in values]
+
+    qgis_feature_request = QgsFeatureRequest(qgis_feature_request)
+    qgis_feature_request.setFlags(QgsFeatureRequest.NoGeometry)
+    qgis_feature_request.setSubsetOfAttributes([field_index])
+    qgis_feature_request.setOrderBy(QgsFeatureRequest.OrderBy())
+    qgis_feature_request.setLimit(-1)
+
+    values = set()
+    for feature in qgis_layer.getFeatures(qgis_feature_request):
+        value = feature.attribute(field_index)
+        values.add(_null_to_none(value))
+        if len(values) == limit:
+            break
+
+    return list(values)
 
 
 def get_qgis_features(qgis_layer,
@@ -166,7 +637,8 @@ def get_qgis_features(qgis_layer,
                       ordering=None,
                       exclude_fields=None,
                       extra_expression=None,
-                      extra_subset_string=None):
+                      extra_subset_string=None,
+                      cursor=None):
     """Returns a list of QgsFeatures from the QGIS vector layer,
     with optional filter options.
 
@@ -200,6 +672,9 @@ def get_qgis_features(qgis_layer,
     :type: extra_expression: str, optional
     :param: extra_subset_string: extra subset string (provider side WHERE condition) for filtering features
     :type: extra_subset_string: str, optional
+    :param: cursor: opaque keyset paging cursor returned by get_next_paging_cursor, requires page_size
+    :type: cursor: str, optional
+    :raises ValueError: if the cursor is not valid for the layer
     :return: list of features
     :rtype: QgsFeature list
     """
@@ -215,7 +690,8 @@ def get_qgis_features(qgis_layer,
                       ordering,
                       exclude_fields,
                       extra_expression,
-                      extra_subset_string)
+                      extra_subset_string,
+                      cursor)
 
 def count_qgis_features(qgis_layer,
                       qgis_feature_request=None,
@@ -225,9 +701,14 @@ def count_qgis_features(qgis_layer,
                       extra_expression=None,
                       extra_subset_string=None,
                       **kwargs):
-    """Returns a list of QgsFeatures from the QGIS vector layer,
+    """Returns the number of QgsFeatures from the QGIS vector layer,
     with optional filter options.
 
+    The count is computed by the provider when possible, otherwise the
+    features are streamed and counted without storing them. If the setting
+    G3WADMIN_VECTOR_COUNT_CACHE_TIMEOUT is set, the counts are cached for the
+    layer data version (see bump_layer_data_version).
+
     The API can be used in two distinct ways (that are not mutually exclusive):
 
     1. pass in a pre-configured QgsFeatureRequest instance
@@ -249,14 +730,14 @@ def count_qgis_features(qgis_layer,
     :type: extra_expression: str, optional
     :param: extra_subset_string: extra subset string (provider side WHERE condition) for filtering features
     :type: extra_subset_string: str, optional
-    :return: list of features
-    :rtype: QgsFeature list
+    :return: number of features
+    :rtype: int
     """
 
     # Fast track for no filters
     no_filters = (attribute_filters is None
         and (bbox_filter is None or bbox_filter.isEmpty()) and
-        attribute_filters is None and
+        search_filter is None and
         extra_expression is None and
         extra_subset_string is None)
 
@@ -264,18 +745,29 @@ def count_qgis_features(qgis_layer,
         no_filters = (no_filters and
             qgis_feature_request.filterRect().isEmpty() and
             qgis_feature_request.filterType() == QgsFeatureRequest.FilterNone)
+        # Work on a copy: the caller request is not changed
+        qgis_feature_request = QgsFeatureRequest(qgis_feature_request)
     else:
         qgis_feature_request = QgsFeatureRequest()
 
     if no_filters:
         return qgis_layer.featureCount()
 
+    # Ordering and limits are not relevant for counting
     qgis_feature_request.setNoAttributes()
-    if qgis_feature_request.limit() != -1:
-        qgis_feature_request = QgsFeatureRequest(qgis_feature_request)
-        qgis_feature_request.setLimit(-1)
-
-    return len(__get_qgis_features(qgis_layer,
+    qgis_feature_request.setLimit(-1)
+    qgis_feature_request.setOrderBy(QgsFeatureRequest.OrderBy())
+
+    # Optional count cache, invalidated by bump_layer_data_version()
+    cache_timeout = getattr(settings, 'G3WADMIN_VECTOR_COUNT_CACHE_TIMEOUT', 0)
+    if cache_timeout:
+        cache_key = _get_count_cache_key(qgis_layer, qgis_feature_request, bbox_filter, attribute_filters,
+                                         search_filter, extra_expression, extra_subset_string)
+        count = cache.get(cache_key)
+        if count is not None:
+            return count
+
+    count = __get_qgis_features(qgis_layer,
                       qgis_feature_request,
                       bbox_filter,
                       attribute_filters,
@@ -286,5 +778,11 @@ def count_qgis_features(qgis_layer,
                       None, #ordering,
                       None, #exclude_fields,
                       extra_expression,
-                      extra_subset_string))
+                      extra_subset_string,
+                      None, #cursor
+                      True) #count_only
+
+    if cache_timeout:
+        cache.set(cache_key, count, cache_timeout)
 
+    return count
@@ -1,6 +1,11 @@
+from django.conf import settings
 from django.http.response import HttpResponse
 from django.core.files import File
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django_file_form.uploader import FileFormUploadBackend
+import calendar
+import hashlib
 import os
 
 def send_file(output_filename, content_type, file, attachment=True):
@@ -18,6 +23,69 @@ def send_file(output_filename, content_type, file, attachment=True):
     return response
 
 
+def make_etag(*parts):
+    """
+    Build a strong ETag value from parts
+    :param parts: values identifying the response content
+    :return: quoted ETag, str
+    """
+
+    etag = hashlib.md5()
+    for part in parts:
+        etag.update(part if isinstance(part, bytes) else str(part).encode())
+        etag.update(b'|')
+    return '"{}"'.format(etag.hexdigest())
+
+
+def get_cache_control(*keys):
+    """
+    Return the Cache-Control header value of the first key in settings.G3WADMIN_CACHE_CONTROL,
+    i.e.: get_cache_control('WMS:GETCAPABILITIES', 'WMS')
+    :return: str, None if no policy is set
+    """
+
+    policies = getattr(settings, 'G3WADMIN_CACHE_CONTROL', {})
+    for key in keys:
+        if key in policies:
+            return policies[key]
+    return None
+
+
+def patch_conditional_headers(response, etag=None, last_modified=None, cache_control=None):
+    """
+    Set validators and Cache-Control headers on a response
+    :param etag: quoted ETag
+    :param last_modified: datetime
+    :param cache_control: Cache-Control header value
+    :return: response
+    """
+
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(calendar.timegm(last_modified.utctimetuple()))
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    return response
+
+
+def get_not_modified_response(request, etag=None, last_modified=None, cache_control=None):
+    """
+    Return a 304 Not Modified response if request conditional headers (If-None-Match, If-Modified-Since)
+    match the validators, None otherwise
+    :param etag: quoted ETag
+    :param last_modified: datetime
+    :param cache_control: Cache-Control header value
+    :return: HttpResponseNotModified, None
+    """
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=calendar.timegm(last_modified.utctimetuple()) if last_modified else None)
+    if response is not None:
+        patch_conditional_headers(response, etag, last_modified, cache_control)
+    return response
+
+
 class G3WFileFormUploadBackend(FileFormUploadBackend):
     """ Extend default upload backend class of django-file-form module """
 
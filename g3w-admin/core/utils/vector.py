@@ -3,6 +3,8 @@ from django.urls import reverse
 from . import file_path_mime
 from .response import send_file
 from .db import build_dango_connection_name
+from .models import parse_stored_structure
+from functools import lru_cache
 import urllib.request, urllib.parse, urllib.error
 import os
 import shutil
@@ -11,6 +13,28 @@ import logging
 logger = logging.getLogger('module_core')
 
 
+@lru_cache(maxsize=4096)
+def _file_path_mime_by_mtime(file_path, mtime):
+    """ Mime type of a file version, cached by path and modification time """
+    return file_path_mime(file_path)
+
+
+def get_file_mime(file_path):
+    """
+    Return the mime type of a file, None if it doesn't exist.
+    Mime types are read once for every file version (modification time).
+    :param file_path: file system path
+    :return: str, None
+    """
+
+    try:
+        mtime = os.stat(file_path).st_mtime
+    except OSError:
+        return None
+
+    return _file_path_mime_by_mtime(file_path, mtime)
+
+
 class BaseUserMediaHandler(object):
     """
     Class to handle input/output user media file uploaded in editing mode
@@ -90,7 +114,7 @@ class BaseUserMediaHandler(object):
         """ Build and save media value from client """
         self.set_layer_md5_source()
         current_instance = self.get_current_instance()
-        edittypes = eval(self.layer.edittypes)
+        edittypes = parse_stored_structure(self.layer.edittypes) or {}
 
         for field, data in list(edittypes.items()):
             if data['widgetv2type'] == 'ExternalResource' and field in self.feature_properties:
@@ -107,8 +131,7 @@ class BaseUserMediaHandler(object):
                     if self.feature_properties[field]:
                         self.feature_properties[field] = {
                             'value': self.feature_properties[field],
-                            'mime_type': file_path_mime(path_file_to_save) if os.path.exists(path_file_to_save)
-                            else None
+                            'mime_type': get_file_mime(path_file_to_save)
                         }
 
                 else:
@@ -163,7 +186,7 @@ class BaseUserMediaHandler(object):
     def change_value(self):
 
         self.set_layer_md5_source()
-        edittypes = eval(self.layer.edittypes)
+        edittypes = parse_stored_structure(self.layer.edittypes) or {}
 
     def send_file(self):
         """ Send current media saved """
@@ -172,4 +195,55 @@ class BaseUserMediaHandler(object):
         return send_file(self.file_name, file_path_mime(file_path), file_path, False)
 
 
+class MediaPlan(object):
+    """
+    Data computed once for a layer to change the media values of many features:
+    the ExternalResource fields and the media storage path.
+    """
+
+    def __init__(self, layer, handler_class=BaseUserMediaHandler):
+        """
+        :param layer: layer model instance
+        :param handler_class: user media handler class
+        """
+
+        self.handler = handler_class(layer=layer)
+        edittypes = parse_stored_structure(getattr(layer, 'edittypes', None) or '{}') or {}
+        self.fields = [field for field, data in edittypes.items() if data.get('widgetv2type') == 'ExternalResource']
+
+        if self.fields:
+            self.handler.set_layer_md5_source()
+            self.path_to_save = self.handler.get_path_to_save()
+
+    def __bool__(self):
+        return bool(self.fields)
+
+    def change_values(self, features):
+        """
+        Change the media values of features to client structure: {'value': <url>, 'mime_type': <mime type>}
+        Every media file is checked once.
+        :param features: GeoJSON features or features properties
+        """
+
+        if not self.fields:
+            return
+
+        mimes = {}
+        for feature in features:
+            properties = feature['properties'] if 'properties' in feature else feature
+            for field in self.fields:
+                value = properties.get(field)
+                if not value:
+                    continue
+
+                file_name = self.handler.get_file_name(value)
+                if file_name:
+                    file_name = urllib.parse.unquote(file_name)
+
+                if file_name not in mimes:
+                    mimes[file_name] = get_file_mime('{}/{}'.format(self.path_to_save, file_name))
 
+                properties[field] = {
+                    'value': value,
+                    'mime_type': mimes[file_name]
+                }
@@ -7,7 +7,8 @@ class G3WEditingLayerAdmin(admin.ModelAdmin):
     list_display = (
         'id',
         'app_name',
-        'layer_id'
+        'layer_id',
+        'lock_mode'
     )
 
 
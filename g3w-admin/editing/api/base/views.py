@@ -7,21 +7,23 @@ from django.core.files.images import ImageFile
 from django.db import IntegrityError, transaction
 from django.db.models import AutoField, FileField, ImageField
 from django.utils.translation import ugettext_lazy as _
-from qgis.core import QgsDataSourceUri, QgsFeature, QgsJsonUtils, QgsJsonExporter
-from rest_framework.exceptions import ValidationError
+from qgis.core import (QgsDataSourceUri, QgsFeature, QgsFeatureRequest, QgsJsonUtils, QgsJsonExporter,
+                       QgsRectangle)
+from rest_framework.exceptions import ParseError, ValidationError
 
 from core.api.base.vector import MetadataVectorLayer
 from core.api.base.views import BaseVectorOnModelApiView
 from core.signals import (post_save_maplayer, pre_delete_maplayer,
-                          pre_save_maplayer)
+                          pre_save_maplayer, post_commit_maplayer)
+from core.utils.qgisapi import bump_layer_data_version, get_geometries_from_geojson
 from editing.models import (EDITING_POST_DATA_ADDED, EDITING_POST_DATA_DELETED,
-                            EDITING_POST_DATA_UPDATED)
+                            EDITING_POST_DATA_UPDATED, EDITING_LOCK_MODE_ON_DEMAND, G3WEditingLayer)
 from editing.utils import LayerLock
 from editing.utils.data import clear_session_for_uploaded_files
 from qdjango.apps import get_qgs_project
 from qdjango.models import Layer
 from qdjango.utils.data import QGIS_LAYER_TYPE_NO_GEOM
-from qdjango.utils.validators import feature_validator
+from qdjango.utils.validators import feature_validator, features_unique_validator
 import logging
 
 logger = logging.getLogger('module_editing')
@@ -29,6 +31,7 @@ logger = logging.getLogger('module_editing')
 MODE_EDITING = 'editing'
 MODE_UNLOCK = 'unlock'
 MODE_COMMIT = 'commit'
+MODE_LOCK = 'lock'
 
 MAPPING_DJANGO_MODEL_FIELD_FILE_OBJECT = {
     ImageField: ImageFile,
@@ -48,6 +51,9 @@ class BaseEditingVectorOnModelApiView(BaseVectorOnModelApiView):
 
     relations_data_key = 'relations'
 
+    # Providers writing batches of features atomically
+    batch_write_providers = ('postgres', 'spatialite')
+
     no_more_lock_feature_msg = u'Spiacente ma la Feature id ' \
         u'{} del layer {} non è modificabile ' \
         u'perché non più ' \
@@ -57,7 +63,8 @@ class BaseEditingVectorOnModelApiView(BaseVectorOnModelApiView):
     modes_call_available = [
         MODE_UNLOCK,
         MODE_EDITING,
-        MODE_COMMIT
+        MODE_COMMIT,
+        MODE_LOCK
     ]
 
     def initial(self, request, *args, **kwargs):
@@ -82,15 +89,70 @@ class BaseEditingVectorOnModelApiView(BaseVectorOnModelApiView):
         """
         super().response_data_mode(request)
 
-        # lock features and get:
-        feature_ids = [str(f.id()) for f in self.features]
-        features_locked = self.metadata_layer.lock.lockFeatures(feature_ids)
+        # with lock on demand features are locked by MODE_LOCK calls
+        if self.lock_mode == EDITING_LOCK_MODE_ON_DEMAND:
+            features_locked = []
+        else:
+            # lock features and get:
+            feature_ids = [str(f.id()) for f in self.features]
+            features_locked = self.metadata_layer.lock.lockFeatures(feature_ids)
 
         # update response
         self.results.update({
             'featurelocks': features_locked
         })
 
+    @property
+    def lock_mode(self):
+        """Features lock mode of the editing layer"""
+
+        try:
+            return G3WEditingLayer.objects.get(app_name=self.layer._meta.app_label, layer_id=self.layer.pk).lock_mode
+        except G3WEditingLayer.DoesNotExist:
+            return None
+
+    def response_lock_mode(self, request):
+        """
+        Lock features on demand by a single query: the features by ids ('fids' param, comma separated ids or list)
+        and/or the features of the request filters (i.e. 'in_bbox' param), returns features locked.
+        :param request: API request object
+        """
+
+        fids = request.data.get('fids') if hasattr(request.data, 'get') else None
+        if fids is None:
+            fids = request.query_params.get('fids')
+        if isinstance(fids, str):
+            fids = [fid for fid in fids.split(',') if fid]
+
+        # same params source of IntersectsBBoxFilter
+        request_data = request.data if request.method == 'POST' else request.query_params
+        if not fids and not (hasattr(request_data, 'get') and request_data.get('in_bbox')):
+            raise ParseError(_('Features to lock are required: \'fids\' or \'in_bbox\' parameter'))
+
+        qgis_layer = self.metadata_layer.qgis_layer
+        qgis_feature_request = QgsFeatureRequest()
+        qgis_feature_request.setNoAttributes()
+
+        if fids:
+            try:
+                qgis_feature_request.setFilterFids([int(fid) for fid in fids])
+            except (TypeError, ValueError):
+                raise ParseError(_('Invalid feature ids: %s') % fids)
+
+        # Apply filter backends (constraints, bbox), store original subset string
+        original_subset_string = qgis_layer.subsetString()
+        try:
+            for backend in self.filter_backends:
+                backend().apply_filter(request, qgis_layer, qgis_feature_request, self)
+
+            feature_ids = [str(f.id()) for f in qgis_layer.getFeatures(qgis_feature_request)]
+        finally:
+            qgis_layer.setSubsetString(original_subset_string)
+
+        self.results.update({
+            'featurelocks': self.metadata_layer.lock.lockFeatures(feature_ids)
+        })
+
     def add_crs_to_feature(self, geojson_feature):
         """
         Add to geometry crs param if it's not set.
@@ -120,6 +182,191 @@ class BaseEditingVectorOnModelApiView(BaseVectorOnModelApiView):
                         MAPPING_DJANGO_MODEL_FIELD_FILE_OBJECT[type(
                             media_property)](media_file)
 
+    def extend_changed_extent(self, metadata_layer, geometry):
+        """Extend the extent of the changed features of the layer (metadata_layer.changed_extent), in layer crs
+
+        :param metadata_layer: metadata of the layer being edited
+        :type metadata_layer: MetadataVectorLayer
+        :param geometry: geometry of a changed feature, before or after the change
+        :type geometry: QgsGeometry
+        """
+
+        if geometry is None or geometry.isNull():
+            return
+
+        if getattr(metadata_layer, 'changed_extent', None) is None:
+            metadata_layer.changed_extent = QgsRectangle(geometry.boundingBox())
+        else:
+            metadata_layer.changed_extent.combineExtentWith(geometry.boundingBox())
+
+    def feature_error(self, metadata_layer, mode_editing, feature_id, fields):
+        """Return the validation error of a feature for the client
+
+        :param metadata_layer: metadata of the layer being edited
+        :type metadata_layer: MetadataVectorLayer
+        :param mode_editing: editing mode, i.e. EDITING_POST_DATA_ADDED
+        :type mode_editing: str
+        :param feature_id: feature id (client id for new features)
+        :param fields: fields errors or error message
+        :rtype: ValidationError
+        """
+
+        return ValidationError({
+            metadata_layer.client_var: {
+                mode_editing: {
+                    'id': feature_id,
+                    'fields': fields,
+                }
+            }
+        })
+
+    def can_batch_write(self, qgis_layer, has_transactions, features):
+        """Features are written by a single provider call if the provider writes batches atomically (all or nothing):
+        failed batches are written again feature by feature, to report the failing feature to the client.
+        In transaction groups every layer edit is a statement of the transaction, so features are written one by one.
+        """
+
+        return not has_transactions and len(features) > 1 and \
+            qgis_layer.dataProvider().name() in self.batch_write_providers
+
+    def add_features(self, metadata_layer, features, has_transactions):
+        """Add new features to the layer, features ids (and primary keys) are updated
+
+        :param metadata_layer: metadata of the layer being edited
+        :type metadata_layer: MetadataVectorLayer
+        :param features: list of (GeoJSON feature, QgsFeature) tuples
+        :type features: list
+        :param has_transactions: true if the layer support transactions
+        :type has_transactions: bool
+        """
+
+        qgis_layer = metadata_layer.qgis_layer
+        provider = qgis_layer.dataProvider()
+
+        added = False
+        if self.can_batch_write(qgis_layer, has_transactions, features):
+            provider.clearErrors()
+            added, added_features = provider.addFeatures([feature for __, feature in features])
+            if added:
+                features[:] = [(geojson_feature, added_feature) for (geojson_feature, __), added_feature
+                               in zip(features, added_features)]
+            else:
+                logger.warning(f'Error adding features to layer {qgis_layer.id()}, '
+                               f'adding them one by one: {", ".join(provider.errors())}')
+
+        for geojson_feature, feature in features:
+            try:
+                if not added:
+                    provider.clearErrors()
+                    if has_transactions:
+                        if not qgis_layer.addFeature(feature):
+                            raise Exception(
+                                _('Error adding feature: %s') % ', '.join(provider.errors()))
+                    elif not provider.addFeature(feature):
+                        raise Exception(_('Error adding feature: %s') % ', '.join(provider.errors()))
+
+                # Patch for Spatialite provider on pk
+                if not has_transactions and provider.name() == 'spatialite':
+                    pks = qgis_layer.primaryKeyAttributes()
+                    if len(pks) > 1:
+                        raise Exception(_(f'Error adding feature on Spatialite provider: '
+                                          f'layer {qgis_layer.id()} has more than one pk column'))
+
+                    # update pk attribute:
+                    feature.setAttribute(pks[0], feature.id())
+
+            except Exception as ex:
+                raise self.feature_error(metadata_layer, EDITING_POST_DATA_ADDED, geojson_feature['id'], str(ex))
+
+    def change_features(self, metadata_layer, features, has_transactions):
+        """Change attributes and geometries of existing features
+
+        :param metadata_layer: metadata of the layer being edited
+        :type metadata_layer: MetadataVectorLayer
+        :param features: list of (GeoJSON feature, QgsFeature) tuples
+        :type features: list
+        :param has_transactions: true if the layer support transactions
+        :type has_transactions: bool
+        """
+
+        qgis_layer = metadata_layer.qgis_layer
+        provider = qgis_layer.dataProvider()
+        field_name_map = provider.fieldNameMap()
+
+        attr_maps = {}
+        geometry_map = {}
+        for geojson_feature, feature in features:
+            attr_maps[geojson_feature['id']] = {field_name_map[name]: value for name, value
+                                                in geojson_feature['properties'].items() if name in field_name_map}
+            if not feature.geometry().isNull():
+                geometry_map[geojson_feature['id']] = feature.geometry()
+
+        if self.can_batch_write(qgis_layer, has_transactions, features):
+            provider.clearErrors()
+            if provider.changeAttributeValues(attr_maps) and not provider.errors() and \
+                    (not geometry_map or provider.changeGeometryValues(geometry_map)):
+                return
+            logger.warning(f'Error changing features of layer {qgis_layer.id()}, '
+                           f'changing them one by one: {", ".join(provider.errors())}')
+
+        for geojson_feature, feature in features:
+            feature_id = geojson_feature['id']
+            provider.clearErrors()
+            try:
+                if has_transactions:
+                    if not qgis_layer.changeAttributeValues(feature_id, attr_maps[feature_id]):
+                        raise Exception(_(
+                            'Error changing attribute values: %s') % ', '.join(provider.errors()))
+                    # Check for errors because of https://github.com/qgis/QGIS/issues/36583
+                    if provider.errors():
+                        raise Exception(', '.join(provider.errors()))
+                    if feature_id in geometry_map and not qgis_layer.changeGeometry(feature_id, geometry_map[feature_id]):
+                        raise Exception(_('Error changing geometry: %s') % ', '.join(provider.errors()))
+                else:
+                    if not provider.changeAttributeValues({feature_id: attr_maps[feature_id]}):
+                        raise Exception(_(
+                            'Error changing attribute values: %s') % ', '.join(provider.errors()))
+                    if feature_id in geometry_map and not provider.changeGeometryValues(
+                            {feature_id: geometry_map[feature_id]}):
+                        raise Exception(_('Error changing geometry: %s') % ', '.join(provider.errors()))
+
+            except Exception as ex:
+                raise self.feature_error(metadata_layer, EDITING_POST_DATA_UPDATED, feature_id, str(ex))
+
+    def delete_features(self, metadata_layer, feature_ids, has_transactions):
+        """Delete features
+
+        :param metadata_layer: metadata of the layer being edited
+        :type metadata_layer: MetadataVectorLayer
+        :param feature_ids: ids of the features to delete
+        :type feature_ids: list
+        :param has_transactions: true if the layer support transactions
+        :type has_transactions: bool
+        """
+
+        qgis_layer = metadata_layer.qgis_layer
+        provider = qgis_layer.dataProvider()
+
+        if self.can_batch_write(qgis_layer, has_transactions, feature_ids):
+            provider.clearErrors()
+            if provider.deleteFeatures(feature_ids) and not provider.errors():
+                return
+            logger.warning(f'Error deleting features of layer {qgis_layer.id()}, '
+                           f'deleting them one by one: {", ".join(provider.errors())}')
+
+        for feature_id in feature_ids:
+
+            provider.clearErrors()
+
+            if has_transactions:
+                if not qgis_layer.deleteFeatures([feature_id]) or provider.errors():
+                    raise Exception(_('Cannot delete feature: %s') %
+                                    ', '.join(provider.errors()))
+            else:
+                if not provider.deleteFeatures([feature_id]) or provider.errors():
+                    raise Exception(_('Cannot delete feature: %s') %
+                                    ', '.join(provider.errors()))
+
     def save_vector_data(self, metadata_layer, post_layer_data, has_transactions, post_save_signal=True, **kwargs):
         """Save vector editing data
 
@@ -153,190 +400,147 @@ class BaseEditingVectorOnModelApiView(BaseVectorOnModelApiView):
         # Get the layer
         qgis_layer = metadata_layer.qgis_layer
 
+        # Extent of the changed features before changes, to invalidate caches (i.e. tiles)
+        if metadata_layer.geometry_type != QGIS_LAYER_TYPE_NO_GEOM:
+            changed_fids = [f['id'] for f in post_layer_data.get(EDITING_POST_DATA_UPDATED, [])] + \
+                list(post_layer_data.get(EDITING_POST_DATA_DELETED, []))
+            changed_fids = [fid for fid in changed_fids if isinstance(fid, int)]
+            if changed_fids:
+                for old_feature in qgis_layer.getFeatures(
+                        QgsFeatureRequest().setFilterFids(changed_fids).setNoAttributes()):
+                    self.extend_changed_extent(metadata_layer, old_feature.geometry())
+
+        # Validate all the features before writing: no data is written if a feature is not valid.
+        features_to_save = {
+            EDITING_POST_DATA_ADDED: [],
+            EDITING_POST_DATA_UPDATED: []
+        }
+
         for mode_editing in (EDITING_POST_DATA_ADDED, EDITING_POST_DATA_UPDATED):
 
-            if mode_editing in post_layer_data:
+            geojson_features = post_layer_data.get(mode_editing) or []
 
-                for geojson_feature in post_layer_data[mode_editing]:
-                    data_extra_fields = {'feature': geojson_feature}
+            # reproject data if necessary: geometries are reprojected in one batch and reused to build the features
+            geometries = None
+            if self.reproject and geojson_features:
+                geometries = self.reproject_featurecollection({'features': geojson_features}, to_layer=True)
 
-                    # Clear any old error
-                    qgis_layer.dataProvider().clearErrors()
+            for geojson_feature in geojson_features:
+                data_extra_fields = {'feature': geojson_feature}
 
-                    # add media data
-                    self.add_media_property(geojson_feature, metadata_layer)
+                # add media data
+                self.add_media_property(geojson_feature, metadata_layer)
 
-                    # for GEOSGeometry of Django 2.2 it must add crs to feature if is not set if a geo feature
-                    if metadata_layer.geometry_type != QGIS_LAYER_TYPE_NO_GEOM:
-                        self.add_crs_to_feature(geojson_feature)
+                # for GEOSGeometry of Django 2.2 it must add crs to feature if is not set if a geo feature
+                if metadata_layer.geometry_type != QGIS_LAYER_TYPE_NO_GEOM:
+                    self.add_crs_to_feature(geojson_feature)
 
-                    # reproject data if necessary
-                    if self.reproject:
-                        self.reproject_feature(geojson_feature, to_layer=True)
+                # case relation data ADD, if father referenced field is pk
+                if is_referenced_field_is_pk:
+                    for newid in kwargs['referenced_layer_insert_ids']:
+                        if geojson_feature['properties'][metadata_layer.referencing_field] == newid['clientid']:
+                            geojson_feature['properties'][metadata_layer.referencing_field] = newid['id']
 
-                    # case relation data ADD, if father referenced field is pk
-                    if is_referenced_field_is_pk:
-                        for newid in kwargs['referenced_layer_insert_ids']:
-                            if geojson_feature['properties'][metadata_layer.referencing_field] == newid['clientid']:
-                                geojson_feature['properties'][metadata_layer.referencing_field] = newid['id']
+                if mode_editing == EDITING_POST_DATA_UPDATED:
+                    # control feature locked
+                    if not metadata_layer.lock.checkFeatureLocked(geojson_feature['id']):
+                        raise Exception(self.no_more_lock_feature_msg.format(geojson_feature['id'],
+                                                                             metadata_layer.client_var))
 
-                    if mode_editing == EDITING_POST_DATA_UPDATED:
-                        # control feature locked
-                        if not metadata_layer.lock.checkFeatureLocked(geojson_feature['id']):
-                            raise Exception(self.no_more_lock_feature_msg.format(geojson_feature['id'],
-                                                                                 metadata_layer.client_var))
-
-                    # Send for validation
-                    # Note that this may raise a validation error
-                    pre_save_maplayer.send(
-                        self,
-                        layer_metadata=metadata_layer, mode=mode_editing, data=data_extra_fields,
-                        user=self.request.user
-                    )
+                # Send for validation
+                # Note that this may raise a validation error
+                pre_save_maplayer.send(
+                    self,
+                    layer_metadata=metadata_layer, mode=mode_editing, data=data_extra_fields,
+                    user=self.request.user
+                )
 
-                    # Validate and save
-                    try:
+            if geometries is None:
+                geometries = get_geometries_from_geojson([f.get('geometry') for f in geojson_features])
 
-                        feature = QgsFeature(qgis_layer.fields())
-                        if mode_editing == EDITING_POST_DATA_UPDATED:
-                            feature.setId(geojson_feature['id'])
+            for i, geojson_feature in enumerate(geojson_features):
 
-                        # We use this feature for geometry parsing only:
+                # Validate
+                try:
+
+                    feature = QgsFeature(qgis_layer.fields())
+                    if mode_editing == EDITING_POST_DATA_UPDATED:
+                        feature.setId(geojson_feature['id'])
+
+                    # We use this feature for geometry parsing only:
+                    if geometries is None:
                         imported_feature = QgsJsonUtils.stringToFeatureList(
                             json.dumps(geojson_feature),
                             qgis_layer.fields(),
                             None  # UTF8 codec
                         )[0]
-
                         feature.setGeometry(imported_feature.geometry())
+                    else:
+                        feature.setGeometry(geometries[i])
+                    self.extend_changed_extent(metadata_layer, feature.geometry())
+
+                    # There is something wrong in QGIS 3.10 (fixed in later versions)
+                    # so, better loop through the fields and set attributes individually
+                    for name, value in geojson_feature['properties'].items():
+                        feature.setAttribute(name, value)
+
+                    # Call validator!
+                    errors = feature_validator(
+                        feature, metadata_layer.qgis_layer)
+                    if errors:
+                        raise ValidationError(errors)
+
+                except ValidationError as ex:
+                    raise self.feature_error(metadata_layer, mode_editing, geojson_feature['id'], ex.detail)
+
+                except Exception as ex:
+                    raise self.feature_error(metadata_layer, mode_editing, geojson_feature['id'], str(ex))
+
+                features_to_save[mode_editing].append((geojson_feature, feature))
+
+        # Unique values among the features to save: every feature is validated before the others are written
+        features_by_mode = [(mode_editing, geojson_feature, feature) for mode_editing in features_to_save
+                            for geojson_feature, feature in features_to_save[mode_editing]]
+        index, errors = features_unique_validator([f[2] for f in features_by_mode], qgis_layer)
+        if errors:
+            mode_editing, geojson_feature, feature = features_by_mode[index]
+            raise self.feature_error(metadata_layer, mode_editing, geojson_feature['id'], errors)
+
+        feature_ids_to_delete = list(post_layer_data.get(EDITING_POST_DATA_DELETED) or [])
+        for feature_id in feature_ids_to_delete:
+
+            # control feature locked
+            if not metadata_layer.lock.checkFeatureLocked(feature_id):
+                raise Exception(self.no_more_lock_feature_msg.format(
+                    feature_id, metadata_layer.client_var))
+
+            # FIXME: pre_delete_maplayer
+            # pre_delete_maplayer.send(metadata_layer.serializer, layer=metadata_layer.layer_id, # data=serializer.data, user=self.request.user)
+
+        # Save
+        self.add_features(metadata_layer, features_to_save[EDITING_POST_DATA_ADDED], has_transactions)
+        self.change_features(metadata_layer, features_to_save[EDITING_POST_DATA_UPDATED], has_transactions)
+        self.delete_features(metadata_layer, feature_ids_to_delete, has_transactions)
+
+        ex = QgsJsonExporter(qgis_layer)
+        for geojson_feature, feature in features_to_save[EDITING_POST_DATA_ADDED]:
+
+            jfeature = json.loads(ex.exportFeature(feature))
+
+            insert_ids.append({
+                'clientid': geojson_feature['id'],
+                # This might be the internal QGIS feature id (< 0)
+                'id': feature.id(),
+                'properties': jfeature['properties']
+            })
 
-                        # There is something wrong in QGIS 3.10 (fixed in later versions)
-                        # so, better loop through the fields and set attributes individually
-                        for name, value in geojson_feature['properties'].items():
-                            feature.setAttribute(name, value)
-
-                        # Call validator!
-                        errors = feature_validator(
-                            feature, metadata_layer.qgis_layer)
-                        if errors:
-                            raise ValidationError(errors)
-
-                        # Save the feature
-                        if mode_editing == EDITING_POST_DATA_ADDED:
-                            if has_transactions:
-                                if not qgis_layer.addFeature(feature):
-                                    raise Exception(
-                                        _('Error adding feature: %s') % ', '.join(qgis_layer.dataProvider().errors()))
-                            else:
-                                if not qgis_layer.dataProvider().addFeature(feature):
-                                    raise Exception(_('Error adding feature: %s') % ', '.join(
-                                        qgis_layer.dataProvider().errors()))
-
-                                # Patch for Spatialite provider on pk
-                                if qgis_layer.dataProvider().name() == 'spatialite':
-                                    pks = qgis_layer.primaryKeyAttributes()
-                                    if len(pks) > 1:
-                                        raise Exception(_(f'Error adding feature on Spatialite provider: '
-                                                          f'layer {qgis_layer.id()} has more than one pk column'))
-
-                                    # update pk attribute:
-                                    feature.setAttribute(pks[0], feature.id())
-
-                        elif mode_editing == EDITING_POST_DATA_UPDATED:
-                            attr_map = {}
-                            for name, value in geojson_feature['properties'].items():
-                                if name in qgis_layer.dataProvider().fieldNameMap():
-                                    attr_map[qgis_layer.dataProvider().fieldNameMap()[name]] = value
-
-                            if has_transactions:
-                                if not qgis_layer.changeAttributeValues(geojson_feature['id'], attr_map):
-                                    raise Exception(_(
-                                        'Error changing attribute values: %s') % ', '.join(qgis_layer.dataProvider().errors()))
-                                # Check for errors because of https://github.com/qgis/QGIS/issues/36583
-                                if qgis_layer.dataProvider().errors():
-                                    raise Exception(
-                                        ', '.join(qgis_layer.dataProvider().errors()))
-                                if not feature.geometry().isNull() and not qgis_layer.changeGeometry(geojson_feature['id'], feature.geometry()):
-                                    raise Exception(_('Error changing geometry: %s') % ', '.join(
-                                        qgis_layer.dataProvider().errors()))
-                            else:
-                                if not qgis_layer.dataProvider().changeAttributeValues({geojson_feature['id']: attr_map}):
-                                    raise Exception(_(
-                                        'Error changing attribute values: %s') % ', '.join(qgis_layer.dataProvider().errors()))
-                                if not feature.geometry().isNull() and not qgis_layer.dataProvider().changeGeometryValues(
-                                        {geojson_feature['id']: feature.geometry()}):
-                                    raise Exception(_('Error changing geometry: %s') % ', '.join(
-                                        qgis_layer.dataProvider().errors()))
-
-                        to_res = {}
-                        to_res_lock = {}
-
-                        if mode_editing == EDITING_POST_DATA_ADDED:
-
-                            ex = QgsJsonExporter(qgis_layer)
-                            jfeature = json.loads(ex.exportFeature(feature))
-
-                            to_res.update({
-                                'clientid': geojson_feature['id'],
-                                # This might be the internal QGIS feature id (< 0)
-                                'id': feature.id(),
-                                'properties': jfeature['properties']
-                            })
-
-                            # lock news:
-                            to_res_lock = metadata_layer.lock.modelLock2dict(
-                                metadata_layer.lock.lockFeature(
-                                    feature.id(), save=True)
-                            )
-
-                        if bool(to_res):
-                            insert_ids.append(to_res)
-                        if bool(to_res_lock):
-                            lock_ids.append(to_res_lock)
-
-                    except ValidationError as ex:
-                        raise ValidationError({
-                            metadata_layer.client_var: {
-                                mode_editing: {
-                                    'id': geojson_feature['id'],
-                                    'fields': ex.detail,
-                                }
-                            }
-                        })
-
-                    except Exception as ex:
-                        raise ValidationError({
-                            metadata_layer.client_var: {
-                                mode_editing: {
-                                    'id': geojson_feature['id'],
-                                    'fields': str(ex),
-                                }
-                            }
-                        })
-
-        # erasing feature if to do
-        if EDITING_POST_DATA_DELETED in post_layer_data:
-
-            for feature_id in post_layer_data[EDITING_POST_DATA_DELETED]:
-
-                # control feature locked
-                if not metadata_layer.lock.checkFeatureLocked(feature_id):
-                    raise Exception(self.no_more_lock_feature_msg.format(
-                        feature_id, metadata_layer.client_var))
-
-                # FIXME: pre_delete_maplayer
-                # pre_delete_maplayer.send(metadata_layer.serializer, layer=metadata_layer.layer_id, # data=serializer.data, user=self.request.user)
-
-                qgis_layer.dataProvider().clearErrors()
-
-                if has_transactions:
-                    if not qgis_layer.deleteFeatures([feature_id]) or qgis_layer.dataProvider().errors():
-                        raise Exception(_('Cannot delete feature: %s') %
-                                        ', '.join(qgis_layer.dataProvider().errors()))
-                else:
-                    if not qgis_layer.dataProvider().deleteFeatures([feature_id]) or qgis_layer.dataProvider().errors():
-                        raise Exception(_('Cannot delete feature: %s') %
-                                        ', '.join(qgis_layer.dataProvider().errors()))
+            # lock news:
+            to_res_lock = metadata_layer.lock.modelLock2dict(
+                metadata_layer.lock.lockFeature(
+                    feature.id(), save=True)
+            )
+            if bool(to_res_lock):
+                lock_ids.append(to_res_lock)
 
         return insert_ids, lock_ids
 
@@ -358,6 +562,9 @@ class BaseEditingVectorOnModelApiView(BaseVectorOnModelApiView):
         # used to commit/rollback at the end of the loop and on errors
         editing_layers = []
 
+        # Store metadata of all layers with saved data, used to invalidate data caches
+        saved_metadata_layers = [self.metadata_layer]
+
         # Get the layer
         qgis_layer = self.metadata_layer.qgis_layer
 
@@ -370,6 +577,7 @@ class BaseEditingVectorOnModelApiView(BaseVectorOnModelApiView):
         has_transactions = qgis_project.transactionGroup(qgis_layer.providerType(), QgsDataSourceUri(
             qgis_layer.source()).connectionInfo()) is not None
 
+        committed = False
         try:
 
             if has_transactions:
@@ -411,6 +619,7 @@ class BaseEditingVectorOnModelApiView(BaseVectorOnModelApiView):
                         sessionid=self.sessionid
                     )
 
+                    saved_metadata_layers.append(self.metadata_relations[referencing_layer])
                     insert_ids, lock_ids = self.save_vector_data(self.metadata_relations[referencing_layer],
                                                                  post_relation_data, has_transactions,
                                                                  referenced_layer_insert_ids=ref_insert_ids)
@@ -429,6 +638,8 @@ class BaseEditingVectorOnModelApiView(BaseVectorOnModelApiView):
                         raise Exception(_('Backend error saving layer %s: %s') % (
                             ql.name(), ql.commitErrors()))
 
+            committed = True
+
         except ValidationError as ve:
 
             if has_transactions:
@@ -451,6 +662,25 @@ class BaseEditingVectorOnModelApiView(BaseVectorOnModelApiView):
                 'errors': str(e)
             })
 
+        # Without transactions data can be partially saved also on errors
+        for metadata_layer in saved_metadata_layers:
+            bump_layer_data_version(metadata_layer.qgis_layer)
+
+        # Data are committed: receivers errors (i.e. caches invalidation) don't change the commit result
+        if committed:
+            for metadata_layer in saved_metadata_layers:
+                responses = post_commit_maplayer.send_robust(
+                    self,
+                    layer=getattr(metadata_layer, 'layer', self.layer),
+                    qgis_layer=metadata_layer.qgis_layer,
+                    user=self.request.user,
+                    extent=getattr(metadata_layer, 'changed_extent', None)
+                )
+                for receiver, response in responses:
+                    if isinstance(response, Exception):
+                        logger.error(f'post_commit_maplayer receiver {receiver.__name__} error for layer '
+                                     f'{metadata_layer.qgis_layer.name()}: {response}')
+
         try:
             self.results.update({
                 'response': {
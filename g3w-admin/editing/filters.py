@@ -22,7 +22,8 @@ class ConstraintsFilter(BaseFilterBackend):
 
         rule_parts = []
 
-        if view.mode_call == 'editing':
+        # features to edit: editing data and features locked on demand
+        if view.mode_call in ('editing', 'lock'):
             rules = ConstraintRule.get_active_constraints_for_user(request.user, view.layer)
 
             for rule in rules:
@@ -11,12 +11,17 @@ from usersmanage.models import Group as AuthGroup
 from usersmanage.utils import get_users_for_object, get_groups_for_object, userHasGroups, get_viewers_for_object
 from usersmanage.forms import label_users
 from usersmanage.configs import *
+from .models import EDITING_LOCK_MODE_ALL, EDITING_LOCK_MODE_ON_DEMAND
 
 
 class ActiveEditingLayerForm(G3WRequestFormMixin, G3WProjectFormMixin, forms.Form):
 
     active = forms.BooleanField(label=_('Active'), required=False)
     scale = forms.IntegerField(label=_('Scale'), required=False, help_text=_('Scale after that editing mode is active'))
+    lock_mode = forms.ChoiceField(label=_('Features lock'), required=False, initial=EDITING_LOCK_MODE_ALL, choices=(
+        (EDITING_LOCK_MODE_ALL, _('All loaded features')),
+        (EDITING_LOCK_MODE_ON_DEMAND, _('On demand: only the features requested by the client'))),
+        help_text=_('On demand lock is faster on layers with many features'))
     viewer_users = forms.MultipleChoiceField(choices=[], label=_('Viewers'), required=False,
                                              help_text=_('Select user with viewer role can do editing on layer'))
     user_groups_viewer = forms.MultipleChoiceField(
@@ -38,6 +43,7 @@ class ActiveEditingLayerForm(G3WRequestFormMixin, G3WProjectFormMixin, forms.For
             HTML(_('Check on uncheck to attive/deactive editing layer capabilities:')),
             'active',
             'scale',
+            'lock_mode',
             HTML(_('Select viewers with \'view permission\' on project that can edit layer:')),
             Field('viewer_users', css_class='select2', style="width:100%;"),
             Field('user_groups_viewer', css_class='select2', style="width:100%;"),
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicated_locks(apps, schema_editor):
+    """Keep only the first lock of every layer feature"""
+
+    G3WEditingFeatureLock = apps.get_model('editing', 'G3WEditingFeatureLock')
+    fields = ('app_name', 'layer_name', 'layer_datasource', 'feature_id')
+    duplicates = G3WEditingFeatureLock.objects.values(*fields).annotate(
+        first_id=Min('id'), locks=Count('id')).filter(locks__gt=1)
+
+    for duplicate in duplicates:
+        G3WEditingFeatureLock.objects.filter(**{f: duplicate[f] for f in fields}).\
+            exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('editing', '0008_auto_20200131_1008'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicated_locks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='g3weditingfeaturelock',
+            constraint=models.UniqueConstraint(fields=('app_name', 'layer_name', 'layer_datasource', 'feature_id'),
+                                               name='editing_feature_lock_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='g3weditingfeaturelock',
+            index=models.Index(fields=['sessionid', 'user'], name='editing_feature_lock_session'),
+        ),
+    ]
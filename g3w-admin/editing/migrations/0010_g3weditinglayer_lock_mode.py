@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('editing', '0009_g3weditingfeaturelock_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='g3weditinglayer',
+            name='lock_mode',
+            field=models.CharField(choices=[('all', 'All loaded features'), ('ondemand', 'On demand')], default='all', max_length=10),
+        ),
+    ]
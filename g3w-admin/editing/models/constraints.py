@@ -11,6 +11,8 @@ __copyright__ = 'Copyright 2019, Gis3w'
 
 
 import logging
+import threading
+import time
 
 from django.conf import settings
 from django.contrib.auth.models import Group, User
@@ -30,12 +32,16 @@ from qgis.core import (
     QgsExpression,
 )
 
-from core.utils.qgisapi import get_qgis_features, get_qgis_layer
+from core.utils.qgisapi import get_qgis_features, get_qgis_layer, get_layer_data_version
 from qdjango.models import Layer
 
 
 logger = logging.getLogger(__name__)
 
+# Constraint geometries of the rules, by thread (GEOS prepared geometries are not thread safe):
+# {rule pk: [cache key, (geometry, number of matched records), prepared geometry, expiration time]}
+_constraint_geometries = threading.local()
+
 
 CONSTRAINT_LAYER_TYPE_GRANTED = (
     'spatialite',
@@ -154,6 +160,31 @@ class ConstraintRule(models.Model):
             raise ValidationError(
                 _('There is an error in the SQL rule where condition: %s' % ex))
 
+    def _get_cached_constraint_geometry(self):
+        """Returns the cached constraint geometry entry of the rule, the geometry is built again
+        when the rule, the constraint layers or the constraint layer data (data version) change and
+        after settings.G3WADMIN_CONSTRAINT_GEOMETRY_CACHE_TIMEOUT seconds (data edited outside g3w-admin).
+
+        :return: list, [cache key, (geometry, number of matched records), prepared geometry or None, expiration]
+        :rtype: list
+        """
+
+        constraint_layer = get_qgis_layer(self.constraint.constraint_layer)
+        cache_key = (self.rule, self.constraint.constraint_layer_id, self.constraint.editing_layer_id,
+                     get_layer_data_version(constraint_layer))
+
+        if not hasattr(_constraint_geometries, 'rules'):
+            _constraint_geometries.rules = {}
+
+        entry = _constraint_geometries.rules.get(self.pk) if self.pk else None
+        if entry is None or entry[0] != cache_key or entry[3] < time.monotonic():
+            entry = [cache_key, self._build_constraint_geometry(constraint_layer), None,
+                     time.monotonic() + getattr(settings, 'G3WADMIN_CONSTRAINT_GEOMETRY_CACHE_TIMEOUT', 60)]
+            if self.pk:
+                _constraint_geometries.rules[self.pk] = entry
+
+        return entry
+
     def get_constraint_geometry(self):
         """Returns the geometry from the constraint layer and rule
 
@@ -161,7 +192,35 @@ class ConstraintRule(models.Model):
         :rtype: tuple( MultiPolygon, integer)
         """
 
-        constraint_layer = get_qgis_layer(self.constraint.constraint_layer)
+        return self._get_cached_constraint_geometry()[1]
+
+    def get_prepared_constraint_geometry(self):
+        """Returns the geometry from the constraint layer and rule and its GEOS prepared geometry,
+        for fast spatial predicates on many geometries
+
+        :return: the constraint geometry and the prepared geometry, None if no records matched
+        :rtype: tuple( MultiPolygon, PreparedGeometry)
+        """
+
+        entry = self._get_cached_constraint_geometry()
+        constraint_geometry, count = entry[1]
+        if not count:
+            return None, None
+
+        if entry[2] is None:
+            entry[2] = constraint_geometry.prepared
+
+        return constraint_geometry, entry[2]
+
+    def _build_constraint_geometry(self, constraint_layer):
+        """Builds the geometry from the constraint layer and rule
+
+        :param constraint_layer: the constraint layer
+        :type constraint_layer: QgsVectorLayer
+        :return: the constraint geometry and the number of matched records
+        :rtype: tuple( MultiPolygon, integer)
+        """
+
         editing_layer = get_qgis_layer(self.constraint.editing_layer)
 
         # Get the geometries from constraint layer and rule
@@ -257,6 +316,36 @@ class ConstraintRule(models.Model):
         else:
             return cls.objects.filter(constraint__in=constraints, user=user)
 
+    @classmethod
+    def get_constraints_for_user_by_layers(cls, user, editing_layers):
+        """Fetch the constraints for a given user and many editing layers
+        with a single query
+
+        :param user: the user
+        :type user: User
+        :param editing_layers: the editing layers
+        :type editing_layers: list of Layer
+        :return: ConstraintRule lists by editing layer pk
+        :rtype: dict
+        """
+
+        constraints = {}
+        if not editing_layers:
+            return constraints
+
+        rules = cls.objects.filter(constraint__editing_layer__in=editing_layers).select_related(
+            'constraint__editing_layer__project', 'constraint__constraint_layer__project')
+        user_groups = user.groups.all()
+        if user_groups.count():
+            rules = rules.filter(Q(user=user) | Q(group__in=user_groups))
+        else:
+            rules = rules.filter(user=user)
+
+        for rule in rules:
+            constraints.setdefault(rule.constraint.editing_layer_id, []).append(rule)
+
+        return constraints
+
     @classmethod
     def get_active_constraints_for_user(cls, user, editing_layer):
         """Fetch the active constraints for a given user and editing layer
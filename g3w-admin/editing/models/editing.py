@@ -7,6 +7,10 @@ EDITING_POST_DATA_ADDED = 'add'
 EDITING_POST_DATA_UPDATED = 'update'
 EDITING_POST_DATA_DELETED = 'delete'
 
+# Features lock modes: all the features loaded in editing mode or only the features requested by the client
+EDITING_LOCK_MODE_ALL = 'all'
+EDITING_LOCK_MODE_ON_DEMAND = 'ondemand'
+
 
 class G3WEditingFeatureLock(models.Model):
     """
@@ -23,6 +27,13 @@ class G3WEditingFeatureLock(models.Model):
 
     class Meta:
         app_label = 'editing'
+        constraints = [
+            models.UniqueConstraint(fields=['app_name', 'layer_name', 'layer_datasource', 'feature_id'],
+                                    name='editing_feature_lock_unique')
+        ]
+        indexes = [
+            models.Index(fields=['sessionid', 'user'], name='editing_feature_lock_session')
+        ]
 
 
 class G3WEditingLayer(models.Model):
@@ -32,6 +43,9 @@ class G3WEditingLayer(models.Model):
     app_name = models.CharField(max_length=255)
     layer_id = models.IntegerField()
     scale = models.IntegerField(null=True, blank=True)
+    lock_mode = models.CharField(max_length=10, default=EDITING_LOCK_MODE_ALL, choices=(
+        (EDITING_LOCK_MODE_ALL, 'All loaded features'),
+        (EDITING_LOCK_MODE_ON_DEMAND, 'On demand')))
 
     class Meta:
         app_label = 'editing'
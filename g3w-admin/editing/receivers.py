@@ -12,6 +12,7 @@ from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_out
 from django.template import loader
 from django.db.models.signals import pre_delete
+from core.api.serializers import ProjectLayersContext
 from core.signals import load_layer_actions, initconfig_plugin_start, after_serialized_project_layer, \
     pre_save_maplayer, post_save_maplayer, pre_delete_maplayer, load_js_modules, before_return_vector_data_layer
 from qdjango.models import Layer
@@ -82,46 +83,47 @@ def set_initconfig_value(sender, **kwargs):
     """
     Project = apps.get_app_config(kwargs['projectType']).get_model('project')
     project_layers = {pl.pk: pl for pl in Project.objects.get(pk=kwargs['project']).layer_set.all()}
+    context = ProjectLayersContext(project_layers.values(), sender.request.user)
 
     # get every layer editable for the project, il list == 0 return
-    layers_to_edit = G3WEditingLayer.objects.filter(app_name=kwargs['projectType'])
-    editable_layers_id = []
-    editable_layers_constraints = {}
-    for el in layers_to_edit:
-
-        # check for permissions
-        if el.layer_id in project_layers and sender.request.user.has_perm('change_layer', project_layers[el.layer_id]):
-            editable_layers_id.append(el.layer_id)
-
-            # check if layers has constraints
-            constraints = ConstraintRule.get_constraints_for_user(sender.request.user, project_layers[el.layer_id])
-            envelope = []
-            for constraint in constraints:
-                geom = constraint.get_constraint_geometry()
-                if geom[1] > 0:
-                    env = geom[0].envelope
-                    xmin, ymin = env[0][0]
-                    xmax, ymax = env[0][2]
-                    if 'xmin' in envelope and xmin > envelope['xmin']:
-                        xmin = envelope['xmin']
-                    if 'ymin' in envelope and ymin > envelope['ymin']:
-                        ymin = envelope['ymin']
-                    if 'xmax' in envelope and xmax < envelope['xmax']:
-                        xmax = envelope['xmax']
-                    if 'ymax' in envelope and ymax < envelope['ymax']:
-                        ymax = envelope['ymax']
-                    envelope = [xmin, ymin, xmax, ymax]
-
-            if len(envelope) > 0:
-                # FIXME: if qgs_layer_id is not unique it shouldn't be used as a key here:
-                editable_layers_constraints.update({
-                    project_layers[el.layer_id].qgs_layer_id: {
-                    'geometry_api_url': reverse('constraint-api-geometry', kwargs={'editing_layer_id': el.layer_id}),
-                    'bbox': envelope
-                    }
-                })
+    layers_to_edit = G3WEditingLayer.objects.filter(app_name=kwargs['projectType'], layer_id__in=context.layer_pks)
+    editable_layers_id = [el.layer_id for el in layers_to_edit
+                          if context.permission_checker.has_perm('change_layer', project_layers[el.layer_id])]
 
+    # constraints of all editable layers
+    layers_constraints = ConstraintRule.get_constraints_for_user_by_layers(
+        sender.request.user, [project_layers[layer_id] for layer_id in editable_layers_id])
 
+    editable_layers_constraints = {}
+    for layer_id in editable_layers_id:
+
+        # check if layers has constraints
+        constraints = layers_constraints.get(layer_id, [])
+        envelope = []
+        for constraint in constraints:
+            geom = constraint.get_constraint_geometry()
+            if geom[1] > 0:
+                env = geom[0].envelope
+                xmin, ymin = env[0][0]
+                xmax, ymax = env[0][2]
+                if 'xmin' in envelope and xmin > envelope['xmin']:
+                    xmin = envelope['xmin']
+                if 'ymin' in envelope and ymin > envelope['ymin']:
+                    ymin = envelope['ymin']
+                if 'xmax' in envelope and xmax < envelope['xmax']:
+                    xmax = envelope['xmax']
+                if 'ymax' in envelope and ymax < envelope['ymax']:
+                    ymax = envelope['ymax']
+                envelope = [xmin, ymin, xmax, ymax]
+
+        if len(envelope) > 0:
+            # FIXME: if qgs_layer_id is not unique it shouldn't be used as a key here:
+            editable_layers_constraints.update({
+                project_layers[layer_id].qgs_layer_id: {
+                    'geometry_api_url': reverse('constraint-api-geometry', kwargs={'editing_layer_id': layer_id}),
+                    'bbox': envelope
+                }
+            })
 
     if len(editable_layers_id) == 0:
         return None
@@ -149,11 +151,22 @@ def add_editable_capability(sender, **kwargs):
         'values': {},
     }
 
+    context = kwargs.get('context')
+
     try:
-        G3WEditingLayer.objects.get(app_name=layer._meta.app_label, layer_id=layer.pk)
+        if context:
+            # editing layers of the project loaded once for all layers
+            editing_layer_pks = context.get('editing_layers', lambda c: set(G3WEditingLayer.objects.filter(
+                app_name=layer._meta.app_label, layer_id__in=c.layer_pks).values_list('layer_id', flat=True)))
+            if layer.pk not in editing_layer_pks:
+                return data
+            has_perm = context.permission_checker.has_perm('change_layer', layer)
+        else:
+            G3WEditingLayer.objects.get(app_name=layer._meta.app_label, layer_id=layer.pk)
+            has_perm = kwargs['request'].user.has_perm('qdjango.change_layer', layer)
 
         # check permission
-        if kwargs['request'].user.has_perm('qdjango.change_layer', layer):
+        if has_perm:
             data['values']['capabilities'] = sender.data['capabilities'] | settings.EDITABLE
         else:
             logger.info(f"Layer {layer.qgs_layer_id} is not editable for user {kwargs['request'].user}")
@@ -222,11 +235,16 @@ def validate_constraint(**kwargs):
     # set spatial predicate for validation
     spatial_predicate = getattr(settings, 'EDITING_CONSTRAINT_SPATIAL_PREDICATE', 'contains')
 
+    geom = geom_class(coords)
+
     for rule in rules:
-        allowed_geom, __ = rule.get_constraint_geometry()
-        geom = geom_class(coords)
+        # cached prepared geometry, shared by all the features of the commit
+        allowed_geom, prepared_geom = rule.get_prepared_constraint_geometry()
+        if allowed_geom is None:
+            raise IntegrityError(_('Constraint validation failed for geometry: %s') % geom.wkt)
         geom.srid = allowed_geom.srid
-        predicate_method = getattr(allowed_geom, spatial_predicate)
+        # predicates not available for prepared geometries (i.e. equals) are run by the geometry
+        predicate_method = getattr(prepared_geom, spatial_predicate, None) or getattr(allowed_geom, spatial_predicate)
         if not predicate_method(geom):
             raise IntegrityError( _('Constraint validation failed for geometry: %s') % geom.wkt)
 
@@ -254,6 +272,9 @@ def add_constraints(**kwargs):
                 'scale': editinglayer.scale
             })
 
+        # with on demand lock mode the client locks features by 'lock' mode calls
+        toret['lock_mode'] = editinglayer.lock_mode
+
         return toret
     except:
         return None
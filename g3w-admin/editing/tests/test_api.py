@@ -16,8 +16,12 @@ import json
 from django.core.exceptions import ObjectDoesNotExist
 from django.test import override_settings
 from django.urls import reverse
+from guardian.shortcuts import assign_perm
 from rest_framework.test import APIClient
 
+from core.signals import post_commit_maplayer
+from core.utils.qgisapi import get_coordinate_transform
+
 from editing.api.constraints.views import *
 
 from .test_models import DATASOURCE_PATH, ConstraintsTestsBase
@@ -175,6 +179,16 @@ class EditingApiTests(ConstraintsTestsBase):
                 self.assertEqual(actual, res_expected)
 
 
+        # TEST MODE_DATA streaming: editing constraints into the envelope
+        # ---------------------------------------------
+        args = ['data', 'qdjango', self.editing_project.instance.pk, cities_layer_id]
+        jres = json.loads(self._testApiCall('core-vector-api', args).content)
+        response = self._testApiCall('core-vector-api', args, {'stream': '1'})
+        self.assertTrue(response.streaming)
+        jstream = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(list(jstream.keys()), list(jres.keys()))
+        self.assertEqual(jstream['lock_mode'], jres['lock_mode'])
+
         # TEST MODE_EDITING
         # ---------------------------------------------
         response = self._testApiCall('editing-commit-vector-api', ['editing', 'qdjango', self.editing_project.instance.pk,
@@ -185,6 +199,35 @@ class EditingApiTests(ConstraintsTestsBase):
         # check features
         self.assertEqual(len(jres['vector']['data']['features']), 481)
 
+        self.assertEqual(len(jres['featurelocks']), 481)
+
+        # TEST MODE_LOCK: features locked on demand
+        # ---------------------------------------------
+        G3WEditingLayer.objects.filter(app_name='qdjango', layer_id=cities_layer.pk).update(
+            lock_mode=EDITING_LOCK_MODE_ON_DEMAND)
+        G3WEditingFeatureLock.objects.all().delete()
+
+        response = self._testApiCall('editing-commit-vector-api', ['editing', 'qdjango', self.editing_project.instance.pk,
+                                                                   cities_layer_id])
+        jres = json.loads(response.content)
+        self.assertEqual(len(jres['vector']['data']['features']), 481)
+        self.assertEqual(jres['featurelocks'], [])
+
+        fids = [f['id'] for f in jres['vector']['data']['features'][:3]]
+        response = self._testApiCall('editing-commit-vector-api', ['lock', 'qdjango', self.editing_project.instance.pk,
+                                                                   cities_layer_id],
+                                     {'fids': ','.join(str(fid) for fid in fids)})
+        jres = json.loads(response.content)
+        self.assertEqual(sorted(int(l['featureid']) for l in jres['featurelocks']), sorted(fids))
+
+        # without fids or bbox
+        self.assertTrue(self.client.login(
+            username=self.test_user_admin1.username, password=self.test_user_admin1.username))
+        response = self.client.get(reverse('editing-commit-vector-api', args=[
+            'lock', 'qdjango', self.editing_project.instance.pk, cities_layer_id]))
+        self.assertEqual(response.status_code, 400)
+        self.client.logout()
+
 
 
     def test_editing_commit_mode_api(self):
@@ -332,6 +375,79 @@ class EditingApiTests(ConstraintsTestsBase):
         # check features
         self.assertEqual(len(jresult['vector']['data']['features']), 481)
 
+        # Batch of features
+        # =================
+
+        def new_feature(fid, name):
+            return {
+                "id": fid,
+                "geometry": {"coordinates": [11.620713, 44.82678], "type": "Point"},
+                "properties": {
+                    "geonameid": 5678,
+                    "gtopo30": 9,
+                    "iso2_code": "IT",
+                    "name": name,
+                    "population": 1234
+                },
+                "type": "Feature"
+            }
+
+        payload = {
+            "add": [new_feature("_new_1", "CityTestBatch1"), new_feature("_new_2", "CityTestBatch2")],
+            "delete": [],
+            "lockids": [],
+            "relations": {},
+            "update": []
+        }
+
+        response = self.client.post(commit_path, payload, format='json')
+        jresult = json.loads(response.content)
+        self.assertTrue(jresult['result'])
+        new = jresult['response']['new']
+        self.assertEqual([n['clientid'] for n in new], ["_new_1", "_new_2"])
+        self.assertEqual([n['properties']['name'] for n in new], ["CityTestBatch1", "CityTestBatch2"])
+        self.assertNotEqual(new[0]['id'], new[1]['id'])
+        lockids = jresult['response']['new_lockids']
+
+        response = self.client.get(data_path, format='json')
+        self.assertEqual(len(json.loads(response.content)['vector']['data']['features']), 483)
+
+        payload = {
+            "add": [],
+            "delete": [],
+            "lockids": [{"featureid": l['featureid'], "lockid": l['lockid']} for l in lockids],
+            "relations": {},
+            "update": [new_feature(new[0]['id'], "CityTestBatchUpdate1"),
+                       new_feature(new[1]['id'], "CityTestBatchUpdate2")]
+        }
+
+        response = self.client.post(commit_path, payload, format='json')
+        self.assertTrue(json.loads(response.content)['result'])
+
+        response = self.client.get(data_path, format='json')
+        names = [f['properties']['name'] for f in json.loads(response.content)['vector']['data']['features']]
+        self.assertIn("CityTestBatchUpdate1", names)
+        self.assertIn("CityTestBatchUpdate2", names)
+
+        payload.update({
+            "update": [],
+            "delete": [new[0]['id'], new[1]['id']]
+        })
+
+        # post commit receivers errors don't change the result of committed data
+        def post_commit_error(sender, **kwargs):
+            raise Exception('post commit error')
+
+        post_commit_maplayer.connect(post_commit_error)
+        try:
+            response = self.client.post(commit_path, payload, format='json')
+        finally:
+            post_commit_maplayer.disconnect(post_commit_error)
+        self.assertTrue(json.loads(response.content)['result'])
+
+        response = self.client.get(data_path, format='json')
+        self.assertEqual(len(json.loads(response.content)['vector']['data']['features']), 481)
+
 
 
 class ConstraintsApiTests(ConstraintsTestsBase):
@@ -733,6 +849,74 @@ class ConstraintsApiTests(ConstraintsTestsBase):
         jcontent = json.loads(response.content)
         self.assertTrue(len(jcontent['geometries']) == 0)
 
+    def test_lock_mode_constraints(self):
+        """Test constraint filter for editing API - features locked on demand"""
+
+        client = APIClient()
+        editing_layer = Layer.objects.get(name='editing_layer')
+        constraint_layer = Layer.objects.get(name='constraint_layer')
+        assign_perm('change_layer', self.test_user2, editing_layer)
+        self.assertTrue(client.login(
+            username=self.test_user2.username, password=self.test_user2.username))
+
+        constraint = Constraint(editing_layer=editing_layer, constraint_layer=constraint_layer)
+        constraint.save()
+        ConstraintRule(constraint=constraint, user=self.test_user2, rule='name=\'bagnolo\'').save()
+
+        lock_path = reverse('editing-commit-vector-api', args=[
+            'lock', 'qdjango', editing_layer.project_id, editing_layer.qgs_layer_id])
+
+        # Out of constraint features are not locked
+        response = client.post(lock_path, {'fids': [3, 4]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['featurelocks'], [])
+
+        response = client.post(lock_path, {'fids': [1, 2, 3, 4]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(int(l['featureid']) for l in json.loads(response.content)['featurelocks']), [1, 2])
+
+        client.logout()
+
+    def test_lock_mode_bbox(self):
+        """Test features locked on demand by bbox, POST and GET params"""
+
+        client = APIClient()
+        editing_layer = Layer.objects.get(name='editing_layer')
+        assign_perm('change_layer', self.test_user2, editing_layer)
+        self.assertTrue(client.login(
+            username=self.test_user2.username, password=self.test_user2.username))
+
+        constraint = Constraint(editing_layer=editing_layer, constraint_layer=Layer.objects.get(name='constraint_layer'))
+        constraint.save()
+        ConstraintRule(constraint=constraint, user=self.test_user2, rule='name=\'bagnolo\'').save()
+
+        # bbox of all the features, in project CRS
+        extent = editing_layer.qgis_layer.extent()
+        group_srid = editing_layer.project.group.srid.auth_srid
+        if int(editing_layer.srid) != int(group_srid):
+            extent = get_coordinate_transform(editing_layer.srid, group_srid).transformBoundingBox(extent)
+        extent.grow(1)
+        in_bbox = ','.join(str(c) for c in (extent.xMinimum(), extent.yMinimum(),
+                                            extent.xMaximum(), extent.yMaximum()))
+
+        lock_path = reverse('editing-commit-vector-api', args=[
+            'lock', 'qdjango', editing_layer.project_id, editing_layer.qgs_layer_id])
+
+        # No fids and no bbox
+        response = client.post(lock_path, {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        # Only features in bbox and in constraint are locked
+        response = client.post(lock_path, {'in_bbox': in_bbox}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(int(l['featureid']) for l in json.loads(response.content)['featurelocks']), [1, 2])
+
+        response = client.get(lock_path, {'in_bbox': in_bbox})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(int(l['featureid']) for l in json.loads(response.content)['featurelocks']), [1, 2])
+
+        client.logout()
+
     def test_layer_info_api(self):
         """ Tets for layer info API"""
 
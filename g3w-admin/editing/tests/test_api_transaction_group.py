@@ -318,6 +318,48 @@ class TransactionGroupTest(TestCase):
         jresult = json.loads(response.content)
         self.assertFalse(jresult['result'])
 
+        # 4. UNIQUE constraint violation among the features of the commit
+        feature_count = self.test.qgis_layer.featureCount()
+        payload = {
+            "add": [
+                {
+                    "id": "_new_1234520704664",
+                    "geometry": {"coordinates": [1338617, 5425969], "type": "Point"}, "properties": {
+                        "fid": 100,
+                        "name": "name 4",
+                        "value": 12345,
+                        "date": '2021-01-02',
+                        "option": True,
+                        "pol_id": 2,
+                    }, "type": "Feature"
+                },
+                {
+                    "id": "_new_1234520704665",
+                    "geometry": {"coordinates": [1338617, 5425969], "type": "Point"}, "properties": {
+                        "fid": 100,
+                        "name": "name 5",
+                        "value": 12345,
+                        "date": '2021-01-02',
+                        "option": True,
+                        "pol_id": 2,
+                    }, "type": "Feature"
+                }
+            ],
+            "delete": [],
+            "lockids": [],
+            "relations": {},
+            "update": []
+        }
+        response = client.post(commit_path, payload, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        jresult = json.loads(response.content)
+        self.assertFalse(jresult['result'])
+        errors = list(jresult['errors'].values())[0]['add']
+        self.assertEqual(errors['id'], '_new_1234520704665')
+        self.assertEqual(errors['fields']['fid'], ['Field value must be UNIQUE'])
+        self.assertEqual(self.test.qgis_layer.featureCount(), feature_count)
+
     def test_update_feature_simple(self):
         """Test updating a test feature to an existing polygon"""
 
@@ -16,6 +16,8 @@ __copyright__ = 'Copyright 2019, Gis3w'
 import os
 import json
 import shutil
+import time
+from unittest import mock
 
 from django.contrib.auth.models import Group as UserGroup
 from django.core.exceptions import ValidationError
@@ -26,6 +28,8 @@ from django.test import TestCase, override_settings
 from core.models import G3WSpatialRefSys, Group as CoreGroup
 from qdjango.utils.data import QgisProject
 from editing.models import *
+from editing.utils import LayerLock
+from core.utils.qgisapi import get_qgis_layer, bump_layer_data_version
 
 from rest_framework.test import APIClient
 from guardian.shortcuts import assign_perm
@@ -303,6 +307,43 @@ class ConstraintsModelTestsBase(ConstraintsTestsBase):
         rule.rule = 'dfs?Adfasdfs[đß+èèfsd+'
         self.assertFalse(rule.validate_sql()[0])
 
+    def test_constraint_geometry_cache(self):
+        """Test cached and prepared constraint geometries"""
+
+        editing_layer = Layer.objects.get(name='editing_layer')
+        constraint_layer = Layer.objects.get(name=self.constraint_layer_name)
+        constraint = Constraint(
+            editing_layer=editing_layer, constraint_layer=constraint_layer)
+        constraint.save()
+        rule = ConstraintRule(constraint=constraint,
+                              user=self.test_user1, rule='int_f=1')
+        rule.save()
+
+        geometry, count = rule.get_constraint_geometry()
+        self.assertGreater(count, 0)
+
+        # cached
+        self.assertIs(rule.get_constraint_geometry()[0], geometry)
+        allowed_geom, prepared_geom = rule.get_prepared_constraint_geometry()
+        self.assertIs(allowed_geom, geometry)
+        self.assertTrue(prepared_geom.intersects(geometry.point_on_surface))
+        self.assertIs(rule.get_prepared_constraint_geometry()[1], prepared_geom)
+
+        # constraint layer data changed
+        bump_layer_data_version(get_qgis_layer(constraint_layer))
+        self.assertIsNot(rule.get_constraint_geometry()[0], geometry)
+        self.assertEqual(rule.get_constraint_geometry()[0].wkt, geometry.wkt)
+
+        # expired
+        cached = rule.get_constraint_geometry()
+        with mock.patch('editing.models.constraints.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNot(rule.get_constraint_geometry(), cached)
+
+        # rule changed
+        cached = rule.get_constraint_geometry()
+        rule.rule = 'int_f=0'
+        self.assertIsNot(rule.get_constraint_geometry(), cached)
+
     def test_editing_view_retrieve_data(self):
         """Test constraint filter for editing API - SELECT"""
 
@@ -533,3 +574,39 @@ class ConstraintsModelTestsMulti(ConstraintsModelTestsBase):
 
     def setUp(self):
         self.constraint_layer_name = 'constraint_layer_multi'
+
+
+class LayerLockTests(ConstraintsTestsBase):
+    """Features locks tests"""
+
+    def test_lock_features(self):
+
+        lock1 = LayerLock(self.editing_layer, 'editing', user=self.test_user1, sessionid='session1')
+        lock2 = LayerLock(self.editing_layer, 'editing', user=self.test_user2, sessionid='session2')
+
+        locks1 = lock1.lockFeatures(['1', '2'])
+        self.assertEqual(sorted(l['featureid'] for l in locks1), ['1', '2'])
+
+        # features locked by other sessions are not locked
+        locks2 = lock2.lockFeatures(['2', '3'])
+        self.assertEqual([l['featureid'] for l in locks2], ['3'])
+        self.assertEqual(G3WEditingFeatureLock.objects.filter(feature_id='2').count(), 1)
+
+        # features already locked by the session are returned with their locks
+        locks1_again = lock1.lockFeatures(['1', '2', '3'])
+        self.assertEqual(sorted(l['featureid'] for l in locks1_again), ['1', '2'])
+        self.assertEqual(sorted(l['lockid'] for l in locks1_again), sorted(l['lockid'] for l in locks1))
+
+        # commit checks
+        lock1.getInitialFeatureLockedIds()
+        lock1.setLockeFeaturesFromClient(locks1)
+        self.assertTrue(lock1.checkFeatureLocked(1))
+        self.assertFalse(lock1.checkFeatureLocked(3))
+
+        # new feature with the id of a feature locked by another session
+        lock1.lockFeature(3, save=True)
+        self.assertEqual(G3WEditingFeatureLock.objects.get(feature_id='3').sessionid, 'session1')
+
+        # unlock
+        lock1.unLockFeatureBySession()
+        self.assertFalse(G3WEditingFeatureLock.objects.filter(sessionid='session1').exists())
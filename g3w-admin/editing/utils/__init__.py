@@ -1,4 +1,5 @@
 from django.contrib.sessions.models import Session
+from django.db import connection
 from django.utils import timezone
 from usersmanage.configs import *
 from usersmanage.utils import get_users_for_object, setPermissionUserObject
@@ -6,8 +7,22 @@ from editing.models import G3WEditingFeatureLock as LockModel
 import hashlib
 
 
+def delete_locks(featuresLocked):
+    """
+    Delete features locks
+    :param featuresLocked: LockModel QuerySet
+    :return: number of deleted locks
+    """
+
+    return featuresLocked.delete()[0]
+
+
 class LayerLock(object):
-    """ Handles features locking """
+    """
+    Handles features locking.
+    Locks are unique by layer and feature (unique constraint), they are created and checked by set-based queries:
+    locks of other sessions are never overwritten (INSERT ... ON CONFLICT DO NOTHING).
+    """
 
     def __init__(self, layer, appName, **kwargs):
 
@@ -16,68 +31,110 @@ class LayerLock(object):
         self.layerName = layer.qgs_layer_id
         self.layerDatasource = layer.datasource
         self.appName = appName
-        if kwargs.get('user'):
-            self.user = kwargs['user']
-        if kwargs.get('sessionid'):
-            self.sessionid = kwargs['sessionid']
+        self.user = kwargs.get('user')
+        self.sessionid = kwargs.get('sessionid')
 
-        self.initialFeatureLockedIds = []
-        self.getInitialUserFeatureLocked = []
         self.getInitialUserFeatureLockedByFeatureId = {}
+        self.initialUserFeatureLockIds = set()
         self.clientLockedFeatures = {}
 
-    def getInitialFeatureLockedIds(self):
+    @property
+    def layerFilters(self):
+        return {
+            'layer_name': self.layerName,
+            'app_name': self.appName,
+            'layer_datasource': self.layerDatasource
+        }
+
+    @property
+    def user_id(self):
+        return self.user.pk if self.user else None
+
+    @classmethod
+    def unLockExpiredSessionsFeatures(cls):
         """
-        Check and return initial features id locked
+        Remove features locks of expired sessions by a single query
         """
 
-        # first remove features lock with sessions expired
-        sessions = Session.objects.filter(expire_date__lte=timezone.now())
-        session_ids = [s.session_key for s in sessions]
+        delete_locks(LockModel.objects.filter(sessionid__in=Session.objects.filter(
+            expire_date__lte=timezone.now()).values('session_key')))
 
-        features_to_unlock = LockModel.objects.filter(
-            sessionid__in=session_ids)
-        LayerLock.unLockExpiredFeatures(features_to_unlock)
+    def getInitialFeatureLockedIds(self):
+        """
+        Remove features locks of expired sessions and get the features locked by current user and session
+        """
 
-        filters = {
-            'layer_name': self.layerName,
-            'app_name': self.appName,
-            'layer_datasource': self.layerDatasource
-        }
+        self.unLockExpiredSessionsFeatures()
 
-        featuresLocked = LockModel.objects.filter(**filters)
-        for f in featuresLocked:
-            self.initialFeatureLockedIds.append(f.feature_id)
-            if getattr(self, 'user') and f.user == self.user and getattr(self, 'sessionid') \
-                    and f.sessionid == self.sessionid:
-                self.getInitialUserFeatureLocked.append(f)
-                self.getInitialUserFeatureLockedByFeatureId[f.feature_id] = f.feature_lock_id
+        if not self.user or not self.sessionid:
+            return
 
-    def lockFeature(self, fid, save=False):
+        featuresLocked = LockModel.objects.filter(user=self.user, sessionid=self.sessionid, **self.layerFilters).\
+            values_list('feature_id', 'feature_lock_id')
+        for feature_id, feature_lock_id in featuresLocked:
+            self.getInitialUserFeatureLockedByFeatureId[feature_id] = feature_lock_id
+            self.initialUserFeatureLockIds.add(feature_lock_id)
+
+    def getFeatureLockId(self, fid):
         """
-        Build Lock Model istance, and optional save it
+        Return the lock id of a feature for the current session
         """
+
         featureLockId = hashlib.md5()
         toCrypt = str(fid) + self.layerName + \
             self.appName + self.layerDatasource
-        if getattr(self, 'sessionid'):
+        if self.sessionid:
             toCrypt += self.sessionid
         featureLockId.update(toCrypt.encode('utf-8'))
+        return featureLockId.hexdigest()
+
+    def _insertLocks(self, featuresIds, replace=False):
+        """
+        Insert the locks of features by a single query
+        :param featuresIds: list of features ids
+        :param replace: replace the locks of other sessions, i.e. for new features with the id of a deleted feature
+        :return: list of (feature id, lock id) tuples of the inserted locks
+        """
+
+        featuresIds = list(dict.fromkeys(str(fid) for fid in featuresIds))
+        if not featuresIds:
+            return []
+
+        if replace:
+            on_conflict = 'DO UPDATE SET feature_lock_id = EXCLUDED.feature_lock_id, user_id = EXCLUDED.user_id, ' \
+                          'sessionid = EXCLUDED.sessionid, time_locked = EXCLUDED.time_locked'
+        else:
+            on_conflict = 'DO NOTHING'
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {connection.ops.quote_name(LockModel._meta.db_table)} '
+                f'(feature_id, feature_lock_id, app_name, layer_name, layer_datasource, user_id, sessionid, time_locked) '
+                f'SELECT t.feature_id, t.feature_lock_id, %s, %s, %s, %s, %s, %s '
+                f'FROM unnest(%s::varchar[], %s::varchar[]) AS t (feature_id, feature_lock_id) '
+                f'ON CONFLICT (app_name, layer_name, layer_datasource, feature_id) {on_conflict} '
+                f'RETURNING feature_id, feature_lock_id',
+                [self.appName, self.layerName, self.layerDatasource, self.user_id, self.sessionid, timezone.now(),
+                 featuresIds, [self.getFeatureLockId(fid) for fid in featuresIds]])
+            return cursor.fetchall()
+
+    def lockFeature(self, fid, save=False):
+        """
+        Build Lock Model istance, and optional save it
+        """
+
         featureLock = LockModel(
-            feature_id=fid,
+            feature_id=str(fid),
             layer_name=self.layerName,
             app_name=self.appName,
             layer_datasource=self.layerDatasource,
-            feature_lock_id=featureLockId.hexdigest()
+            feature_lock_id=self.getFeatureLockId(fid),
+            user=self.user,
+            sessionid=self.sessionid
         )
 
-        if getattr(self, 'user'):
-            featureLock.user = self.user
-        if getattr(self, 'sessionid'):
-            featureLock.sessionid = self.sessionid
-
         if save:
-            featureLock.save()
+            self._insertLocks([fid], replace=True)
 
         return featureLock
 
@@ -92,67 +149,46 @@ class LayerLock(object):
 
     def lockFeatures(self, featuresIds):
         """
-        Lock features
+        Lock features not locked by other sessions
         :param featuresIds: list Features layer ids to lock
+        :return: list of locks (dict) of the features locked by current user and session, new and previous ones
         """
 
-        # first get initial features locked
-        self.getInitialFeatureLockedIds()
-
-        # find feature to lock
-        self.newFeatureToLockIds = list(
-            set(featuresIds) - set(self.initialFeatureLockedIds))
+        self.unLockExpiredSessionsFeatures()
 
-        potentialLockIds = []
-        lockModels = []
-        for fid in self.newFeatureToLockIds:
-            featureLock = self.lockFeature(fid)
-            potentialLockIds.append(featureLock.feature_lock_id)
-            lockModels.append(featureLock)
+        lockedFeatures = [{'featureid': fid, 'lockid': lockid} for fid, lockid in self._insertLocks(featuresIds)]
 
-        LockModel.objects.bulk_create(lockModels)
-
-        locks = LockModel.objects.filter(feature_lock_id__in=potentialLockIds)
-        lockedFeatures = []
-        for lock in locks:
-            lockedFeatures.append(self.modelLock2dict(lock))
-
-        if getattr(self, 'user') and len(self.getInitialUserFeatureLocked):
-            for f in self.getInitialUserFeatureLocked:
-                if f.feature_id in featuresIds:
-                    lockedFeatures.append(self.modelLock2dict(f))
+        # features already locked by current user and session: lock ids are deterministic by session
+        if self.user and self.sessionid and len(lockedFeatures) < len(featuresIds):
+            newLockIds = set(l['lockid'] for l in lockedFeatures)
+            userLockIds = [self.getFeatureLockId(fid) for fid in set(str(fid) for fid in featuresIds)]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT feature_id, feature_lock_id FROM {connection.ops.quote_name(LockModel._meta.db_table)} '
+                    f'WHERE feature_lock_id = ANY(%s) AND user_id = %s AND sessionid = %s',
+                    [userLockIds, self.user_id, self.sessionid])
+                lockedFeatures += [{'featureid': fid, 'lockid': lockid} for fid, lockid in cursor.fetchall()
+                                   if lockid not in newLockIds]
 
         return lockedFeatures
 
     @classmethod
     def unLockExpiredFeatures(cls, featuresLocked):
-
-        for featureLocked in featuresLocked:
-            featureLocked.delete()
-            # cls.unLockFeature(featureLocked.feature_lock_id)
+        delete_locks(featuresLocked)
 
     @classmethod
     def unLockFeature(cls, featureLockId):
-        LockModel.objects.get(feature_lock_id=featureLockId).delete()
+        delete_locks(LockModel.objects.filter(feature_lock_id=featureLockId))
 
     @classmethod
     def unLockFeatures(cls, featureLockIds):
-        featuresLocked = LockModel.objects.filter(
-            feature_lock_id__in=featureLockIds)
-        for featureLock in featuresLocked:
-            featureLock.delete()
+        delete_locks(LockModel.objects.filter(feature_lock_id__in=featureLockIds))
 
     def unLockFeatureByKeys(self, **kwargs):
-
-        featuresToUnlock = LockModel.objects.filter(**kwargs)
-        for f in featuresToUnlock:
-            f.delete()
+        delete_locks(LockModel.objects.filter(**kwargs))
 
     def unLockFeatureBySession(self):
-
-        featuresToUnlock = LockModel.objects.filter(sessionid=self.sessionid)
-        for f in featuresToUnlock:
-            f.delete()
+        delete_locks(LockModel.objects.filter(sessionid=self.sessionid))
 
     def checkFeatureLocked(self, feature_id):
 
@@ -161,7 +197,7 @@ class LayerLock(object):
         featureids_locked = self.clientLockedFeatures.keys()
         if int(feature_id) in featureids_locked:
             # check in lockid db
-            return self.clientLockedFeatures[int(feature_id)] in self.getInitialUserFeatureLockedByFeatureId.values()
+            return self.clientLockedFeatures[int(feature_id)] in self.initialUserFeatureLockIds
         else:
             return False
 
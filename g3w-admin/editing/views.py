@@ -18,7 +18,7 @@ from core.utils.vector import BaseUserMediaHandler
 from usersmanage.utils import setPermissionUserObject, get_viewers_for_object, \
     get_user_groups_for_object
 from .forms import ActiveEditingLayerForm
-from .models import G3WEditingLayer
+from .models import G3WEditingLayer, EDITING_LOCK_MODE_ALL
 import os
 
 MODE_EDITING = 'editing'
@@ -126,6 +126,7 @@ class ActiveEditingLayerView(AjaxableFormResponseMixin, G3WProjectViewMixin, G3W
             self.activated = G3WEditingLayer.objects.get(app_name=self.app_name, layer_id=self.layer_id)
             kwargs['initial']['active'] = True
             kwargs['initial']['scale'] = self.activated.scale
+            kwargs['initial']['lock_mode'] = self.activated.lock_mode
         except:
             self.activated = None
             kwargs['initial']['active'] = False
@@ -145,12 +146,15 @@ class ActiveEditingLayerView(AjaxableFormResponseMixin, G3WProjectViewMixin, G3W
     @transaction.atomic
     def form_valid(self, form):
         scale = form.cleaned_data['scale']
+        lock_mode = form.cleaned_data['lock_mode'] or EDITING_LOCK_MODE_ALL
         if form.cleaned_data['active']:
             if not self.activated:
-                G3WEditingLayer.objects.create(app_name=self.app_name, layer_id=self.layer_id, scale=scale)
+                G3WEditingLayer.objects.create(app_name=self.app_name, layer_id=self.layer_id, scale=scale,
+                                               lock_mode=lock_mode)
                 self.activated = True
             else:
                 self.activated.scale = scale
+                self.activated.lock_mode = lock_mode
                 self.activated.save()
         else:
             if self.activated:
@@ -1,14 +1,15 @@
 from django.http.request import QueryDict
 from django.conf import settings
-from django.core.cache import caches
-from django.utils.translation import ugettext_lazy as _
+from django.core.cache import cache, caches
+from django.db.models import Max
+from django.utils.translation import ugettext_lazy as _, get_language
 from rest_framework import serializers
 from rest_framework_gis import serializers as geo_serializers
 from rest_framework.fields import empty
 
 from qdjango.models import Project, Layer, Widget, SessionTokenFilter
 from qdjango.utils.data import QgisProjectSettingsWMS, QGIS_LAYER_TYPE_NO_GEOM
-from qdjango.utils.models import get_capabilities4layer
+from qdjango.utils.models import get_capabilities4layer, get_widget_unique_values, get_project_config_version
 from qdjango.ows import OWSRequestHandler
 from qdjango.signals import load_qdjango_widget_layer
 from qdjango.apps import get_qgs_project
@@ -17,10 +18,11 @@ from core.utils.structure import mapLayerAttributes
 from core.configs import *
 from core.signals import after_serialized_project_layer
 from core.mixins.api.serializers import G3WRequestSerializer
-from core.api.serializers import update_serializer_data
+from core.api.serializers import update_serializer_data, ProjectLayersContext
 from core.utils.structure import RELATIONS_ONE_TO_MANY, RELATIONS_ONE_TO_ONE
 from core.utils.qgisapi import get_qgis_layer
 from core.utils.general import clean_for_json
+from core.utils.models import parse_stored_structure
 from core.models import G3WSpatialRefSys
 
 from qgis.core import (
@@ -35,11 +37,25 @@ from qgis.PyQt.QtCore import QVariant
 
 from ..utils import serialize_vectorjoin
 from collections import OrderedDict
+from copy import deepcopy
+from hashlib import md5
 import json
 
 import logging
 logger = logging.getLogger(__name__)
 
+CLIENT_CONFIG_CACHE_KEY = 'qdjango_client_config_{}'
+
+
+class SerializedLayer(object):
+    """
+    Sender of after_serialized_project_layer signal: serialized layer data,
+    built by LayerSerializer or read from cache.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
 
 class ProjectSerializer(G3WRequestSerializer, serializers.ModelSerializer):
 
@@ -113,11 +129,9 @@ class ProjectSerializer(G3WRequestSerializer, serializers.ModelSerializer):
         :return: list
         """
 
-        relations = eval(instance.relations)
         map_relations = []
-        for relation in relations:
-            relation['type'] = RELATIONS_ONE_TO_MANY
-            map_relations.append(relation)
+        for relation in instance.relations_data:
+            map_relations.append(dict(relation, type=RELATIONS_ONE_TO_MANY))
         return map_relations
 
     def get_map_layers_relations_from_vectorjoins(self, layer_id, vectorjoins, layers):
@@ -128,7 +142,7 @@ class ProjectSerializer(G3WRequestSerializer, serializers.ModelSerializer):
         :param layers: queryset of Layer model from Project model instance
         :return: list
         """
-        joins = eval(vectorjoins)
+        joins = parse_stored_structure(vectorjoins) or []
         map_relations = []
         for n, join in enumerate(joins):
             if join['joinLayerId'] in layers:
@@ -234,7 +248,82 @@ class ProjectSerializer(G3WRequestSerializer, serializers.ModelSerializer):
             'layers': [l.layer.qgs_layer_id for l in stf.stf_layers.all()]
         }
 
+    def get_client_config_cache_key(self, instance):
+        """
+        Return the cache key of the user independent client configuration of the project,
+        None if the cache is disabled.
+        :param instance: qdjango Project model instance
+        :return: str
+        """
+
+        if getattr(settings, 'G3WADMIN_CLIENT_CONFIG_CACHE_TIMEOUT', 0) == 0:
+            return None
+
+        macrogroups_modified = instance.group.macrogroups.aggregate(Max('modified'))['modified__max']
+
+        return CLIENT_CONFIG_CACHE_KEY.format(md5('{}:{}:{}:{}:{}:{}'.format(
+            instance.pk,
+            instance.modified.isoformat(),
+            instance.group.modified.isoformat(),
+            macrogroups_modified.isoformat() if macrogroups_modified else '',
+            get_project_config_version(instance.pk),
+            get_language()
+        ).encode('utf-8')).hexdigest())
+
+    def set_layers_user_data(self, instance, ret):
+        """
+        Update serialized layers with the user dependent data from modules (i.e. editing capability)
+        and set the multilayer values.
+        :param instance: qdjango Project model instance
+        :param ret: serialized project data
+        """
+
+        layers = {l.qgs_layer_id: l for l in instance.layer_set.all()}
+
+        # data for all layers loaded once by receivers
+        context = ProjectLayersContext(layers.values(), self.request.user)
+
+        # for client map like multilayer
+        meta_layer = QdjangoMetaLayer()
+
+        for layer_serialized_data in ret['layers']:
+
+            # alter layer serialized data from plugin
+            # send layerseralized original and came back only key->value changed
+            for signal_receiver, data in after_serialized_project_layer.send(
+                    SerializedLayer(layer_serialized_data),
+                    layer=layers[layer_serialized_data['id']],
+                    request=self.request,
+                    context=context
+            ):
+                update_serializer_data(layer_serialized_data, data)
+            layer_serialized_data['multilayer'] = meta_layer.getCurrentByLayer(
+                layer_serialized_data)
+
     def to_representation(self, instance):
+        """
+        The user independent data are built once and stored into the cache,
+        the user dependent layers data are set on every call.
+        """
+
+        cache_key = self.get_client_config_cache_key(instance)
+        ret = cache.get(cache_key) if cache_key else None
+        if ret is None:
+            ret = self.get_base_representation(instance)
+            if cache_key:
+                cache.set(cache_key, ret, settings.G3WADMIN_CLIENT_CONFIG_CACHE_TIMEOUT)
+
+        self.set_layers_user_data(instance, ret)
+
+        return ret
+
+    def get_base_representation(self, instance):
+        """
+        Return the client configuration of the project without the user dependent data
+        :param instance: qdjango Project model instance
+        :return: dict
+        """
+
         logging.warning('Serializer')
         ret = super(ProjectSerializer, self).to_representation(instance)
         logging.warning('Before reading project')
@@ -257,14 +346,12 @@ class ProjectSerializer(G3WRequestSerializer, serializers.ModelSerializer):
         ret['widget'] = []
         ret['relations'] = []
         ret['no_legend'] = []
-        layers = {l.qgs_layer_id: l for l in instance.layer_set.all()}
+        layers = {l.qgs_layer_id: l for l in instance.layer_set.prefetch_related('widget_set')}
 
         # check fo title
         if hasattr(settings, 'G3W_CLIENT_SEARCH_TITLE'):
             ret['search_title'] = _(settings.G3W_CLIENT_SEARCH_TITLE)
 
-        # for client map like multilayer
-        meta_layer = QdjangoMetaLayer()
         to_remove_from_layerstree = []
 
         def readLeaf(layer, container):
@@ -276,16 +363,6 @@ class ProjectSerializer(G3WRequestSerializer, serializers.ModelSerializer):
                     layers[layer['id']], qgs_project=qgs_project)
                 layer_serialized_data = layer_serialized.data
 
-                # alter layer serialized data from plugin
-                # send layerseralized original and came back only key->value changed
-                for signal_receiver, data in after_serialized_project_layer.send(layer_serialized,
-                                                                                 layer=layers[layer['id']],
-                                                                                 request=self.request
-                                                                                 ):
-                    update_serializer_data(layer_serialized_data, data)
-                layer_serialized_data['multilayer'] = meta_layer.getCurrentByLayer(
-                    layer_serialized_data)
-
                 # check for vectorjoins and add to project relations
                 if layer_serialized_data['vectorjoins']:
                     ret['relations'] += self.get_map_layers_relations_from_vectorjoins(
@@ -424,8 +501,7 @@ class LayerSerializer(serializers.ModelSerializer):
             instance) if instance.database_columns else []
 
         # evalute fields to show or not by qgis project
-        column_to_exclude = eval(
-            instance.exclude_attribute_wms) if instance.exclude_attribute_wms else []
+        column_to_exclude = instance.exclude_attribute_wms_data
         for column in columns:
             column['show'] = False if column['name'] in column_to_exclude else True
         return columns
@@ -505,8 +581,6 @@ class LayerSerializer(serializers.ModelSerializer):
 
         qgs_maplayer = self.qgs_project.mapLayers()[instance.qgs_layer_id]
 
-        group = instance.project.group
-
         # add attributes/fields
         ret['fields'] = self.get_attributes(instance)
 
@@ -568,9 +642,9 @@ class LayerSerializer(serializers.ModelSerializer):
         # add metadata
         ret['metadata'] = self.get_metadata(instance, qgs_maplayer)
 
-        # eval editor_form_structure
+        # parse editor_form_structure
         if ret['editor_form_structure']:
-            ret['editor_form_structure'] = eval(instance.editor_form_structure)
+            ret['editor_form_structure'] = deepcopy(instance.editor_form_structure_data)
 
         # add ows
         ret['ows'] = self.get_ows(instance)
@@ -588,12 +662,21 @@ class WidgetSerializer(serializers.ModelSerializer):
         del(kwargs['layer'])
         super(WidgetSerializer, self).__init__(instance, data, **kwargs)
 
+    def _get_unique_values(self, field_name):
+        """Returns the sorted unique values of a layer field for selectbox, from cache"""
+
+        try:
+            return get_widget_unique_values(self.layer, get_qgis_layer(self.layer), field_name)
+        except ValueError as e:
+            logger.error(f'Response vector widget unique: {e}')
+            return []
+
     def to_representation(self, instance):
         ret = super(WidgetSerializer, self).to_representation(instance)
         ret['type'] = instance.widget_type
 
         # get edittype
-        edittypes = eval(self.layer.edittypes)
+        edittypes = self.layer.edittypes_data
 
         if ret['type'] == 'search':
             body = json.loads(instance.body)
@@ -610,28 +693,6 @@ class WidgetSerializer(serializers.ModelSerializer):
                 # if widgettype is selectbox, get values
                 if 'widgettype' in field and field['widgettype'] == 'selectbox':
 
-                    qgis_layer = get_qgis_layer(self.layer)
-
-                    uniques = qgis_layer.uniqueValues(
-                        qgis_layer.fields().indexOf(field['name'])
-                    )
-                    values = []
-                    for u in uniques:
-                        try:
-                            values.append(json.loads(
-                                QgsJsonUtils.encodeValue(u)))
-                        except Exception as e:
-                            logger.error(f'Response vector widget unique: {e}')
-                            continue
-
-                    # sort values for selectbox
-                    try:
-                        values = sorted(set(values))
-                    except:
-                        values = set(values)
-
-                    values = list(values)
-
                     field['input']['type'] = 'selectfield'
                     if 'dependance' not in field['input']['options']:
 
@@ -639,9 +700,9 @@ class WidgetSerializer(serializers.ModelSerializer):
                         # todo: add 'ValueRelation' case
                         if field['name'] in edittypes and \
                                 edittypes[field['name']]['widgetv2type'] in ('ValueMap',):
-                            field['input']['options']['values'] = edittypes[field['name']]['values']
+                            field['input']['options']['values'] = deepcopy(edittypes[field['name']]['values'])
                         else:
-                            field['input']['options']['values'] = values
+                            field['input']['options']['values'] = self._get_unique_values(field['name'])
                     else:
                         field['input']['options']['values'] = []
 
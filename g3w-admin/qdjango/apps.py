@@ -9,6 +9,10 @@ from qgis.core import QgsApplication, QgsProject
 from django.core.exceptions import ImproperlyConfigured
 from qgis.server import QgsServer, QgsConfigCache, QgsServerSettings
 
+from .utils.pool import QgsProjectPool
+from .utils.server import get_qgs_server_request_context
+
+import time
 import logging
 logger = logging.getLogger(__name__)
 
@@ -62,15 +66,43 @@ os.environ['QGIS_SERVER_IGNORE_BAD_LAYERS'] = '1'
 QGS_SERVER_SETTINGS = QgsServerSettings()
 QGS_SERVER_SETTINGS.load()
 
+
+class G3WQgsServer(QgsServer):
+    """
+    QgsServer exposing the Django request, the user and the qdjango project of the request
+    handled in the current thread or task (see qdjango.utils.server.qgs_server_request)
+    """
+
+    def _get_context_attr(self, attr):
+        context = get_qgs_server_request_context()
+        return getattr(context, attr) if context else None
+
+    @property
+    def djrequest(self):
+        return self._get_context_attr('djrequest')
+
+    @property
+    def user(self):
+        return self._get_context_attr('user')
+
+    @property
+    def project(self):
+        return self._get_context_attr('project')
+
+
 # Create a singleton server instance, this is not really necessary but it
 # may be a little faster than creating a new instance every time we handle
 # a request
-QGS_SERVER = QgsServer()
+QGS_SERVER = G3WQgsServer()
+
+
+# Pool of the loaded projects of the worker process
+QGS_PROJECT_POOL = QgsProjectPool(QGS_SERVER_SETTINGS)
 
 
 def get_qgs_project(path):
-    """Reads and returns a project from the cache, trying to load it
-    if it's not there.
+    """Reads and returns a project from the worker project pool, trying to load it
+    if it's not there or if the project file has been updated.
     A None is returned if the project could not be loaded.
 
     :param path: the filesystem path to the project
@@ -80,37 +112,39 @@ def get_qgs_project(path):
     """
 
     try:
-        # Call process events in case the project has been updated and the cache
-        # needs rebuilt
-        QgsApplication.instance().processEvents()
-        project = QgsConfigCache.instance().project(path, QGS_SERVER_SETTINGS)
-        # This is required after QGIS 3.10.11, see https://github.com/qgis/QGIS/pull/38488#issuecomment-692190106
-        if project is not None and project != QgsProject.instance():
-            try:
-                # Workaround for virtual layers bug  https://github.com/qgis/QGIS/pull/38488#issuecomment-692190106
-                QgsProject.setInstance(project)
-                needs_reload = False
-                for l in list(project.mapLayers().values()):
-                    if not l.isValid():
-                        logger.warning('Invalid layer %s found in project %s' % (
-                            l.id(), project.fileName()))
-                        if l.dataProvider().name() == 'virtual':
-                            needs_reload = True
-                            logger.warning('Invalid virtual layer found in project %s: %s' % (
-                                project.fileName(), l.publicSource()))
-                if needs_reload:
-                    logger.warning('Reload project %s' % project.fileName())
-                    QgsProject.instance().read(path)
-            except AttributeError:  # Temporary workaround for 3.10.10
-                logger.warning(
-                    'Project reloaded because QgsProject.setInstance() is not available in this QGIS version: %s' % path)
-                QgsProject.instance().read(path)
-        return QgsProject.instance()
+        return QGS_PROJECT_POOL.get(path)
     except Exception as ex:
         logger.warning('There was an error loading the project from path: %s, this is normally due to unavailable layers. If this is unexpected, please turn on and check server debug logs for further details.\n%s.' % (path, ex))
         return None
 
 
+def warm_up_project_pool():
+    """
+    Load into the worker project pool the projects of settings.G3WADMIN_PROJECT_POOL_WARMUP (project ids)
+    and the G3WADMIN_PROJECT_POOL_WARMUP_TOP most requested projects.
+    To call after the worker process fork, i.e. uwsgi postfork hook.
+    """
+
+    paths = []
+    try:
+        project_ids = getattr(settings, 'G3WADMIN_PROJECT_POOL_WARMUP', [])
+        if project_ids:
+            from qdjango.models import Project
+            for project in Project.objects.filter(pk__in=project_ids):
+                paths.append(project.qgis_file.path)
+
+        top = getattr(settings, 'G3WADMIN_PROJECT_POOL_WARMUP_TOP', 0)
+        if top:
+            paths += [p for p in QGS_PROJECT_POOL.get_top_projects(top) if p not in paths]
+    except Exception as ex:
+        logger.warning(f'Error reading projects for project pool warm up: {ex}')
+
+    start = time.time()
+    QGS_PROJECT_POOL.warm_up(paths)
+    if paths:
+        logger.info(f'Project pool warm up of {len(QGS_PROJECT_POOL)} projects in {time.time() - start:.3f}s')
+
+
 def GiveBaseGrant(sender, **kwargs):
 
     if isinstance(sender, QdjangoConfig):
@@ -1,8 +1,16 @@
 from django.conf import settings
-from django.http.request import QueryDict
+from django.contrib.auth.models import AnonymousUser
+from django.http.request import HttpRequest, QueryDict
 from django.urls import reverse
+from qgis.server import QgsBufferServerRequest, QgsBufferServerResponse
 from .models import Layer
+from .apps import QGS_SERVER, get_qgs_project
+from .utils.server import qgs_server_request
 from caching.utils import projections
+from io import BytesIO
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 def get_layer_to_erase_for_project(layer_id):
@@ -19,6 +27,62 @@ def get_layer_to_erase_for_project(layer_id):
 if 'caching' in settings.G3WADMIN_LOCAL_MORE_APPS:
 
     from caching.utils.layer import TilestacheLayerBase
+    from PIL import Image
+
+    class QgisServerTileProvider(object):
+        """
+        TileStache provider rendering the tiles of a caching layer in the current process by QGIS server,
+        without HTTP requests to the OWS view. Metatiles are rendered as a single GetMap.
+        """
+
+        def __init__(self, layer, layer_id, params):
+            """
+            :param layer: TileStache layer instance
+            :param layer_id: qdjango Layer model instance pk
+            :param params: WMS GetMap params without the tile area params
+            """
+
+            self.layer = layer
+            self.layer_id = layer_id
+            self.params = params
+
+        def renderArea(self, width, height, srs, xmin, ymin, xmax, ymax, zoom):
+            """ Render tile or metatile area by QGIS server, TileStache provider API """
+
+            layer = Layer.objects.select_related('project', 'project__group').get(pk=self.layer_id)
+            qdjango_project = layer.project
+
+            q = QueryDict('', mutable=True)
+            q.update(self.params)
+            q['BBOX'] = f'{xmin},{ymin},{xmax},{ymax}'
+            q['SRS'] = srs
+            q['WIDTH'] = str(width)
+            q['HEIGHT'] = str(height)
+
+            # Django request for server filters (access control), as for OWS requests with caching token
+            djrequest = HttpRequest()
+            djrequest.method = 'GET'
+            djrequest.GET = q
+            djrequest.user = AnonymousUser()
+
+            ows_url = reverse('OWS:ows', kwargs={'group_slug': qdjango_project.group.slug, 'project_type': 'qdjango',
+                                                 'project_id': qdjango_project.id})
+            qgs_request = QgsBufferServerRequest('{}{}?{}'.format(settings.QDJANGO_SERVER_URL, ows_url, q.urlencode()))
+            qgs_response = QgsBufferServerResponse()
+
+            with qgs_server_request(djrequest, qdjango_project):
+                qgs_project = get_qgs_project(qdjango_project.qgis_file.path)
+                if qgs_project is None:
+                    raise Exception(f'The QGIS project of layer {self.layer_id} could not be loaded!')
+
+                QGS_SERVER.handleRequest(qgs_request, qgs_response, qgs_project)
+
+            content_type = qgs_response.headers().get('Content-Type', '')
+            if qgs_response.statusCode() != 200 or not content_type.startswith('image/'):
+                raise Exception('Error rendering tile for layer {}: {}'.format(
+                    self.layer_id, bytes(qgs_response.body())[:512].decode('utf-8', 'replace')))
+
+            return Image.open(BytesIO(bytes(qgs_response.body())))
 
     class TilestacheLayer(TilestacheLayerBase):
 
@@ -32,6 +96,25 @@ if 'caching' in settings.G3WADMIN_LOCAL_MORE_APPS:
             else:
                 self.q['LAYERS'] = layer.name
 
+            projection = 'caching.utils.projections:CustomXYZGridProjection(\'EPSG:{}\')'.\
+                format(layer.project.group.srid.auth_srid)
+
+            # TileStache provider: 'qgis' to render tiles in process by QGIS server,
+            # 'url template' to request tiles to the OWS view by HTTP.
+            if getattr(settings, 'TILESTACHE_CACHE_PROVIDER', 'qgis') == 'qgis':
+                params = {k: v for k, v in self.q.items() if '$' not in v}
+                self.layer_dict = {
+                    'provider': {
+                        'class': 'qdjango.cache:QgisServerTileProvider',
+                        'kwargs': {
+                            'layer_id': layer.pk,
+                            'params': params
+                        }
+                    },
+                    'projection': projection
+                }
+                return
+
             # add TILESTACHE_CACHE_TOKEN
             self.q['g3wsuite_caching_token'] = settings.TILESTACHE_CACHE_TOKEN
 
@@ -44,6 +127,5 @@ if 'caching' in settings.G3WADMIN_LOCAL_MORE_APPS:
                     'name': 'url template',
                     'template': '{}{}?{}'.format(settings.QDJANGO_SERVER_URL, ows_url, self.q.urlencode(safe='$'))
                 },
-                'projection': 'caching.utils.projections:CustomXYZGridProjection(\'EPSG:{}\')'.
-                    format(layer.project.group.srid.auth_srid)
+                'projection': projection
             }
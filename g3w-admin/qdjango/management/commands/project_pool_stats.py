@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.core.cache import cache
+from qdjango.utils.pool import PROJECT_POOL_METRICS_CACHE_KEY, PROJECT_POOL_HITS_CACHE_KEY
+
+
+class Command(BaseCommand):
+    """
+    This command prints the QGIS project pool metrics of every worker process and the most requested projects.
+    """
+
+    help = 'Print QGIS project pool metrics of worker processes and most requested projects'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', dest='top', default=10, type=int)
+
+    def handle(self, *args, **options):
+
+        metrics = cache.get(PROJECT_POOL_METRICS_CACHE_KEY) or {}
+        for pid, worker_metrics in metrics.items():
+            self.stdout.write(self.style.SUCCESS(
+                'Worker {pid}: {size} projects, {memory:.1f} MB, hits {hits}, misses {misses}, '
+                'loads {loads} (avg {load_time_avg:.3f}s, max {load_time_max:.3f}s), load errors {load_errors}, '
+                'evictions {evictions}'.format(pid=pid, **dict(worker_metrics,
+                                                                memory=worker_metrics['memory'] / 1024 / 1024))))
+
+        hits = cache.get(PROJECT_POOL_HITS_CACHE_KEY) or {}
+        for path, (count, last_hit) in sorted(hits.items(), key=lambda h: h[1][0], reverse=True)[:options['top']]:
+            self.stdout.write('{}: {}'.format(count, path))
@@ -16,6 +16,7 @@ from usersmanage.configs import *
 from core.configs import *
 from core.receivers import check_overviewmap_project
 from core.utils import unicode2ascii
+from core.utils.models import StoredStructure
 from qdjango.utils.models import get_widgets4layer, get_constraints4layer
 
 from qgis.core import QgsRectangle
@@ -115,6 +116,9 @@ class Project(G3WProjectMixins, G3WACLModelMixins, TimeStampedModel):
     # possible layer relations
     relations = models.TextField(_('Layer relations'), blank=True, null=True)
 
+    # parsed relations, read only
+    relations_data = StoredStructure('relations', list)
+
     # WMSUseLayerIDs
     wms_use_layer_ids = models.BooleanField(
         _('WMS use layer ids'), default=False)
@@ -411,6 +415,12 @@ class Layer(G3WACLModelMixins, models.Model):
     # layer extension
     extent = models.TextField(_('Layer extension'), null=True, blank=True)
 
+    # parsed text fields, read only
+    edittypes_data = StoredStructure('edittypes', dict)
+    vectorjoins_data = StoredStructure('vectorjoins', list)
+    editor_form_structure_data = StoredStructure('editor_form_structure')
+    exclude_attribute_wms_data = StoredStructure('exclude_attribute_wms', list)
+
 
     # for layer WMS/WMST: set if load direct from their servers or from local QGIS-server
     external = models.BooleanField(
@@ -9,16 +9,20 @@
 """
 
 import os
+import time
 import logging
-from django.http import HttpResponse, Http404, HttpResponseServerError
+from django.http import HttpResponse, StreamingHttpResponse, Http404, HttpResponseServerError
 from django.conf import settings
 from django.http.request import QueryDict
 from django.db.models import Q
-from django.core.cache import cache
+from django.core.cache import cache, caches
 
-from qgis.server import QgsBufferServerRequest, QgsBufferServerResponse
+from qgis.server import QgsBufferServerRequest
 
 from qdjango.apps import QGS_SERVER, get_qgs_project
+from qdjango.utils.models import get_project_config_version, get_constraints_fingerprint
+from qdjango.utils.server import QgsServerChunkedResponse, get_qgs_server_request_headers, qgs_server_request
+from core.utils.response import make_etag, get_cache_control, get_not_modified_response, patch_conditional_headers
 
 from OWS.ows import OWSRequestHandlerBase
 from .models import Project, Layer
@@ -34,12 +38,82 @@ from .auth import QdjangoProjectAuthorizer
 
 logger = logging.getLogger(__name__)
 
+# OWS requests with HTTP validators (ETag): responses not depending on layers data
+OWS_ETAG_REQUESTS = getattr(settings, 'G3WADMIN_OWS_ETAG_REQUESTS', [
+    'GETCAPABILITIES',
+    'GETPROJECTSETTINGS',
+    'DESCRIBEFEATURETYPE',
+    'DESCRIBELAYER',
+    'GETSTYLES',
+    'GETLEGENDGRAPHIC',
+    'GETSCHEMAEXTENSION'
+])
+
+# Min size in bytes of the OWS responses streamed to the client
+OWS_STREAMING_MIN_SIZE = getattr(settings, 'G3WADMIN_OWS_STREAMING_MIN_SIZE', 1024 * 1024)
+
+
+class OWSResponseCache(object):
+    """
+    Cache of the responses of idempotent OWS read requests (OWS_ETAG_REQUESTS),
+    by project and response ETag (project changes, normalised query and user constraints).
+    Responses are stored into the Django cache settings.G3WADMIN_OWS_RESPONSE_CACHE for
+    G3WADMIN_OWS_RESPONSE_CACHE_TIMEOUT seconds (0 disables the cache), responses bigger than
+    G3WADMIN_OWS_RESPONSE_CACHE_MAX_SIZE bytes are not stored.
+    """
+
+    key = 'qdjango_ows_response_{}_{}_{}'
+    version_key = 'qdjango_ows_response_version_{}'
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'G3WADMIN_OWS_RESPONSE_CACHE', 'default')]
+        self.timeout = getattr(settings, 'G3WADMIN_OWS_RESPONSE_CACHE_TIMEOUT', 0)
+        self.max_size = getattr(settings, 'G3WADMIN_OWS_RESPONSE_CACHE_MAX_SIZE', 5 * 1024 * 1024)
+
+    @property
+    def enabled(self):
+        return self.timeout != 0
+
+    def _get_key(self, project_pk, etag):
+        version = self.cache.get(self.version_key.format(project_pk), 0)
+        return self.key.format(project_pk, version, etag.strip('"'))
+
+    def get(self, project_pk, etag):
+        """
+        :return: cached HttpResponse, None if not cached
+        """
+
+        cached = self.cache.get(self._get_key(project_pk, etag))
+        if cached is None:
+            return None
+
+        status_code, headers, body = cached
+        response = HttpResponse(body, status=status_code)
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    def set(self, project_pk, etag, response):
+        if len(response.content) > self.max_size:
+            return
+
+        headers = {key: value for key, value in response.items() if key not in ('ETag', 'Cache-Control')}
+        self.cache.set(self._get_key(project_pk, etag), (response.status_code, headers, response.content),
+                       self.timeout)
+
+    def invalidate(self, project_pk):
+        """ Invalidate all cached responses of a project """
+
+        self.cache.set(self.version_key.format(project_pk), time.time(), None)
+
 
 class OWSRequestHandler(OWSRequestHandlerBase):
     """
     Handler for ows request for module qdjango
     """
 
+    response_cache_class = OWSResponseCache
+
     def __init__(self, request, **kwargs):
 
         self.request = request
@@ -61,6 +135,30 @@ class OWSRequestHandler(OWSRequestHandlerBase):
     def project(self):
         return self._projectInstance
 
+    def get_etag(self, q):
+        """
+        Build the ETag of an OWS response: request scheme and host, project changes, normalised query
+        and user constraints (online resource URLs of the responses contain scheme and host)
+        :param q: OWS request query
+        :return: quoted ETag
+        """
+
+        query = sorted((k.upper(), sorted(v)) for k, v in q.lists())
+        try:
+            project_mtime = os.stat(self.project.qgis_file.path).st_mtime
+        except OSError:
+            project_mtime = None
+
+        return make_etag(
+            self.request.build_absolute_uri(self.request.path),
+            self.project.pk,
+            self.project.modified.isoformat(),
+            project_mtime,
+            get_project_config_version(self.project.pk),
+            query,
+            get_constraints_fingerprint(self.request.user, self.project)
+        )
+
     def baseDoRequest(self, q):
 
         request = self.request
@@ -75,12 +173,26 @@ class OWSRequestHandler(OWSRequestHandlerBase):
                 else:
                     ows_request = request.POST['REQUEST'][0].upper()
             q['REQUEST'] = ows_request
-
-        # FIXME: proxy or redirect in case of WMS/WFS/XYZ cascading?
-        qgs_project = get_qgs_project(self.project.qgis_file.path)
-
-        if qgs_project is None:
-            raise Http404('The requested QGIS project could not be loaded!')
+        else:
+            ows_request = None
+
+        # HTTP conditional caching: not modified responses don't reach QGIS server
+        service = q.get('SERVICE', '').upper()
+        cache_control = get_cache_control(f'{service}:{ows_request}', service)
+        etag = None
+        if request.method in ('GET', 'HEAD') and ows_request in OWS_ETAG_REQUESTS and 'FILTERTOKEN' not in q:
+            etag = self.get_etag(q)
+            not_modified = get_not_modified_response(request, etag=etag, cache_control=cache_control)
+            if not_modified is not None:
+                return not_modified
+
+        response_cache = self.response_cache_class() if etag else None
+        if response_cache and response_cache.enabled:
+            response = response_cache.get(self.project.pk, etag)
+            if response is not None:
+                return patch_conditional_headers(response, etag=etag, cache_control=cache_control)
+        else:
+            response_cache = None
 
         data = None
         if request.method == 'GET':
@@ -103,30 +215,42 @@ class OWSRequestHandler(OWSRequestHandlerBase):
                 "Request method not supported: %s, assuming GET" % request.method)
             method = QgsBufferServerRequest.GetMethod
 
-        headers = {}
-        for header_key in request.headers.keys():
-            headers[header_key] = request.headers.get(header_key)
         uri = request.build_absolute_uri(request.path) + '?' + q.urlencode()
         logger.debug('Calling QGIS Server: %s' % uri)
-        qgs_request = QgsBufferServerRequest(uri, method, headers, data)
+        qgs_request = QgsBufferServerRequest(uri, method, get_qgs_server_request_headers(request), data)
 
-        # Attach user and project to the server object to make them accessible by the
-        # server access control plugins (constraints etc.)
-        QGS_SERVER.djrequest = request
-        QGS_SERVER.user = request.user
-        QGS_SERVER.project = self.project
+        qgs_response = QgsServerChunkedResponse()
 
-        qgs_response = QgsBufferServerResponse()
-        try:
-            QGS_SERVER.handleRequest(qgs_request, qgs_response, qgs_project)
-        except Exception as ex:
-            return HttpResponseServerError(reason="Error handling server request: %s" % ex)
+        # QGIS server requests of the worker threads are serialized, user and project are attached
+        # to the request context to make them accessible by the server access control plugins (constraints etc.)
+        with qgs_server_request(request, self.project):
+
+            # FIXME: proxy or redirect in case of WMS/WFS/XYZ cascading?
+            qgs_project = get_qgs_project(self.project.qgis_file.path)
 
-        response = HttpResponse(bytes(qgs_response.body()))
+            if qgs_project is None:
+                raise Http404('The requested QGIS project could not be loaded!')
+
+            try:
+                QGS_SERVER.handleRequest(qgs_request, qgs_response, qgs_project)
+            except Exception as ex:
+                return HttpResponseServerError(reason="Error handling server request: %s" % ex)
+
+        # cached and small responses are sent as a whole, the others are streamed by the chunks flushed by QGIS server
+        if response_cache or qgs_response.size < OWS_STREAMING_MIN_SIZE:
+            response = HttpResponse(qgs_response.body())
+        else:
+            response = StreamingHttpResponse(qgs_response.iter_chunks())
         response.status_code = qgs_response.statusCode()
 
         for key, value in qgs_response.headers().items():
             response[key] = value
+        response['Content-Length'] = qgs_response.size
+
+        if response.status_code == 200:
+            if response_cache:
+                response_cache.set(self.project.pk, etag, response)
+            patch_conditional_headers(response, etag=etag, cache_control=cache_control)
 
         return response
 
@@ -1,20 +1,51 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_delete, post_save, pre_delete, m2m_changed
+from django.core.signals import request_started, request_finished
 from django.conf import settings
 from django.core.cache import caches
 from django.contrib.auth.signals import user_logged_out
 from django.http.request import QueryDict
-from core.signals import perform_client_search, post_delete_project
+from core.signals import perform_client_search, post_delete_project, post_commit_maplayer
 from core.models import ProjectMapUrlAlias
 from OWS.utils.data import GetFeatureInfoResponse
 from .models import Project, Layer, Widget, SessionTokenFilter
+from .apps import QGS_PROJECT_POOL
 from .ows import OWSRequestHandler
+from .utils.models import delete_widget_unique_values, bump_project_config_version, \
+    run_widget_unique_values_refreshes
 import os
 import logging
 
 logger = logging.getLogger('django.request')
 
 
+@receiver(request_started)
+def project_pool_request_started(**kwargs):
+    """
+    Projects got from the worker project pool by the request are not evicted until the request end
+    """
+
+    QGS_PROJECT_POOL.request_started()
+
+
+@receiver(request_finished)
+def project_pool_request_finished(**kwargs):
+    """
+    Release the projects used by the request (streaming responses end after the last chunk)
+    """
+
+    QGS_PROJECT_POOL.request_finished()
+
+
+@receiver(request_finished)
+def refresh_widget_unique_values(**kwargs):
+    """
+    Refresh the outdated widgets unique values served by the request: the response has already been sent
+    """
+
+    run_widget_unique_values_refreshes()
+
+
 @receiver(post_delete, sender=Project)
 def delete_project_file(sender, **kwargs):
     """
@@ -49,6 +80,9 @@ def delete_cache_project_settings(sender, **kwargs):
 
     instance = kwargs['instance']
 
+    # cached OWS responses
+    OWSRequestHandler.response_cache_class().invalidate(instance.pk)
+
 
 @receiver(post_save, sender=Layer)
 def update_widget(sender, **kwargs):
@@ -71,6 +105,73 @@ def update_widget(sender, **kwargs):
             widget.save()
 
 
+@receiver(post_save, sender=Layer)
+def delete_cache_widget_unique_values(sender, **kwargs):
+    """
+    Delete cached unique values of search widgets selectbox on layer update (i.e. project re-upload)
+    """
+
+    # only for update
+    if kwargs['created']:
+        return
+
+    delete_widget_unique_values(kwargs['instance'])
+
+
+@receiver(post_save, sender=Layer)
+@receiver(post_delete, sender=Layer)
+def invalidate_client_config_layer(sender, **kwargs):
+    """
+    Invalidate cached client configuration of the project on layer changes
+    """
+
+    bump_project_config_version(kwargs['instance'].project_id)
+
+
+@receiver(post_save, sender=Widget)
+@receiver(pre_delete, sender=Widget)
+def invalidate_client_config_widget(sender, **kwargs):
+    """
+    Invalidate cached client configuration of the projects using the widget
+    """
+
+    for project_pk in set(kwargs['instance'].layers.values_list('project_id', flat=True)):
+        bump_project_config_version(project_pk)
+
+
+@receiver(m2m_changed, sender=Widget.layers.through)
+def invalidate_client_config_widget_layers(sender, **kwargs):
+    """
+    Invalidate cached client configuration of the projects on widget layers changes
+    """
+
+    # on clear, layers are still related only before the action
+    if kwargs['action'] not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if isinstance(kwargs['instance'], Widget):
+        project_pks = kwargs['instance'].layers.values_list('project_id', flat=True)
+        if kwargs['pk_set']:
+            project_pks = list(project_pks) + list(
+                Layer.objects.filter(pk__in=kwargs['pk_set']).values_list('project_id', flat=True))
+    else:
+        project_pks = [kwargs['instance'].project_id]
+
+    for project_pk in set(project_pks):
+        bump_project_config_version(project_pk)
+
+
+@receiver(post_commit_maplayer)
+def invalidate_client_config_editing(sender, **kwargs):
+    """
+    Invalidate cached client configuration of the project after editing commit:
+    i.e. search widgets selectbox values
+    """
+
+    if isinstance(kwargs['layer'], Layer):
+        bump_project_config_version(kwargs['layer'].project_id)
+
+
 @receiver(user_logged_out)
 def delete_session_token_filter(sender, **kwargs):
     """
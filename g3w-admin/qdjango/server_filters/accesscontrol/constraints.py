@@ -14,6 +14,7 @@ __copyright__ = 'Copyright 2020, Gis3W'
 from qgis.server import QgsAccessControlFilter
 from qgis.core import QgsMessageLog, Qgis
 from qdjango.apps import QGS_SERVER
+from qdjango.utils.server import get_qgs_server_request_context
 from qdjango.models import ConstraintSubsetStringRule, ConstraintExpressionRule, Layer
 
 class SingleLayerSubsetStringAccessControlFilter(QgsAccessControlFilter):
@@ -25,13 +26,17 @@ class SingleLayerSubsetStringAccessControlFilter(QgsAccessControlFilter):
     def layerFilterSubsetString(self, layer):
         """Retrieve and sets user layer constraints"""
 
+        context = get_qgs_server_request_context()
+        if context is None:
+            return ""
+
         try:
-            qdjango_layer = Layer.objects.get(project=QGS_SERVER.project, qgs_layer_id=layer.id())
+            qdjango_layer = Layer.objects.get(project=context.project, qgs_layer_id=layer.id())
         except Layer.DoesNotExist:
             return ""
 
-        rule = ConstraintSubsetStringRule.get_rule_definition_for_user(QGS_SERVER.user, qdjango_layer.pk)
-        QgsMessageLog.logMessage("SingleLayerSubsetStringAccessControlFilter rule for user %s and layer id %s: %s" % (QGS_SERVER.user, layer.id(), rule), "", Qgis.Info)
+        rule = ConstraintSubsetStringRule.get_rule_definition_for_user(context.user, qdjango_layer.pk)
+        QgsMessageLog.logMessage("SingleLayerSubsetStringAccessControlFilter rule for user %s and layer id %s: %s" % (context.user, layer.id(), rule), "", Qgis.Info)
         return rule
 
 
@@ -51,13 +56,17 @@ class SingleLayerExpressionAccessControlFilter(QgsAccessControlFilter):
     def layerFilterExpression(self, layer):
         """Retrieve and sets user layer constraints"""
 
+        context = get_qgs_server_request_context()
+        if context is None:
+            return ""
+
         try:
-            qdjango_layer = Layer.objects.get(project=QGS_SERVER.project, qgs_layer_id=layer.id())
+            qdjango_layer = Layer.objects.get(project=context.project, qgs_layer_id=layer.id())
         except Layer.DoesNotExist:
             return ""
 
-        rule = ConstraintExpressionRule.get_rule_definition_for_user(QGS_SERVER.user, qdjango_layer.pk)
-        QgsMessageLog.logMessage("SingleLayerExpressionAccessControlFilter rule for user %s and layer id %s: %s" % (QGS_SERVER.user, layer.id(), rule), "", Qgis.Info)
+        rule = ConstraintExpressionRule.get_rule_definition_for_user(context.user, qdjango_layer.pk)
+        QgsMessageLog.logMessage("SingleLayerExpressionAccessControlFilter rule for user %s and layer id %s: %s" % (context.user, layer.id(), rule), "", Qgis.Info)
         return rule
 
 
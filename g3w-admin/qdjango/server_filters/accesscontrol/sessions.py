@@ -14,6 +14,7 @@ __copyright__ = 'Copyright 2015 - 2020, Gis3w'
 from qgis.server import QgsAccessControlFilter
 from qgis.core import QgsMessageLog, Qgis
 from qdjango.apps import QGS_SERVER
+from qdjango.utils.server import get_qgs_server_request_context
 from qdjango.models import SessionTokenFilter, Layer
 
 
@@ -26,14 +27,18 @@ class SingleLayerSessionTokenAccessControlFilter(QgsAccessControlFilter):
     def layerFilterExpression(self, layer):
         """Retrieve and sets user layer constraints"""
 
+        context = get_qgs_server_request_context()
+        if context is None:
+            return ""
+
         try:
-            qdjango_layer = Layer.objects.get(project=QGS_SERVER.project, qgs_layer_id=layer.id())
+            qdjango_layer = Layer.objects.get(project=context.project, qgs_layer_id=layer.id())
         except Layer.DoesNotExist:
             return ""
 
         # check for filtertoken
-        request_data = QGS_SERVER.djrequest.POST if QGS_SERVER.djrequest.method == 'POST' \
-            else QGS_SERVER.djrequest.GET
+        request_data = context.djrequest.POST if context.djrequest.method == 'POST' \
+            else context.djrequest.GET
 
         filtertoken = request_data.get('filtertoken')
         if not filtertoken:
@@ -659,6 +659,39 @@ class TestQdjangoLayersAPI(QdjangoTestBase):
         properties = resp["vector"]["data"]["features"][1]["properties"]
         self.assertEqual(properties['type'], 'B')
 
+    def testCoreVectorApiDataStream(self):
+        """Test core-vector-api data with streaming output"""
+
+        args = ['data', 'qdjango', self.project_widget310.instance.pk,
+                'main_layer_e867d371_3388_4e2d_a214_95adbb56165c']
+
+        resp = json.loads(self._testApiCall('core-vector-api', args).content)
+
+        for params in ({'stream': '1'}, {'stream': 'true', 'formatter': '1'}):
+
+            response = self._testApiCall('core-vector-api', args, params)
+            self.assertTrue(response.streaming)
+            stream_resp = json.loads(b''.join(response.streaming_content))
+
+            self.assertTrue(stream_resp["result"])
+            self.assertEqual(list(stream_resp.keys()), list(resp.keys()))
+            self.assertEqual(stream_resp["vector"]["count"], resp["vector"]["count"])
+            self.assertEqual(stream_resp["vector"]["geometrytype"], "Polygon")
+            self.assertEqual(stream_resp["vector"]["data"]["type"], "FeatureCollection")
+            self.assertEqual(len(stream_resp["vector"]["data"]["features"]),
+                             len(resp["vector"]["data"]["features"]))
+
+            if 'formatter' not in params:
+                self.assertEqual(stream_resp["vector"]["data"], resp["vector"]["data"])
+
+        # check for value relation
+        properties = stream_resp["vector"]["data"]["features"][0]["properties"]
+        self.assertEqual(properties['type'], 'TYPE A')
+
+        # stream=0
+        response = self._testApiCall('core-vector-api', args, {'stream': '0'})
+        self.assertFalse(response.streaming)
+
     def test_server_filters_combination_api(self):
         """ Test server filter combination: i.e. FieldFilterBacked + SuggestFilterBackend """
 
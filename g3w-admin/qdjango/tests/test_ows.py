@@ -13,7 +13,7 @@ __copyright__ = 'Copyright 2020, Gis3w'
 
 import json
 import os
-from unittest import skip
+from unittest import skip, mock
 
 from core.models import G3WSpatialRefSys
 from core.models import Group as CoreGroup
@@ -78,6 +78,149 @@ class OwsTest(QdjangoTestBase):
 
         self.assertTrue(b'<Name>bluemarble</Name>' in response.content)
 
+    @override_settings(G3WADMIN_CACHE_CONTROL={'WMS:GETCAPABILITIES': 'private, max-age=60'})
+    def test_conditional_get(self):
+        """Test ETag and 304 Not Modified responses"""
+
+        ows_url = reverse('OWS:ows', kwargs={'group_slug': self.qdjango_project.group.slug, 'project_type': 'qdjango',
+                                             'project_id': self.qdjango_project.id})
+        params = {
+            'REQUEST': 'GetCapabilities',
+            'SERVICE': 'WMS'
+        }
+
+        c = Client()
+        self.assertTrue(c.login(username='admin01', password='admin01'))
+        response = c.get(ows_url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=60')
+        etag = response['ETag']
+
+        # same ETag for same query with different key order and case
+        response = c.get(ows_url, {'service': 'WMS', 'request': 'GetCapabilities'})
+        self.assertEqual(response['ETag'], etag)
+
+        # not modified: QGIS server is not called
+        with mock.patch('qdjango.ows.get_qgs_project') as get_qgs_project_mock:
+            response = c.get(ows_url, params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            get_qgs_project_mock.assert_not_called()
+
+        # project changed
+        self.qdjango_project.save()
+        response = c.get(ows_url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # data requests without validators
+        response = c.get(ows_url, {
+            'REQUEST': 'GetMap',
+            'SERVICE': 'WMS',
+            'VERSION': '1.3.0',
+            'LAYERS': 'bluemarble',
+            'CRS': 'EPSG:4326',
+            'BBOX': '-90,-180,90,180',
+            'WIDTH': '10',
+            'HEIGHT': '10',
+            'FORMAT': 'image/png'
+        })
+        self.assertFalse(response.has_header('ETag'))
+
+        c.logout()
+
+    @override_settings(G3WADMIN_OWS_RESPONSE_CACHE_TIMEOUT=60)
+    def test_response_cache(self):
+        """Test OWS responses cache and its invalidation on project save"""
+
+        ows_url = reverse('OWS:ows', kwargs={'group_slug': self.qdjango_project.group.slug, 'project_type': 'qdjango',
+                                             'project_id': self.qdjango_project.id})
+        params = {
+            'REQUEST': 'GetCapabilities',
+            'SERVICE': 'WMS'
+        }
+
+        c = Client()
+        self.assertTrue(c.login(username='admin01', password='admin01'))
+        response = c.get(ows_url, params)
+        self.assertEqual(response.status_code, 200)
+        content = response.content
+
+        # cached: QGIS server is not called
+        with mock.patch('qdjango.ows.get_qgs_project') as get_qgs_project_mock:
+            response = c.get(ows_url, {'service': 'WMS', 'request': 'GetCapabilities'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, content)
+            self.assertTrue(response.has_header('ETag'))
+            get_qgs_project_mock.assert_not_called()
+
+        # project saved: cache invalidated
+        self.qdjango_project.save()
+        with mock.patch('qdjango.ows.get_qgs_project', return_value=None) as get_qgs_project_mock:
+            response = c.get(ows_url, params)
+            self.assertEqual(response.status_code, 404)
+            get_qgs_project_mock.assert_called_once()
+
+        c.logout()
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def test_response_cache_host(self):
+        """Test OWS responses cache by request host: online resources contain the host"""
+
+        ows_url = reverse('OWS:ows', kwargs={'group_slug': self.qdjango_project.group.slug, 'project_type': 'qdjango',
+                                             'project_id': self.qdjango_project.id})
+        params = {
+            'REQUEST': 'GetCapabilities',
+            'SERVICE': 'WMS'
+        }
+
+        c = Client()
+        self.assertTrue(c.login(username='admin01', password='admin01'))
+        response = c.get(ows_url, params, HTTP_HOST='one.example.com')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # cached for the same host
+        response = c.get(ows_url, params, HTTP_HOST='one.example.com')
+        self.assertEqual(response['ETag'], etag)
+
+        # not cached for another host: QGIS server is called
+        with mock.patch('qdjango.ows.get_qgs_project', return_value=None) as get_qgs_project_mock:
+            response = c.get(ows_url, params, HTTP_HOST='two.example.com')
+            self.assertEqual(response.status_code, 404)
+            get_qgs_project_mock.assert_called_once()
+
+        response = c.get(ows_url, params, HTTP_HOST='two.example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotIn(b'one.example.com', response.content)
+
+        c.logout()
+
+    def test_streaming_response(self):
+        """Test streamed OWS responses"""
+
+        ows_url = reverse('OWS:ows', kwargs={'group_slug': self.qdjango_project.group.slug, 'project_type': 'qdjango',
+                                             'project_id': self.qdjango_project.id})
+        params = {
+            'REQUEST': 'GetCapabilities',
+            'SERVICE': 'WMS'
+        }
+
+        c = Client()
+        self.assertTrue(c.login(username='admin01', password='admin01'))
+        content = c.get(ows_url, params).content
+
+        with mock.patch('qdjango.ows.OWS_STREAMING_MIN_SIZE', 0):
+            response = c.get(ows_url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            streamed_content = b''.join(response.streaming_content)
+            self.assertEqual(streamed_content, content)
+            self.assertEqual(int(response['Content-Length']), len(content))
+
+        c.logout()
+
     def test_authorizzer(self):
         """Test authorizzer by user and permission on project"""
 
@@ -18,12 +18,24 @@ from qdjango.models import Project, Layer, Widget
 from qdjango.utils.data import QgisProject, QgisPgConnection, QgisProjectSettingsWMS
 from qdjango.utils.exceptions import QgisProjectLayerException, QgisProjectException
 from qdjango.utils.structure import get_schema_table, datasource2dict, datasourcearcgis2dict
-from qdjango.utils.models import get_widgets4layer, comparedbdatasource, get_capabilities4layer
+from qdjango.utils.models import get_widgets4layer, comparedbdatasource, get_capabilities4layer, \
+    get_widget_unique_values, run_widget_unique_values_refreshes
 from qdjango.templatetags.qdjango_tags import is_geom_type_gpx_compatible
+from qdjango.utils.pool import QgsProjectPool
+from qdjango.utils.server import QGS_SERVER_LOCK, get_qgs_server_request_context, qgs_server_request
+from qdjango.apps import QGS_SERVER, QGS_SERVER_SETTINGS
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpRequest
+from qgis.core import QgsProject, QgsVectorLayer
+from core.utils.qgisapi import bump_layer_data_version
 from collections import OrderedDict
+from unittest import mock
 import os
 import json
 import requests
+import shutil
+import tempfile
+import threading
 
 CURRENT_PATH = os.getcwd()
 TEST_BASE_PATH = '/qdjango/tests/data/'
@@ -408,6 +420,37 @@ class QdjangoUtilsTest(QdjangoTestBase):
         # tear down
         widget.delete()
 
+    def test_get_widget_unique_values(self):
+        """Test widget unique values cache, outdated values refreshed at the request end"""
+
+        layer = mock.Mock(pk=1, project_id=1, layer_type='memory', datasource='Point?field=name:string')
+        qgis_layer = QgsVectorLayer('Point?field=name:string', 'points', 'memory')
+
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'widgets'}
+        }), mock.patch('qdjango.utils.models._build_widget_unique_values', return_value=['a']), \
+                mock.patch('qdjango.utils.models.bump_project_config_version') as bump_mock:
+
+            self.assertEqual(get_widget_unique_values(layer, qgis_layer, 'name'), ['a'])
+
+            # outdated: cached values are returned, refresh is queued
+            bump_layer_data_version(qgis_layer)
+            with mock.patch('qdjango.utils.models._build_widget_unique_values', return_value=['a', 'b']):
+                self.assertEqual(get_widget_unique_values(layer, qgis_layer, 'name'), ['a'])
+                # only one refresh queued
+                self.assertEqual(get_widget_unique_values(layer, qgis_layer, 'name'), ['a'])
+                run_widget_unique_values_refreshes()
+            bump_mock.assert_called_once_with(1)
+            self.assertEqual(get_widget_unique_values(layer, qgis_layer, 'name'), ['a', 'b'])
+
+            # refreshed values unchanged: project configuration is not invalidated
+            bump_mock.reset_mock()
+            bump_layer_data_version(qgis_layer)
+            with mock.patch('qdjango.utils.models._build_widget_unique_values', return_value=['a', 'b']):
+                self.assertEqual(get_widget_unique_values(layer, qgis_layer, 'name'), ['a', 'b'])
+                run_widget_unique_values_refreshes()
+            bump_mock.assert_not_called()
+
     def test_comparedbdatasource(self):
         """ Test same name function """
 
@@ -494,4 +537,113 @@ class TestTemplateTags(QdjangoTestBase):
         """Test homonymous function"""
 
         self.assertTrue(is_geom_type_gpx_compatible(self.spatialite_points))
-        self.assertFalse(is_geom_type_gpx_compatible(self.world))
\ No newline at end of file
+        self.assertFalse(is_geom_type_gpx_compatible(self.world))
+
+class QgsProjectPoolTest(TestCase):
+    """Test the worker QGIS projects pool"""
+
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.paths = []
+        for qgs_file in (QGS_FILE, 'gruppo-1_un-progetto_qgis310.qgs'):
+            path = os.path.join(self.tmp_dir, qgs_file)
+            shutil.copy('{}{}{}'.format(CURRENT_PATH, TEST_BASE_PATH, qgs_file), path)
+            self.paths.append(path)
+
+        self.pool = QgsProjectPool(QGS_SERVER_SETTINGS)
+
+    def tearDown(self):
+
+        for path in self.paths:
+            self.pool.remove(path)
+        shutil.rmtree(self.tmp_dir)
+
+    @override_settings(G3WADMIN_PROJECT_POOL_SIZE=0)
+    def test_hits_and_reload(self):
+
+        project = self.pool.get(self.paths[0])
+        self.assertIsNotNone(project)
+        self.assertEqual(project, QgsProject.instance())
+        self.assertEqual(self.pool.get(self.paths[0]), project)
+
+        metrics = self.pool.get_metrics()
+        self.assertEqual(metrics['hits'], 1)
+        self.assertEqual(metrics['misses'], 1)
+        self.assertEqual(metrics['loads'], 1)
+        self.assertEqual(metrics['projects'], [self.paths[0]])
+
+        # project file changes: reload
+        stat = os.stat(self.paths[0])
+        os.utime(self.paths[0], (stat.st_atime, stat.st_mtime + 10))
+        self.assertIsNotNone(self.pool.get(self.paths[0]))
+        self.assertEqual(self.pool.get_metrics()['loads'], 2)
+        self.assertEqual(len(self.pool), 1)
+
+        # not existing project
+        self.assertIsNone(self.pool.get(os.path.join(self.tmp_dir, 'not_exists.qgs')))
+        self.assertEqual(self.pool.get_metrics()['load_errors'], 1)
+
+    @override_settings(G3WADMIN_PROJECT_POOL_SIZE=1)
+    def test_eviction(self):
+
+        self.pool.get(self.paths[0])
+        project = self.pool.get(self.paths[1])
+
+        self.assertNotIn(self.paths[0], self.pool)
+        self.assertIn(self.paths[1], self.pool)
+        self.assertEqual(project, QgsProject.instance())
+        self.assertEqual(self.pool.get_metrics()['evictions'], 1)
+
+    @override_settings(G3WADMIN_PROJECT_POOL_SIZE=1)
+    def test_eviction_request(self):
+        """Projects used by a running request are evicted at the request end"""
+
+        self.pool.request_started()
+        project = self.pool.get(self.paths[0])
+        self.pool.get(self.paths[1])
+        self.assertIn(self.paths[0], self.pool)
+        self.assertEqual(self.pool.get_metrics()['evictions'], 0)
+
+        # changed project file: reloaded after the request end
+        stat = os.stat(self.paths[0])
+        os.utime(self.paths[0], (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(self.pool.get(self.paths[0]), project)
+        self.assertEqual(self.pool.get_metrics()['loads'], 2)
+
+        self.pool.request_finished()
+        self.assertNotIn(self.paths[1], self.pool)
+        self.assertEqual(self.pool.get_metrics()['evictions'], 1)
+
+        self.pool.get(self.paths[0])
+        self.assertEqual(self.pool.get_metrics()['loads'], 3)
+
+
+class QgsServerRequestContextTest(TestCase):
+    """Test the per request context of QGIS server filters"""
+
+    def test_context(self):
+
+        self.assertIsNone(get_qgs_server_request_context())
+        self.assertIsNone(QGS_SERVER.project)
+
+        djrequest = HttpRequest()
+        djrequest.user = AnonymousUser()
+        with qgs_server_request(djrequest, 'project_1'):
+            self.assertEqual(QGS_SERVER.project, 'project_1')
+            self.assertEqual(get_qgs_server_request_context().user, djrequest.user)
+
+            # nested request context
+            with qgs_server_request(djrequest, 'project_2'):
+                self.assertEqual(QGS_SERVER.project, 'project_2')
+            self.assertEqual(QGS_SERVER.project, 'project_1')
+
+            # other threads don't see the context and wait for the request end
+            results = []
+            thread = threading.Thread(target=lambda: results.append(
+                (get_qgs_server_request_context(), QGS_SERVER_LOCK.acquire(blocking=False))))
+            thread.start()
+            thread.join()
+            self.assertEqual(results, [(None, False)])
+
+        self.assertIsNone(get_qgs_server_request_context())
@@ -17,7 +17,7 @@ import shutil
 from qgis.PyQt.QtCore import QTemporaryDir, QVariant
 from qgis.core import QgsFeature, QgsProject, QgsGeometry, Qgis
 
-from qdjango.utils.validators import feature_validator
+from qdjango.utils.validators import feature_validator, features_unique_validator
 
 from .base import QdjangoTestBase
 
@@ -181,6 +181,19 @@ class TestFeatureValidator(QdjangoTestBase):
         for k in errors.keys():
             self.assertEqual(errors[k], ['Field value must be UNIQUE'])
 
+    def test_features_unique(self):
+        """Test unique project level constraints among features saved together"""
+
+        features = [self._feature_factory({'text_unique': 'a text', 'integer_unique': 1}),
+                    self._feature_factory({'text_unique': 'another text', 'integer_unique': 2}),
+                    self._feature_factory({'integer_unique': 1})]
+
+        self.assertEqual(features_unique_validator(features[:2], self.validator_project_test_unique), (None, None))
+
+        index, errors = features_unique_validator(features, self.validator_project_test_unique)
+        self.assertEqual(index, 2)
+        self.assertEqual(errors, {'integer_unique': ['Field value must be UNIQUE']})
+
     def test_expression(self):
         """Test project level expression constraints"""
         feature = self._feature_factory(
@@ -41,7 +41,7 @@ from .validators import (CheckMaxExtent, ColumnName, DatasourceExists, ProjectEx
                          IsGroupCompatibleValidator, ProjectTitleExists,
                          UniqueLayername)
 
-from qdjango.apps import get_qgs_project
+from qdjango.apps import get_qgs_project, QGS_PROJECT_POOL
 
 import logging
 
@@ -608,6 +608,9 @@ class QgisProjectLayer(XmlData):
         """
 
         columns = json.dumps(self.columns) if self.columns else None
+        vectorjoins = json.dumps(self.vectorjoins) if self.vectorjoins is not None else None
+        editTypes = json.dumps(self.editTypes) if self.editTypes is not None else None
+        editorFormStructure = json.dumps(self.editorformstructure) if self.editorformstructure is not None else None
         excludeAttributesWMS = json.dumps(self.excludeAttributesWMS) if self.excludeAttributesWMS else None
         excludeAttributesWFS = json.dumps(self.excludeAttributesWFS) if self.excludeAttributesWFS else None
 
@@ -634,10 +637,10 @@ class QgisProjectLayer(XmlData):
                 'exclude_attribute_wms': excludeAttributesWMS,
                 'exclude_attribute_wfs': excludeAttributesWFS,
                 'geometrytype': self.geometrytype,
-                'vectorjoins': self.vectorjoins,
-                'edittypes': self.editTypes,
+                'vectorjoins': vectorjoins,
+                'edittypes': editTypes,
                 'editor_layout': self.editorlayout,
-                'editor_form_structure': self.editorformstructure,
+                'editor_form_structure': editorFormStructure,
                 'extent': self.extent
                 }
             )
@@ -660,10 +663,10 @@ class QgisProjectLayer(XmlData):
             self.instance.exclude_attribute_wms = excludeAttributesWMS
             self.instance.exclude_attribute_wfs = excludeAttributesWFS
             self.instance.geometrytype = self.geometrytype
-            self.instance.vectorjoins = self.vectorjoins
-            self.instance.edittypes = self.editTypes
+            self.instance.vectorjoins = vectorjoins
+            self.instance.edittypes = editTypes
             self.instance.editor_layout = self.editorlayout
-            self.instance.editor_form_structure = self.editorformstructure
+            self.instance.editor_form_structure = editorFormStructure
             self.instance.extent = self.extent
 
         # Save self.instance
@@ -803,6 +806,7 @@ class QgisProject(XmlData):
         Is important to avoid locking data like GeoPackage.
         """
 
+        QGS_PROJECT_POOL.remove(self.qgs_project.fileName())
         QgsConfigCache.instance().removeEntry(self.qgs_project.fileName())
 
     def _getDataName(self):
@@ -1141,7 +1145,7 @@ class QgisProject(XmlData):
                     baselayer=baselayer,
                     qgis_version=self.qgisVersion,
                     layers_tree=self.layersTree,
-                    relations=self.layerRelations,
+                    relations=json.dumps(self.layerRelations) if self.layerRelations else None,
                     layouts=self.layouts,
                     context_base_legend=self.contextbaselegend
 
@@ -1155,7 +1159,7 @@ class QgisProject(XmlData):
                 self.instance.initial_extent = self.initialExtent
                 self.instance.max_extent = self.maxExtent
                 self.instance.layers_tree = self.layersTree
-                self.instance.relations = self.layerRelations
+                self.instance.relations = json.dumps(self.layerRelations) if self.layerRelations else None
                 self.instance.layouts = self.layouts
                 self.instance.context_base_legend = self.contextbaselegend
                 self.instance.wms_use_layer_ids = self.wmsuselayerids
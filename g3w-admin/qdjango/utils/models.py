@@ -11,9 +11,53 @@ __copyright__ = 'Copyright 2019, GIS3W'
 
 from django.db.models import Q
 from django.conf import settings
+from django.core.cache import cache
 from qdjango.apps import get_qgs_project
+from core.utils.qgisapi import get_qgis_unique_values, get_layer_data_version
 
-from qgis.core import QgsMapLayer
+from qgis.core import QgsMapLayer, QgsJsonUtils, QgsVectorLayer
+
+from hashlib import md5
+import json
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+WIDGET_UNIQUE_VALUES_CACHE_KEY = 'qdjango_widget_unique_values_{}'
+WIDGET_UNIQUE_VALUES_LOCK_KEY = 'qdjango_widget_unique_values_lock_{}'
+PROJECT_CONFIG_VERSION_CACHE_KEY = 'qdjango_prj_config_version_{}'
+
+# Widgets unique values refreshes queued by the current request
+_widget_unique_values_refreshes = threading.local()
+
+
+def get_project_config_version(project_pk):
+    """
+    Return the current version of the layers and widgets data of a project,
+    used to build the client configuration cache key
+    :param project_pk: Qdjango Project model instance pk
+    :return: str
+    """
+
+    version = cache.get(PROJECT_CONFIG_VERSION_CACHE_KEY.format(project_pk))
+    if version is None:
+        version = bump_project_config_version(project_pk)
+    return version
+
+
+def bump_project_config_version(project_pk):
+    """
+    Change the version of the layers and widgets data of a project:
+    the cached client configuration of the project is invalidated
+    :param project_pk: Qdjango Project model instance pk
+    :return: str
+    """
+
+    version = '{:f}'.format(time.time())
+    cache.set(PROJECT_CONFIG_VERSION_CACHE_KEY.format(project_pk), version, None)
+    return version
 
 
 def comparedbdatasource(ds1, ds2, layer_type='postgres'):
@@ -59,6 +103,164 @@ def get_widgets4layer(layer):
         return Widget.objects.filter(datasource=layer.datasource)
 
 
+def get_selectbox_fields4widget(widget):
+    """
+    Return the field names of the selectbox inputs of a search widget
+    :param widget: Qdjango Widget model instance
+    :return: list
+    """
+
+    if widget.widget_type != 'search':
+        return []
+
+    try:
+        fields = json.loads(widget.body)['fields']
+    except Exception as e:
+        logger.error(f'Widget {widget.pk} body: {e}')
+        return []
+
+    return [f['name'] for f in fields if f.get('widgettype') == 'selectbox']
+
+
+def _get_widget_unique_values_cache_key(layer, field_name):
+    """
+    Return the cache key of the unique values of a layer field: layers sharing the same datasource
+    share the cached values.
+    :param layer: Qdjango Layer model instance
+    :param field_name: field name
+    :return: str
+    """
+
+    return WIDGET_UNIQUE_VALUES_CACHE_KEY.format(
+        md5(f'{layer.layer_type}:{layer.datasource}:{field_name}'.encode('utf-8')).hexdigest())
+
+
+def _build_widget_unique_values(qgis_layer, field_name):
+    """
+    Return the sorted JSON values of a layer field unique values
+    :param qgis_layer: QgsVectorLayer instance
+    :param field_name: field name
+    :return: list
+    """
+
+    values = []
+    for u in get_qgis_unique_values(qgis_layer, field_name):
+        try:
+            values.append(json.loads(QgsJsonUtils.encodeValue(u)))
+        except Exception as e:
+            logger.error(f'Response vector widget unique: {e}')
+            continue
+
+    # sort values for selectbox
+    try:
+        values = sorted(set(values))
+    except:
+        values = set(values)
+
+    return list(values)
+
+
+def _refresh_widget_unique_values(cache_key, qgis_layer, field_name):
+    """
+    Compute and store into the cache the unique values of a layer field
+    :param cache_key: the cache key
+    :param qgis_layer: QgsVectorLayer instance
+    :param field_name: field name
+    :return: list
+    """
+
+    # read the version before the scan: data edited during the scan makes the entry stale
+    version = get_layer_data_version(qgis_layer)
+    values = _build_widget_unique_values(qgis_layer, field_name)
+    cache.set(cache_key, {'version': version, 'values': values},
+              getattr(settings, 'G3WADMIN_WIDGET_UNIQUE_VALUES_CACHE_TIMEOUT', 3600))
+    return values
+
+
+def _queue_widget_unique_values_refresh(cache_key, qgis_layer, field_name, project_pk, values):
+    """
+    Queue the refresh of the cached unique values of a layer field, the refresh runs
+    by run_widget_unique_values_refreshes() at the end of the request (after the response has been sent),
+    only one refresh at a time runs for every cache key.
+    :param cache_key: the cache key
+    :param qgis_layer: QgsVectorLayer instance
+    :param field_name: field name
+    :param project_pk: Qdjango Project model instance pk, its client configuration is invalidated
+                       when the refreshed values change
+    :param values: the cached values
+    """
+
+    lock_key = WIDGET_UNIQUE_VALUES_LOCK_KEY.format(cache_key)
+    if not cache.add(lock_key, True, 300):
+        return
+
+    # the request QGIS layer can be deleted at the request end (project pool): the refresh scans its own layer
+    if not hasattr(_widget_unique_values_refreshes, 'queue'):
+        _widget_unique_values_refreshes.queue = []
+    _widget_unique_values_refreshes.queue.append(
+        (cache_key, lock_key, qgis_layer.source(), qgis_layer.name(), qgis_layer.providerType(), field_name,
+         project_pk, values))
+
+
+def run_widget_unique_values_refreshes():
+    """
+    Run the refreshes of the widgets unique values queued by the current request (thread)
+    """
+
+    queue = getattr(_widget_unique_values_refreshes, 'queue', None)
+    _widget_unique_values_refreshes.queue = []
+
+    for cache_key, lock_key, source, name, provider, field_name, project_pk, values in queue or []:
+        try:
+            if _refresh_widget_unique_values(cache_key, QgsVectorLayer(source, name, provider), field_name) != values:
+                bump_project_config_version(project_pk)
+        except Exception as e:
+            logger.error(f'Refresh widget unique values for {name}.{field_name}: {e}')
+        finally:
+            cache.delete(lock_key)
+
+
+def get_widget_unique_values(layer, qgis_layer, field_name):
+    """
+    Return the unique values of a layer field for search widget selectbox inputs.
+    Values are served from cache: they are scanned only the first time, when the cached values
+    are outdated (data edited) they are returned anyway and refreshed after the response.
+    :param layer: Qdjango Layer model instance
+    :param qgis_layer: QgsVectorLayer instance
+    :param field_name: field name
+    :return: list
+    """
+
+    if getattr(settings, 'G3WADMIN_WIDGET_UNIQUE_VALUES_CACHE_TIMEOUT', None) == 0:
+        return _build_widget_unique_values(qgis_layer, field_name)
+
+    cache_key = _get_widget_unique_values_cache_key(layer, field_name)
+    cached = cache.get(cache_key)
+    if cached is None:
+        return _refresh_widget_unique_values(cache_key, qgis_layer, field_name)
+
+    if cached['version'] != get_layer_data_version(qgis_layer):
+        _queue_widget_unique_values_refresh(cache_key, qgis_layer, field_name, layer.project_id,
+                                                 cached['values'])
+
+    return cached['values']
+
+
+def delete_widget_unique_values(layer):
+    """
+    Delete the cached unique values of the search widgets selectbox fields of a layer
+    :param layer: Qdjango Layer model instance
+    """
+
+    cache_keys = set()
+    for widget in layer.widget_set.all():
+        for field_name in get_selectbox_fields4widget(widget):
+            cache_keys.add(_get_widget_unique_values_cache_key(layer, field_name))
+
+    if cache_keys:
+        cache.delete_many(list(cache_keys))
+
+
 def get_constraints4layer(layer):
     """
     Return list of single layer contraint
@@ -67,6 +269,30 @@ def get_constraints4layer(layer):
     return layer.constrainted_layer.all()
 
 
+def get_constraints_fingerprint(user, project):
+    """
+    Return a hash of the active constraint rules of the project layers applied to the user,
+    to identify responses filtered by server access control
+    :param user: Django User instance or AnonymousUser
+    :param project: Qdjango Project model instance
+    :return: str
+    """
+
+    from qdjango.models import ConstraintSubsetStringRule, ConstraintExpressionRule
+
+    user_filter = Q(user__pk=user.pk) if user.pk else Q(pk__in=[])
+    if user.pk:
+        user_filter |= Q(group__in=user.groups.all())
+
+    rules = []
+    for rule_class in (ConstraintSubsetStringRule, ConstraintExpressionRule):
+        rules.append(sorted(rule_class.objects.filter(
+            user_filter, constraint__layer__project=project, constraint__active=True).
+            values_list('constraint__layer_id', 'rule')))
+
+    return md5(json.dumps(rules).encode()).hexdigest()
+
+
 def get_capabilities4layer(qgs_maplayer=None, **kwargs):
     """
     Return bitwise layer capabilities (by QGIS consts) values
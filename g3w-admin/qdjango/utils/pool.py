@@ -0,0 +1,340 @@
+# coding=utf-8
+"""
+    Pool of loaded QGIS projects for every worker process.
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the Mozilla Public License 2.0.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from qgis.core import QgsApplication, QgsProject
+from qgis.server import QgsConfigCache
+
+from collections import Counter, OrderedDict
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROJECT_POOL_HITS_CACHE_KEY = 'qdjango_project_pool_hits'
+PROJECT_POOL_METRICS_CACHE_KEY = 'qdjango_project_pool_metrics'
+
+# Shared hits and metrics expiration
+PROJECT_POOL_STATS_TIMEOUT = 24 * 3600
+
+
+def get_process_rss():
+    """
+    Return the resident memory of the current process in bytes, None if not available (no Linux /proc)
+    :return: int, None
+    """
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class QgsProjectPoolEntry(object):
+    """
+    Loaded project of the pool
+    """
+
+    def __init__(self, project, mtime, memory):
+        """
+        :param project: QgsProject instance
+        :param mtime: project file modification time at loading
+        :param memory: estimated memory of the project in bytes (process memory increase on loading)
+        """
+        self.project = project
+        self.mtime = mtime
+        self.memory = memory
+
+
+class QgsProjectPool(object):
+    """
+    Pool of the QGIS projects loaded in the worker process, with LRU eviction
+    by projects number and by memory budget.
+
+    Projects are loaded by QgsConfigCache (shared with QGIS server), the pool reloads
+    a project when its file changes and removes the evicted projects from QgsConfigCache.
+    Projects (and their layers) used by running requests are never evicted nor reloaded:
+    requests (request_started, request_finished) hold the projects they get until their end.
+    Hits and metrics are shared between workers by Django cache: hits are used to
+    warm up the most requested projects at worker start.
+    """
+
+    def __init__(self, server_settings):
+        """
+        :param server_settings: QgsServerSettings instance
+        """
+
+        self.server_settings = server_settings
+        self._projects = OrderedDict()
+        self._hits = Counter()
+        self._stats_flushed = time.time()
+
+        # number of running requests using every project: {path: requests}
+        self._in_use = Counter()
+        # projects used by the request of the current thread, None outside requests
+        self._local = threading.local()
+        self._lock = threading.RLock()
+
+        self.metrics = {
+            'hits': 0,
+            'misses': 0,
+            'loads': 0,
+            'load_errors': 0,
+            'load_time': 0.0,
+            'load_time_max': 0.0,
+            'evictions': 0,
+        }
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'G3WADMIN_PROJECT_POOL_SIZE', 0)
+
+    @property
+    def memory_budget(self):
+        """Memory budget in bytes, 0 for no budget"""
+        return getattr(settings, 'G3WADMIN_PROJECT_POOL_MEMORY_BUDGET', 0) * 1024 * 1024
+
+    def _get_mtime(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def get(self, path):
+        """
+        Return the project from the pool, loading it if it is not loaded or if its file changed.
+        The project is set as current QgsProject instance.
+        :param path: the filesystem path to the project
+        :return: QgsProject instance or None if it could not be loaded
+        """
+
+        with self._lock:
+            mtime = self._get_mtime(path)
+            entry = self._projects.get(path)
+
+            # a changed project used by running requests is reloaded after their end
+            if entry is not None and (entry.mtime == mtime or self._in_use[path]):
+                self._projects.move_to_end(path)
+                self.metrics['hits'] += 1
+            else:
+                self.metrics['misses'] += 1
+                if entry is not None:
+                    logger.info(f'Project file changed, reload: {path}')
+                    self.remove(path)
+                entry = self._load(path, mtime)
+
+            self._hits[path] += 1
+            self._flush_stats()
+
+            if entry is None:
+                return None
+
+            self._use(path)
+            return self._set_current(entry.project, path)
+
+    def _use(self, path):
+        """Mark the project as used by the request of the current thread"""
+
+        paths = getattr(self._local, 'paths', None)
+        if paths is not None and path not in paths:
+            paths.add(path)
+            self._in_use[path] += 1
+
+    def request_started(self):
+        """Start a request in the current thread: projects got by the request are not evicted until its end"""
+
+        self.request_finished()
+        self._local.paths = set()
+
+    def request_finished(self):
+        """End the request of the current thread: release its projects and evict the projects over the limits"""
+
+        paths = getattr(self._local, 'paths', None)
+        self._local.paths = None
+        if not paths:
+            return
+
+        with self._lock:
+            for path in paths:
+                self._in_use[path] -= 1
+                if self._in_use[path] <= 0:
+                    del self._in_use[path]
+            self._evict()
+
+    def _load(self, path, mtime):
+        """
+        Load the project and evict the least recently used ones
+        :param path: the filesystem path to the project
+        :param mtime: project file modification time
+        :return: QgsProjectPoolEntry instance or None
+        """
+
+        rss = get_process_rss()
+        start = time.time()
+
+        try:
+            # Process pending events (i.e. deferred deletes) only when a project is loaded
+            QgsApplication.instance().processEvents()
+            project = QgsConfigCache.instance().project(path, self.server_settings)
+        except Exception as ex:
+            logger.warning(f'Error loading project {path}: {ex}')
+            project = None
+
+        if project is None:
+            self.metrics['load_errors'] += 1
+            return None
+
+        # Workaround for virtual layers bug  https://github.com/qgis/QGIS/pull/38488#issuecomment-692190106
+        needs_reload = False
+        for l in list(project.mapLayers().values()):
+            if not l.isValid():
+                logger.warning('Invalid layer %s found in project %s' % (
+                    l.id(), project.fileName()))
+                if l.dataProvider().name() == 'virtual':
+                    needs_reload = True
+                    logger.warning('Invalid virtual layer found in project %s: %s' % (
+                        project.fileName(), l.publicSource()))
+        if needs_reload:
+            logger.warning('Reload project %s' % project.fileName())
+            self._set_current(project, path)
+            project.read(path)
+
+        load_time = time.time() - start
+        self.metrics['loads'] += 1
+        self.metrics['load_time'] += load_time
+        self.metrics['load_time_max'] = max(self.metrics['load_time_max'], load_time)
+
+        memory = max(get_process_rss() - rss, 0) if rss is not None else 0
+        entry = QgsProjectPoolEntry(project, mtime, memory)
+        self._projects[path] = entry
+        logger.info(f'Project loaded in {load_time:.3f}s: {path}')
+
+        # the evicted projects cannot be the current instance
+        self._set_current(project, path)
+        self._evict()
+
+        return entry
+
+    def _evict(self):
+        """Evict least recently used projects over the pool size or the memory budget, never the last used one
+        nor the projects used by running requests: they are evicted at the end of the requests."""
+
+        max_size = self.max_size
+        memory_budget = self.memory_budget
+
+        for path in list(self._projects)[:-1]:
+            if not ((max_size and len(self._projects) > max_size) or
+                    (memory_budget and self.memory > memory_budget)):
+                break
+            if self._in_use[path]:
+                continue
+            logger.info(f'Project evicted from pool: {path}')
+            self.remove(path)
+            self.metrics['evictions'] += 1
+
+    def _set_current(self, project, path):
+        """
+        Set the project as current QgsProject instance, used by layers expressions and plugins.
+        :return: the current QgsProject instance
+        """
+
+        if project != QgsProject.instance():
+            try:
+                QgsProject.setInstance(project)
+            except AttributeError:  # Temporary workaround for 3.10.10
+                logger.warning(
+                    'Project reloaded because QgsProject.setInstance() is not available in this QGIS version: %s' % path)
+                QgsProject.instance().read(path)
+        return QgsProject.instance()
+
+    def remove(self, path):
+        """
+        Remove a project from the pool and from QgsConfigCache, also if it is used by running requests
+        :param path: the filesystem path to the project
+        """
+
+        with self._lock:
+            if self._projects.pop(path, None) is not None:
+                QgsConfigCache.instance().removeEntry(path)
+
+    def __contains__(self, path):
+        return path in self._projects
+
+    def __len__(self):
+        return len(self._projects)
+
+    @property
+    def memory(self):
+        """Estimated memory of loaded projects in bytes"""
+        return sum(entry.memory for entry in self._projects.values())
+
+    def get_metrics(self):
+        """
+        Return pool metrics
+        :return: dict
+        """
+
+        metrics = dict(self.metrics)
+        metrics.update({
+            'size': len(self._projects),
+            'memory': self.memory,
+            'load_time_avg': self.metrics['load_time'] / self.metrics['loads'] if self.metrics['loads'] else 0.0,
+            'projects': list(self._projects.keys())
+        })
+        return metrics
+
+    def _flush_stats(self, force=False):
+        """
+        Merge project hits and metrics of the worker into the shared Django cache,
+        at most every G3WADMIN_PROJECT_POOL_STATS_INTERVAL seconds.
+        """
+
+        now = time.time()
+        if not force and now - self._stats_flushed < getattr(settings, 'G3WADMIN_PROJECT_POOL_STATS_INTERVAL', 60):
+            return
+        self._stats_flushed = now
+
+        try:
+            hits = cache.get(PROJECT_POOL_HITS_CACHE_KEY) or {}
+            for path, count in self._hits.items():
+                hits[path] = [hits.get(path, [0, 0])[0] + count, now]
+            cache.set(PROJECT_POOL_HITS_CACHE_KEY, hits, PROJECT_POOL_STATS_TIMEOUT)
+            self._hits.clear()
+
+            metrics = cache.get(PROJECT_POOL_METRICS_CACHE_KEY) or {}
+            metrics[os.getpid()] = dict(self.get_metrics(), updated=now)
+            cache.set(PROJECT_POOL_METRICS_CACHE_KEY, metrics, PROJECT_POOL_STATS_TIMEOUT)
+        except Exception as ex:
+            logger.warning(f'Error saving project pool stats: {ex}')
+
+    def get_top_projects(self, n):
+        """
+        Return the paths of the n most requested projects in the last day, by all workers
+        :param n: number of projects
+        :return: list
+        """
+
+        now = time.time()
+        hits = cache.get(PROJECT_POOL_HITS_CACHE_KEY) or {}
+        hits = [(count, path) for path, (count, last_hit) in hits.items()
+                if now - last_hit < PROJECT_POOL_STATS_TIMEOUT]
+        return [path for count, path in sorted(hits, reverse=True)[:n]]
+
+    def warm_up(self, paths):
+        """
+        Load projects into the pool
+        :param paths: the filesystem paths of the projects
+        """
+
+        for path in paths:
+            if path in self._projects or not os.path.exists(path):
+                continue
+            self.get(path)
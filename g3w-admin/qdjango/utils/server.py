@@ -0,0 +1,138 @@
+# coding=utf-8
+"""
+    QGIS server requests and responses adapters.
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the Mozilla Public License 2.0.
+"""
+
+from django.conf import settings
+from qgis.server import QgsBufferServerResponse
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+
+# Request headers used by QGIS server (service URLs, content negotiation, POST body parsing)
+QGS_SERVER_REQUEST_HEADERS = getattr(settings, 'G3WADMIN_QGS_SERVER_REQUEST_HEADERS', [
+    'Host',
+    'Forwarded',
+    'X-Forwarded-Host',
+    'X-Forwarded-Proto',
+    'X-Qgis-Service-Url',
+    'X-Qgis-Wms-Service-Url',
+    'X-Qgis-Wfs-Service-Url',
+    'X-Qgis-Wcs-Service-Url',
+    'X-Qgis-Wmts-Service-Url',
+    'Accept',
+    'Content-Type',
+    'User-Agent',
+])
+
+# QGIS server is not thread safe (QgsProject instance, config cache, server interface are process globals):
+# QGIS server requests of the worker threads are handled one at a time
+QGS_SERVER_LOCK = threading.RLock()
+
+_qgs_server_request_context = ContextVar('qgs_server_request_context', default=None)
+
+
+class QgsServerRequestContext(object):
+    """
+    Django request and qdjango project of the request handled by QGIS server, for the server filters
+    """
+
+    def __init__(self, djrequest, project):
+        """
+        :param djrequest: Django HttpRequest instance, with user
+        :param project: qdjango Project model instance
+        """
+        self.djrequest = djrequest
+        self.project = project
+
+    @property
+    def user(self):
+        return self.djrequest.user
+
+
+def get_qgs_server_request_context():
+    """
+    Return the context of the request handled by QGIS server in the current thread or task
+    :return: QgsServerRequestContext instance, None outside a QGIS server request
+    """
+
+    return _qgs_server_request_context.get()
+
+
+@contextmanager
+def qgs_server_request(djrequest, project):
+    """
+    Context manager to handle a QGIS server request: it holds QGS_SERVER_LOCK and sets
+    the request context read by the server filters, from loading the QGIS project to the response.
+    :param djrequest: Django HttpRequest instance, with user
+    :param project: qdjango Project model instance
+    """
+
+    with QGS_SERVER_LOCK:
+        token = _qgs_server_request_context.set(QgsServerRequestContext(djrequest, project))
+        try:
+            yield
+        finally:
+            _qgs_server_request_context.reset(token)
+
+
+def get_qgs_server_request_headers(request):
+    """
+    Return the headers of a Django request to forward to QGIS server
+    :param request: Django HttpRequest instance
+    :return: dict
+    """
+
+    headers = {}
+    for header_key in QGS_SERVER_REQUEST_HEADERS:
+        value = request.headers.get(header_key)
+        if value is not None:
+            headers[header_key] = value
+    return headers
+
+
+class QgsServerChunkedResponse(QgsBufferServerResponse):
+    """
+    QGIS server response keeping the body as the list of the chunks flushed by QGIS server
+    (i.e. WFS GetFeature flushes every few features), to be streamed by a Django StreamingHttpResponse:
+    chunks are not joined nor copied and every chunk is released as soon as it is sent.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = deque()
+        self.size = 0
+
+    def flush(self):
+        buffer = self.io()
+        buffer.seek(0)
+        chunk = bytes(buffer.readAll())
+        self.truncate()
+        if chunk:
+            self.chunks.append(chunk)
+            self.size += len(chunk)
+
+    def clear(self):
+        super().clear()
+        self.chunks = deque()
+        self.size = 0
+
+    def body(self):
+        return b''.join(self.chunks)
+
+    def headers(self):
+        """ Response headers, without Content-Length (set by QGIS server on the last chunk only) """
+
+        headers = dict(super().headers())
+        headers.pop('Content-Length', None)
+        return headers
+
+    def iter_chunks(self):
+        """ Generator of the body chunks, releasing every chunk after it is sent """
+
+        while self.chunks:
+            yield self.chunks.popleft()
@@ -34,6 +34,55 @@ from qgis.core import (
 from qgis.PyQt.QtCore import QVariant, Qt
 
 
+def has_unique_constraint(field):
+    """Check if a field has a "hard" UNIQUE constraint
+
+    :param field: QGIS field
+    :type field: QgsField
+    :rtype: bool
+    """
+
+    return (field.constraints().constraintOrigin(
+        QgsFieldConstraints.ConstraintUnique) != QgsFieldConstraints.ConstraintOriginNotSet and
+        field.constraints().constraintStrength(QgsFieldConstraints.ConstraintUnique)
+        == QgsFieldConstraints.ConstraintStrengthHard)
+
+
+def features_unique_validator(features, layer):
+    """Check the UNIQUE "hard" constraints among features saved together: feature_validator
+    checks the values against the layer data only, not against the other features to save.
+
+    :param features: QGIS features
+    :type features: list
+    :param layer: QGIS layer
+    :type layer: QgsVectorLayer
+    :return: index of the first feature with a value already set by a previous feature and its errors,
+             (None, None) if there are no duplicated values
+    :rtype: tuple
+    """
+
+    fields = layer.fields()
+    unique_fields = [fields.field(i).name() for i in range(fields.count())
+                     if fields.fieldOrigin(i) != QgsFields.OriginJoin and has_unique_constraint(fields.field(i))]
+
+    values = {field_name: set() for field_name in unique_fields}
+    for index, feature in enumerate(features):
+        errors = dict()
+        for field_name in unique_fields:
+            value = feature.attribute(field_name)
+            if value is None or value == QVariant():
+                continue
+
+            if value in values[field_name]:
+                errors[field_name] = [_('Field value must be UNIQUE')]
+            values[field_name].add(value)
+
+        if errors:
+            return index, errors
+
+    return None, None
+
+
 def feature_validator(feature, layer):
     """Validate a QGIS feature by checking QGIS fields constraints
 
@@ -113,12 +162,7 @@ def feature_validator(feature, layer):
                 _set_error(field.name(), _(
                     'Field value \'%s\' cannot be converted to %s') % (value, QVariant.typeToName(field.type())))
 
-            unique = (field.constraints().constraintOrigin(
-                QgsFieldConstraints.ConstraintUnique) != QgsFieldConstraints.ConstraintOriginNotSet and
-                field.constraints().constraintStrength(QgsFieldConstraints.ConstraintUnique)
-                == QgsFieldConstraints.ConstraintStrengthHard)
-
-            if unique:
+            if has_unique_constraint(field):
                 # Search for features, excluding self if it's an update
                 request = QgsFeatureRequest()
                 request.setNoAttributes()
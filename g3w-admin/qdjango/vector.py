@@ -15,7 +15,7 @@ from core.api.filters import (IntersectsBBoxFilter, OrderingFilter,
                               SearchFilter, SuggestFilterBackend, FieldFilterBackend)
 from core.api.permissions import ProjectPermission
 
-from core.utils.qgisapi import get_qgis_layer
+from core.utils.qgisapi import get_qgis_layer, get_qgis_unique_values
 from core.utils.structure import mapLayerAttributesFromQgisLayer
 from core.utils.vector import BaseUserMediaHandler
 
@@ -64,12 +64,11 @@ class QGISLayerVectorViewMixin(object):
         """Find relations and set metadata"""
 
         # get relations on project
-        self.relations = {} if not self.layer.project.relations else \
-            {r['id']: r for r in eval(self.layer.project.relations)}
+        self.relations = {r['id']: r for r in self.layer.project.relations_data}
 
         # get relations on layer
         if self.layer.vectorjoins:
-            joins = eval(self.layer.vectorjoins)
+            joins = self.layer.vectorjoins_data
             for n, join in enumerate(joins):
                 try:
                     self._layer_model.objects.get(qgs_layer_id=join['joinLayerId'], project=self.layer.project)
@@ -226,7 +225,7 @@ class LayerVectorView(QGISLayerVectorViewMixin, BaseVectorOnModelApiView):
         if hasattr(self.layer, 'edittypes') and self.layer.edittypes:
 
             # reduild edittypes
-            edittypes = eval(self.layer.edittypes)
+            edittypes = self.layer.edittypes_data
             allow_edittypes = list(MAPPING_EDITTYPE_QGISEDITTYPE.keys())
 
             for field, data in list(edittypes.items()):
@@ -266,9 +265,12 @@ class LayerVectorView(QGISLayerVectorViewMixin, BaseVectorOnModelApiView):
 
         res = dict()
         for field in fields:
-            uniques = self.metadata_layer.qgis_layer.uniqueValues(
-                self.metadata_layer.qgis_layer.fields().indexOf(field)
-            )
+            try:
+                uniques = get_qgis_unique_values(self.metadata_layer.qgis_layer, field,
+                                                 limit=request_data.get('limit'))
+            except ValueError as e:
+                raise APIException(str(e))
+
             tores = []
             for u in uniques:
                 try :